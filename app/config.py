@@ -16,6 +16,7 @@ class Settings(BaseSettings):
     # LLM Config
     llm_model: str = "gpt-4o-mini"
     llm_temperature: float = 0.0
+    fast_parser_enabled: bool = True  # Parser por reglas antes del LLM para consultas estructuradas
     
     # App Config
     app_name: str = "Agente de Rutas Inteligente"
@@ -24,6 +25,78 @@ class Settings(BaseSettings):
     # Google Maps Config
     geocoding_language: str = "es"
     default_country: str = "PE"
+    matrix_max_concurrency: int = 4  # Bloques de Distance Matrix en paralelo
+    geocode_max_concurrency: int = 8  # Geocodificaciones en paralelo por solicitud
+    geocode_qps: float = 50.0  # Cuota de Geocoding API compartida por el proceso
+    directions_max_concurrency: int = 4  # Bloques de Directions en paralelo
+    single_flight_enabled: bool = True  # Deduplicar llamadas externas idénticas simultáneas
+    
+    # HTTP Clients (compartidos por el proceso)
+    http_pool_connections: int = 10  # Hosts con pool propio
+    http_pool_maxsize: int = 32  # Conexiones persistentes por host
+    http_connect_timeout_s: float = 5.0
+    http_read_timeout_s: float = 30.0
+    warm_up_connections: bool = True  # Abrir conexiones a Maps/OpenAI al arrancar
+    warm_up_graphs: bool = True  # Compilar y ejecutar los grafos con servicios simulados al arrancar
+    warm_up_solver_pool: bool = True  # Arrancar el pool de procesos del optimizador al iniciar
+    
+    # Cache Config
+    cache_dir: str = ".cache"
+    geocode_cache_enabled: bool = True
+    geocode_cache_ttl_s: int = 30 * 24 * 3600
+    geocode_cache_max_entries: int = 50000
+    geocode_cache_memory_entries: int = 1024
+    matrix_cache_enabled: bool = True
+    matrix_cache_ttl_s: int = 24 * 3600  # Tiempos de viaje cambian con el tráfico
+    matrix_cache_max_entries: int = 2000000
+    matrix_cache_memory_entries: int = 100000
+    matrix_cache_precision: int = 4  # Decimales de lat/lng en la clave (~11 m)
+    llm_cache_enabled: bool = True  # Solo aplica con llm_temperature = 0
+    llm_cache_ttl_s: int = 7 * 24 * 3600
+    llm_cache_max_entries: int = 100000
+    llm_cache_memory_entries: int = 2048
+    response_cache_enabled: bool = True  # Respuestas completas de /api/route
+    response_cache_ttl_s: int = 300  # Corto: el tráfico cambia las duraciones
+    response_cache_max_entries: int = 10000
+    response_cache_memory_entries: int = 1024
+    
+    # TSP Solver Config
+    held_karp_max_n: int = 15  # Rutas de hasta N nodos se resuelven de forma exacta
+    tsp_max_workers: int = 0  # Procesos para búsqueda con presupuesto (0 = todos los núcleos)
+    tsp_large_n: int = 200  # Desde N nodos se usa búsqueda con listas de candidatos
+    tsp_neighbors: int = 10  # Tamaño de la lista de candidatos por nodo
+    # Guided Local Search nunca termina antes de su límite: es latencia fija
+    # por solicitud. 3 ms por parada (tope 200 ms) queda a <0.3% de la
+    # ruta de 1 s en rutas de 20-120 paradas
+    ortools_time_limit_ms: int = 200  # Tope del límite de OR-Tools en rutas (HELD_KARP_MAX_N+1 a TSP_LARGE_N-1 paradas)
+    ortools_ms_per_stop: int = 3
+    fleet_time_limit_ms: int = 1000  # Límite de OR-Tools al planificar flotas
+    fleet_balance_coefficient: int = 100  # Peso de la ruta más larga al planificar flotas
+    
+    # Batch Planning
+    batch_max_routes: int = 1000  # Rutas por solicitud a /api/routes/batch
+    batch_max_concurrency: int = 16  # Parseos y rutas con Directions en vuelo por lote
+    batch_solver_workers: int = 0  # Procesos para optimizar rutas del lote (0 = todos los núcleos)
+    
+    # Route Jobs (cola persistente + procesos trabajadores)
+    job_workers: int = 0  # Procesos trabajadores por instancia (0 = sin cola, opt-in)
+    job_queue_path: str = ".data/jobs.sqlite3"
+    job_poll_interval_s: float = 0.5
+    job_heartbeat_s: float = 5.0  # Cada cuánto renueva el trabajador el latido de su trabajo
+    job_timeout_s: int = 60  # Trabajos sin latido durante más tiempo vuelven a la cola
+    job_max_attempts: int = 2
+    job_result_ttl_s: int = 24 * 3600  # Tiempo que se conservan los resultados
+    
+    # Route Sessions
+    route_session_ttl_s: int = 3600
+    route_session_max: int = 1000
+    
+    # Observability
+    metrics_enabled: bool = True  # Métricas en formato Prometheus en /metrics
+    profiling_enabled: bool = False  # Permite X-Profile / ?profile=1 en /api/route
+    profile_dir: str = ".data/profiles"
+    profile_interval_ms: float = 5.0  # Intervalo del muestreador de pila
+    profile_max_files: int = 200  # Se borran los perfiles más antiguos
 
 @lru_cache
 def get_settings() -> Settings:
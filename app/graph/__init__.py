@@ -2,6 +2,30 @@
 """
 Definición del grafo LangGraph
 """
-from app.graph.workflow import build_workflow, run_workflow
+from app.graph.workflow import (
+    build_workflow,
+    run_workflow,
+    arun_workflow,
+    astream_workflow,
+    build_fleet_workflow,
+    run_fleet_workflow,
+    arun_fleet_workflow,
+    build_structured_workflow,
+    run_structured_workflow,
+    arun_structured_workflow,
+)
+from app.graph.batch import RouteBatch
 
-__all__ = ["build_workflow", "run_workflow"]
\ No newline at end of file
+__all__ = [
+    "build_workflow",
+    "run_workflow",
+    "arun_workflow",
+    "astream_workflow",
+    "build_fleet_workflow",
+    "run_fleet_workflow",
+    "arun_fleet_workflow",
+    "build_structured_workflow",
+    "run_structured_workflow",
+    "arun_structured_workflow",
+    "RouteBatch",
+]
\ No newline at end of file
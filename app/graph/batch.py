@@ -0,0 +1,225 @@
+"""
+Planificación de rutas por lotes: las ubicaciones se deduplican en todo
+el lote antes de geocodificar, la unión de celdas de matriz se pide una
+sola vez y las rutas se resuelven en paralelo en el pool de procesos.
+Cada resultado se entrega apenas termina su ruta.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+import asyncio
+import os
+import time
+
+from app.config import get_settings
+from app.graph.nodes.format_output import format_output_node
+from app.graph.nodes.get_directions import aget_directions_node
+from app.graph.nodes.optimize_route import optimize_route_node, solve_route
+from app.graph.nodes.parse_input import aparse_input_node
+from app.graph.workflow import _structured_state
+from app.models.state import GraphState, Location
+from app.services.google_maps import MatrixCellBatch
+from app.services.metrics import record_solver
+from app.services.registry import get_services
+from app.services.tsp_solver import _get_process_pool
+
+
+class RouteBatch:
+    """
+    Lote de rutas en texto libre o con coordenadas. Uso:
+
+        batch = RouteBatch()
+        batch.add_query("Lima, Miraflores y Barranco")
+        async for index, state in batch.run():
+            ...
+        batch.stats  # llamadas ahorradas frente a rutas independientes
+    """
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.states: List[GraphState] = []
+        self.stats: Dict[str, Any] = {}
+
+    def add_query(self, query: str, time_budget_ms: Optional[int] = None) -> int:
+        """Agrega una ruta en lenguaje natural; devuelve su índice en el lote"""
+        self.states.append(GraphState(user_input=query, time_budget_ms=time_budget_ms))
+        return len(self.states) - 1
+
+    def add_locations(
+        self,
+        locations: List[Location],
+        return_to_origin: bool = False,
+        time_budget_ms: Optional[int] = None
+    ) -> int:
+        """Agrega una ruta con coordenadas conocidas (sin parseo ni geocoding)"""
+        self.states.append(_structured_state(locations, return_to_origin, time_budget_ms))
+        return len(self.states) - 1
+
+    async def run(self) -> AsyncIterator[Tuple[int, GraphState]]:
+        """
+        Ejecuta el lote y entrega (índice, estado final) en orden de
+        finalización; las rutas con error traen state.error
+        """
+        start = time.perf_counter()
+        self.stats = {"routes": len(self.states)}
+
+        await self._parse()
+        await self._geocode()
+        await self._matrix()
+
+        semaphore = asyncio.Semaphore(self.settings.batch_max_concurrency)
+        tasks = [
+            asyncio.ensure_future(self._finish_route(i, semaphore))
+            for i in range(len(self.states))
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Si el cliente se desconecta, no seguir resolviendo
+            for task in tasks:
+                task.cancel()
+
+        self.stats["failed_routes"] = sum(1 for state in self.states if state.error)
+        self.stats["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _parse(self) -> None:
+        """Parseo concurrente (reglas, caché y LLM) de las rutas en texto"""
+        semaphore = asyncio.Semaphore(self.settings.batch_max_concurrency)
+
+        async def parse_one(state: GraphState) -> None:
+            async with semaphore:
+                await aparse_input_node(state)
+
+        await asyncio.gather(*(parse_one(state) for state in self.states if not state.locations))
+
+    async def _geocode(self) -> None:
+        """Geocodifica una sola vez cada ubicación distinta del lote"""
+        pending = [state for state in self.states if not state.error and not state.locations]
+        unique: Dict[str, str] = {}
+        mentions = 0
+        for state in pending:
+            for name in [state.origin] + state.destinations:
+                unique.setdefault(_name_key(name), name)
+                mentions += 1
+
+        google_service = get_services().google_maps_async
+        semaphore = asyncio.Semaphore(max(1, self.settings.geocode_max_concurrency))
+
+        async def geocode_one(name: str) -> Union[Location, ValueError]:
+            async with semaphore:
+                try:
+                    return await google_service.geocode(name)
+                except ValueError as e:
+                    return e
+
+        start = time.perf_counter()
+        keys = list(unique)
+        results = dict(zip(keys, await asyncio.gather(*(geocode_one(unique[key]) for key in keys))))
+
+        for state in pending:
+            locations: List[Location] = []
+            for name in [state.origin] + state.destinations:
+                result = results[_name_key(name)]
+                if isinstance(result, ValueError):
+                    state.error = f"No se pudo geocodificar '{name}': {str(result)}"
+                    break
+                locations.append(result.model_copy(update={"name": name}))
+            else:
+                state.locations = locations
+                state.messages.append({
+                    "role": "system",
+                    "content": f"✅ Geocodificado en lote: {len(locations)} ubicaciones "
+                              f"({len(keys)} únicas en todo el lote)"
+                })
+
+        self.stats.update({
+            "location_mentions": mentions,
+            "geocoded_locations": len(keys),
+            "geocode_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    async def _matrix(self) -> None:
+        """Pide una sola vez la unión de celdas que necesitan todas las rutas"""
+        ready = [state for state in self.states if not state.error and state.locations]
+        precision = self.settings.matrix_cache_precision
+
+        # Índices por coordenadas redondeadas (la misma clave que la caché)
+        index: Dict[Tuple[float, float], int] = {}
+        unique: List[Location] = []
+        route_indices: List[List[int]] = []
+        for state in ready:
+            indices = []
+            for location in state.locations:
+                point = (round(location.lat, precision), round(location.lng, precision))
+                if point not in index:
+                    index[point] = len(unique)
+                    unique.append(location)
+                indices.append(index[point])
+            route_indices.append(indices)
+
+        pairs = {(i, j) for indices in route_indices for i in indices for j in indices if i != j}
+
+        start = time.perf_counter()
+        try:
+            cells: MatrixCellBatch = await get_services().google_maps_async.get_matrix_cells(unique, pairs)
+        except Exception as e:
+            for state in ready:
+                state.error = f"Error calculando matriz de distancias: {str(e)}"
+            return
+
+        for state, indices in zip(ready, route_indices):
+            distances, durations = cells.matrix(indices)
+            state.distance_matrix = distances.tolist()
+            state.duration_matrix = durations.tolist()
+            state.messages.append({
+                "role": "system",
+                "content": f"✅ Matriz calculada: {len(indices)}x{len(indices)} ubicaciones (celdas del lote)"
+            })
+
+        self.stats.update({
+            "matrix_elements": len(pairs),
+            # Lo que pedirían las rutas por separado (n x n cada una)
+            "independent_matrix_elements": sum(len(state.locations) ** 2 for state in ready),
+            "matrix_cached_elements": cells.cached_elements,
+            "matrix_fetched_elements": cells.fetched_elements,
+            "matrix_requests": len(cells.tiles),
+            "matrix_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+
+    async def _finish_route(self, i: int, semaphore: asyncio.Semaphore) -> Tuple[int, GraphState]:
+        """Optimiza, pide direcciones y formatea una ruta del lote"""
+        state = self.states[i]
+        if not state.error:
+            state = await self._solve(state)
+        if not state.error:
+            # Acotar las rutas que piden Directions a la vez
+            async with semaphore:
+                state = await aget_directions_node(state)
+            state = format_output_node(state)
+        self.states[i] = state
+        return i, state
+
+    async def _solve(self, state: GraphState) -> GraphState:
+        """
+        Optimización en el pool de procesos compartido (varias rutas en
+        paralelo en todos los núcleos). Con presupuesto de tiempo se usa un
+        hilo: solve_anytime ya reparte cada ruta entre los procesos.
+        Las métricas del solver se registran aquí: las del pool se perderían.
+        """
+        workers = self.settings.batch_solver_workers or os.cpu_count() or 1
+        if state.time_budget_ms or workers <= 1:
+            return await asyncio.to_thread(optimize_route_node, state)
+
+        loop = asyncio.get_running_loop()
+        try:
+            state, run = await loop.run_in_executor(_get_process_pool(workers), solve_route, state)
+        except Exception:
+            # Pool caído (p. ej. un proceso terminado): resolver en un hilo
+            return await asyncio.to_thread(optimize_route_node, state)
+        if run is not None:
+            record_solver(**run)
+        return state
+
+
+def _name_key(name: str) -> str:
+    """Nombres iguales salvo mayúsculas o espacios se geocodifican una vez"""
+    return " ".join(name.lower().split())
@@ -0,0 +1,143 @@
+"""
+Procesos trabajadores de la cola de rutas: toman trabajos de la cola
+SQLite y ejecutan el grafo fuera del proceso de la API, así el trabajo de
+CPU (matrices grandes, optimización con presupuesto) no ocupa los workers
+que atienden HTTP
+"""
+from typing import Any, Dict, List, Optional
+import multiprocessing
+import os
+import signal
+import threading
+
+from app.config import get_settings
+from app.graph.workflow import run_workflow
+from app.models.state import GraphState
+from app.services.job_queue import JobQueue
+from app.services.tsp_solver import solver_pool_workers, warm_up_process_pool
+
+
+def _beat(queue: JobQueue, job: Dict[str, Any], interval_s: float, done: threading.Event) -> None:
+    """Renueva el latido del trabajo hasta que termine o deje de ser nuestro"""
+    while not done.wait(interval_s):
+        if not queue.heartbeat(job["id"], job["worker"]):
+            return
+
+
+def process_job(queue: JobQueue, job: Dict[str, Any]) -> None:
+    """
+    Ejecuta un trabajo tomado de la cola y guarda su estado final
+    (sin los mensajes de depuración) o su error. Mientras corre, un hilo
+    renueva su latido para que no vuelva a la cola por lento.
+    """
+    payload = job["payload"]
+    done = threading.Event()
+    heartbeat = threading.Thread(
+        target=_beat,
+        args=(queue, job, get_settings().job_heartbeat_s, done),
+        name="route-job-heartbeat",
+        daemon=True
+    )
+    heartbeat.start()
+    try:
+        try:
+            result = run_workflow(payload["query"], time_budget_ms=payload.get("time_budget_ms"))
+            state = result if isinstance(result, GraphState) else GraphState.model_validate(result)
+        except Exception as e:
+            queue.fail(job["id"], job["worker"], f"Error interno: {str(e)}")
+            return
+
+        if state.error:
+            queue.fail(job["id"], job["worker"], state.error)
+        else:
+            queue.complete(job["id"], job["worker"], state.model_dump(mode="json", exclude={"messages"}))
+    finally:
+        done.set()
+        heartbeat.join()
+
+
+def _worker_main(path: str, max_attempts: int, stop: Any, parent_pid: int) -> None:
+    """Bucle de un proceso trabajador hasta que se active `stop` o muera la API"""
+    # Ctrl+C llega a todo el grupo: el proceso principal decide cuándo parar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    settings = get_settings()
+    queue = JobQueue(path, max_attempts=max_attempts)
+    worker = f"{os.uname().nodename}:{os.getpid()}"
+    if settings.warm_up_solver_pool:
+        warm_up_process_pool(solver_pool_workers())
+
+    while not stop.is_set() and os.getppid() == parent_pid:
+        job = queue.claim(worker, stale_after_s=settings.job_timeout_s)
+        if job is None:
+            stop.wait(settings.job_poll_interval_s)
+            continue
+        process_job(queue, job)
+
+
+class JobWorkerPool:
+    """
+    Procesos trabajadores (spawn: intérpretes limpios, sin heredar el event
+    loop ni los clientes HTTP de la API). Un hilo vigía reemplaza los
+    procesos que terminan inesperadamente.
+    """
+
+    # Cada cuántos segundos revisa el vigía, y cada cuántas revisiones purga
+    MONITOR_INTERVAL_S = 2.0
+    PURGE_EVERY = 30
+
+    def __init__(self, queue: JobQueue, workers: int):
+        self.queue = queue
+        self.workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+        self._monitor: Optional[threading.Thread] = None
+        self.restarts = 0
+
+    def _spawn(self) -> multiprocessing.Process:
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self.queue.path, self.queue.max_attempts, self._stop, os.getpid()),
+            name="route-job-worker",
+            # No daemon: solve_anytime necesita crear su propio pool de procesos
+            daemon=False
+        )
+        process.start()
+        return process
+
+    def start(self) -> None:
+        self._processes = [self._spawn() for _ in range(self.workers)]
+        self._monitor = threading.Thread(target=self._watch, name="route-job-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self) -> None:
+        checks = 0
+        while not self._stop.wait(self.MONITOR_INTERVAL_S):
+            for i, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stop.is_set():
+                    # Su trabajo en curso vuelve a la cola cuando su latido
+                    # tenga más de JOB_TIMEOUT_S
+                    self._processes[i] = self._spawn()
+                    self.restarts += 1
+
+            checks += 1
+            if checks % self.PURGE_EVERY == 0:
+                self.queue.purge(get_settings().job_result_ttl_s)
+
+    def stop(self, timeout_s: float = 10.0) -> None:
+        """Pide a los trabajadores que terminen su trabajo actual y salgan"""
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout_s)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for process in self._processes if process.is_alive()),
+            "restarts": self.restarts,
+            **self.queue.stats(),
+        }
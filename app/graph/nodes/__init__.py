@@ -2,11 +2,12 @@
 """
 Nodos del grafo de procesamiento
 """
-from app.graph.nodes.parse_input import parse_input_node
-from app.graph.nodes.geocode import geocode_node
-from app.graph.nodes.distance_matrix import distance_matrix_node
+from app.graph.nodes.parse_input import parse_input_node, aparse_input_node
+from app.graph.nodes.geocode import geocode_node, ageocode_node
+from app.graph.nodes.distance_matrix import distance_matrix_node, adistance_matrix_node
 from app.graph.nodes.optimize_route import optimize_route_node
-from app.graph.nodes.get_directions import get_directions_node
+from app.graph.nodes.optimize_fleet import optimize_fleet_node
+from app.graph.nodes.get_directions import get_directions_node, aget_directions_node
 from app.graph.nodes.format_output import format_output_node
 
 __all__ = [
@@ -14,6 +15,11 @@ __all__ = [
     "geocode_node",
     "distance_matrix_node",
     "optimize_route_node",
+    "optimize_fleet_node",
     "get_directions_node",
-    "format_output_node"
+    "format_output_node",
+    "aparse_input_node",
+    "ageocode_node",
+    "adistance_matrix_node",
+    "aget_directions_node"
 ]
\ No newline at end of file
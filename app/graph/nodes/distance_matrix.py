@@ -1,74 +1,79 @@
 """
 Nodo 3: Calcula la matriz de distancias entre todas las ubicaciones
 """
+from typing import Dict
+
+import numpy as np
+
 from app.models.state import GraphState
-from app.services.google_maps import GoogleMapsService
+from app.services.registry import get_services
 
 
 def distance_matrix_node(state: GraphState) -> GraphState:
     """
     Obtiene matriz de distancias y duraciones usando Google Distance Matrix API
     """
-    
+
     if not state.locations:
         state.error = "No hay ubicaciones geocodificadas"
         return state
-    
-    google_service = GoogleMapsService()
-    
+
+    google_service = get_services().google_maps
+
     try:
-        # Obtener matriz completa
-        result = google_service.get_distance_matrix(
+        # Obtener matriz completa (distancias en km, duraciones en min)
+        distance_matrix, duration_matrix = google_service.get_distance_matrix_values(
             origins=state.locations,
             destinations=state.locations
         )
-        
-        # Verificar que la respuesta sea válida
-        if result['status'] != 'OK':
-            state.error = f"Error en Distance Matrix API: {result['status']}"
-            return state
-        
-        # Extraer distancias y duraciones
-        n = len(state.locations)
-        distance_matrix = []
-        duration_matrix = []
-        
-        for i in range(n):
-            distance_row = []
-            duration_row = []
-            
-            for j in range(n):
-                element = result['rows'][i]['elements'][j]
-                
-                if element['status'] != 'OK':
-                    # Si no hay ruta, usar un valor muy grande
-                    distance_row.append(999999.0)
-                    duration_row.append(999999)
-                else:
-                    # Distancia en kilómetros
-                    distance_km = element['distance']['value'] / 1000.0
-                    distance_row.append(distance_km)
-                    
-                    # Duración en minutos
-                    duration_min = element['duration']['value'] // 60
-                    duration_row.append(duration_min)
-            
-            distance_matrix.append(distance_row)
-            duration_matrix.append(duration_row)
-        
-        state.distance_matrix = distance_matrix
-        state.duration_matrix = duration_matrix
-        
-        # Calcular estadísticas para logging
-        total_distances = sum(sum(row) for row in distance_matrix)
-        avg_distance = total_distances / (n * n) if n > 0 else 0
-        
-        state.messages.append({
-            "role": "system",
-            "content": f"✅ Matriz calculada: {n}x{n} ubicaciones, distancia promedio: {avg_distance:.1f} km"
-        })
-        
+        _store_matrix(state, distance_matrix, duration_matrix, google_service.last_matrix_stats)
+
     except Exception as e:
         state.error = f"Error calculando matriz de distancias: {str(e)}"
-    
-    return state
\ No newline at end of file
+
+    return state
+
+
+async def adistance_matrix_node(state: GraphState) -> GraphState:
+    """
+    Versión async de distance_matrix_node
+    """
+
+    if not state.locations:
+        state.error = "No hay ubicaciones geocodificadas"
+        return state
+
+    google_service = get_services().google_maps_async
+
+    try:
+        distance_matrix, duration_matrix = await google_service.get_distance_matrix_values(
+            origins=state.locations,
+            destinations=state.locations
+        )
+        _store_matrix(state, distance_matrix, duration_matrix, google_service.last_matrix_stats)
+
+    except Exception as e:
+        state.error = f"Error calculando matriz de distancias: {str(e)}"
+
+    return state
+
+
+def _store_matrix(
+    state: GraphState,
+    distance_matrix: np.ndarray,
+    duration_matrix: np.ndarray,
+    stats: Dict[str, int]
+) -> None:
+    n = len(state.locations)
+    state.distance_matrix = distance_matrix.tolist()
+    state.duration_matrix = duration_matrix.tolist()
+
+    # Calcular estadísticas para logging
+    avg_distance = float(distance_matrix.mean()) if n > 0 else 0
+
+    state.messages.append({
+        "role": "system",
+        "content": f"✅ Matriz calculada: {n}x{n} ubicaciones, distancia promedio: {avg_distance:.1f} km "
+                  f"({stats.get('cached_elements', 0)} desde caché, "
+                  f"{stats.get('fetched_elements', 0)} en {stats.get('requests', 0)} solicitudes)"
+    })
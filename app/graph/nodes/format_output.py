@@ -2,6 +2,7 @@
 Nodo 6: Formatea la salida final (último nodo antes de END)
 """
 from app.models.state import GraphState
+from app.utils.helpers import build_google_maps_url
 
 
 def format_output_node(state: GraphState) -> GraphState:
@@ -64,21 +65,7 @@ def format_output_node(state: GraphState) -> GraphState:
         })
         
         # Generar URL de Google Maps con paradas
-        import urllib.parse
-        
-        locs = state.optimized_locations
-        if locs and len(locs) > 1:
-            origin = urllib.parse.quote(locs[0])
-            destination = urllib.parse.quote(locs[-1])
-            waypoints = "|".join([urllib.parse.quote(loc) for loc in locs[1:-1]]) if len(locs) > 2 else ""
-            base = "https://www.google.com/maps/dir/?api=1"
-            url = f"{base}&origin={origin}&destination={destination}"
-            if waypoints:
-                url += f"&waypoints={waypoints}"
-            url += "&travelmode=driving"
-            state.google_maps_url = url
-        else:
-            state.google_maps_url = ""
+        state.google_maps_url = build_google_maps_url(state.optimized_locations)
         
     except Exception as e:
         state.error = f"Error formateando salida: {str(e)}"
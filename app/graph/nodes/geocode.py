@@ -1,8 +1,14 @@
 """
 Nodo 2: Geocodifica todas las ubicaciones (origen + destinos)
 """
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+import asyncio
+import time
+
+from app.config import get_settings
 from app.models.state import GraphState, Location
-from app.services.google_maps import GoogleMapsService
+from app.services.registry import get_services
 
 
 def geocode_node(state: GraphState) -> GraphState:
@@ -10,45 +16,109 @@ def geocode_node(state: GraphState) -> GraphState:
     Convierte todas las direcciones de texto en coordenadas geográficas
     usando Google Geocoding API
     """
-    
-    # Verificar que tengamos datos del nodo anterior
-    if not state.origin:
-        state.error = "No se pudo identificar el origen"
-        return state
-    
-    if not state.destinations:
-        state.error = "No se identificaron destinos"
+
+    all_locations = _locations_to_geocode(state)
+    if all_locations is None:
         return state
-    
-    google_service = GoogleMapsService()
-    
+
+    google_service = get_services().google_maps
+    workers = max(1, min(get_settings().geocode_max_concurrency, len(all_locations)))
+
     try:
-        # Lista de todas las ubicaciones a geocodificar
-        all_locations = [state.origin] + state.destinations
-        geocoded_locations: list[Location] = []
-        
-        for location_name in all_locations:
+        start = time.perf_counter()
+
+        # Las llamadas van en paralelo; el limitador del servicio respeta la
+        # cuota por segundo y map() conserva el orden de entrada
+        def geocode_one(location_name: str) -> Union[Location, ValueError]:
             try:
-                location = google_service.geocode(location_name)
-                geocoded_locations.append(location)
-                
-                state.messages.append({
-                    "role": "system",
-                    "content": f"✅ Geocodificado: {location.name} → {location.address}"
-                })
-                
+                return google_service.geocode(location_name)
             except ValueError as e:
-                state.error = f"No se pudo geocodificar '{location_name}': {str(e)}"
-                return state
-        
-        state.locations = geocoded_locations
-        
+                return e
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(geocode_one, all_locations))
+
+        _apply_results(state, all_locations, results, time.perf_counter() - start, workers)
+
+    except Exception as e:
+        state.error = f"Error en geocodificación: {str(e)}"
+
+    return state
+
+
+async def ageocode_node(state: GraphState) -> GraphState:
+    """
+    Versión async de geocode_node: las consultas comparten el event loop,
+    acotadas por un semáforo de GEOCODE_MAX_CONCURRENCY
+    """
+
+    all_locations = _locations_to_geocode(state)
+    if all_locations is None:
+        return state
+
+    google_service = get_services().google_maps_async
+    workers = max(1, min(get_settings().geocode_max_concurrency, len(all_locations)))
+    semaphore = asyncio.Semaphore(workers)
+
+    try:
+        start = time.perf_counter()
+
+        async def geocode_one(location_name: str) -> Union[Location, ValueError]:
+            async with semaphore:
+                try:
+                    return await google_service.geocode(location_name)
+                except ValueError as e:
+                    return e
+
+        # gather conserva el orden de entrada
+        results = await asyncio.gather(*(geocode_one(name) for name in all_locations))
+
+        _apply_results(state, all_locations, results, time.perf_counter() - start, workers)
+
+    except Exception as e:
+        state.error = f"Error en geocodificación: {str(e)}"
+
+    return state
+
+
+def _locations_to_geocode(state: GraphState) -> Optional[List[str]]:
+    """Origen + destinos, o None (con state.error) si faltan datos del nodo anterior"""
+    if not state.origin:
+        state.error = "No se pudo identificar el origen"
+        return None
+
+    if not state.destinations:
+        state.error = "No se identificaron destinos"
+        return None
+
+    return [state.origin] + state.destinations
+
+
+def _apply_results(
+    state: GraphState,
+    all_locations: List[str],
+    results: List[Union[Location, ValueError]],
+    elapsed_s: float,
+    workers: int
+) -> None:
+    """Guarda las ubicaciones en orden o reporta el primer error"""
+    geocoded_locations: list[Location] = []
+
+    for location_name, result in zip(all_locations, results):
+        if isinstance(result, ValueError):
+            state.error = f"No se pudo geocodificar '{location_name}': {str(result)}"
+            return
+
+        geocoded_locations.append(result)
         state.messages.append({
             "role": "system",
-            "content": f"✅ Total geocodificado: {len(geocoded_locations)} ubicaciones"
+            "content": f"✅ Geocodificado: {result.name} → {result.address}"
         })
-        
-    except Exception as e:
-        state.error = f"Error en geocodificación: {str(e)}"
-    
-    return state
\ No newline at end of file
+
+    state.locations = geocoded_locations
+
+    state.messages.append({
+        "role": "system",
+        "content": f"✅ Total geocodificado: {len(geocoded_locations)} ubicaciones "
+                  f"en {elapsed_s * 1000:.0f} ms (concurrencia {workers})"
+    })
@@ -1,88 +1,223 @@
 """
 Nodo 5: Obtiene direcciones detalladas para cada tramo de la ruta
 """
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+
+from googlemaps.convert import decode_polyline, encode_polyline
+from langgraph.config import get_stream_writer
+
+from app.config import get_settings
 from app.models.state import GraphState, RouteStep
-from app.services.google_maps import GoogleMapsService
+from app.services.google_maps import MAX_DIRECTIONS_WAYPOINTS
+from app.services.registry import get_services
 
 
 def get_directions_node(state: GraphState) -> GraphState:
     """
-    Obtiene direcciones paso a paso usando Google Directions API
-    para cada segmento de la ruta optimizada
+    Obtiene direcciones paso a paso usando Google Directions API.
+
+    La secuencia optimizada se pide como origen + waypoints + destino: una
+    llamada cubre hasta 26 tramos. Las rutas más largas se dividen en
+    bloques que comparten extremos y se piden en paralelo. Si un bloque
+    falla, solo sus tramos se construyen desde la matriz.
     """
-    
+
     if not state.optimized_order:
         state.error = "No hay ruta optimizada disponible"
         return state
-    
-    google_service = GoogleMapsService()
-    route_steps: list[RouteStep] = []
-    
-    try:
-        # Iterar sobre cada par consecutivo en la ruta
-        for i in range(len(state.optimized_order) - 1):
-            from_idx = state.optimized_order[i]
-            to_idx = state.optimized_order[i + 1]
-            
-            from_location = state.locations[from_idx]
-            to_location = state.locations[to_idx]
-            
-            # Obtener direcciones para este tramo
+
+    google_service = get_services().google_maps
+    chunks = _chunks(state.optimized_order)
+
+    def fetch(chunk: List[int]) -> Optional[List[RouteStep]]:
+        points = _chunk_points(state, chunk)
+        try:
             directions = google_service.get_directions(
-                origin=(from_location.lat, from_location.lng),
-                destination=(to_location.lat, to_location.lng)
-            )
-            
-            if not directions:
-                # Si no hay direcciones, usar datos de la matriz
-                distance_km = state.distance_matrix[from_idx][to_idx]
-                duration_min = state.duration_matrix[from_idx][to_idx]
-                polyline = None
-            else:
-                # Extraer información de la primera ruta
-                leg = directions[0]['legs'][0]
-                distance_km = leg['distance']['value'] / 1000.0
-                duration_min = leg['duration']['value'] // 60
-                polyline = directions[0]['overview_polyline']['points']
-            
-            # Crear step
-            step = RouteStep(
-                from_location=from_location.name,
-                to_location=to_location.name,
-                distance_km=round(distance_km, 2),
-                duration_min=duration_min,
-                polyline=polyline
+                origin=points[0],
+                destination=points[-1],
+                waypoints=points[1:-1]
             )
-            
-            route_steps.append(step)
-        
-        state.route_steps = route_steps
-        
-        state.messages.append({
-            "role": "system",
-            "content": f"✅ Direcciones obtenidas: {len(route_steps)} tramos"
+        except Exception:
+            return None
+        return _chunk_steps(state, chunk, directions)
+
+    if len(chunks) == 1:
+        results = [fetch(chunks[0])]
+    else:
+        workers = min(get_settings().directions_max_concurrency, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(fetch, chunks))
+
+    writer = _stream_writer()
+    for position, (chunk, steps) in enumerate(zip(chunks, results)):
+        _emit_legs(writer, state, position, chunk, steps)
+
+    _apply_results(state, chunks, results)
+    return state
+
+
+async def aget_directions_node(state: GraphState) -> GraphState:
+    """
+    Versión async de get_directions_node: los bloques se piden en el
+    event loop, acotados por DIRECTIONS_MAX_CONCURRENCY
+    """
+
+    if not state.optimized_order:
+        state.error = "No hay ruta optimizada disponible"
+        return state
+
+    google_service = get_services().google_maps_async
+    chunks = _chunks(state.optimized_order)
+    semaphore = asyncio.Semaphore(get_settings().directions_max_concurrency)
+
+    writer = _stream_writer()
+
+    async def fetch(position: int, chunk: List[int]) -> Optional[List[RouteStep]]:
+        points = _chunk_points(state, chunk)
+        try:
+            async with semaphore:
+                directions = await google_service.get_directions(
+                    origin=points[0],
+                    destination=points[-1],
+                    waypoints=points[1:-1]
+                )
+        except Exception:
+            directions = None
+        steps = _chunk_steps(state, chunk, directions) if directions is not None else None
+        # Cada bloque se emite en cuanto llega (stream de progreso)
+        _emit_legs(writer, state, position, chunk, steps)
+        return steps
+
+    results = await asyncio.gather(*(fetch(position, chunk) for position, chunk in enumerate(chunks)))
+
+    _apply_results(state, chunks, results)
+    return state
+
+
+def _chunks(order: List[int]) -> List[List[int]]:
+    """Bloques de índices en la ruta: [a, ..., b], [b, ..., c], ..."""
+    span = MAX_DIRECTIONS_WAYPOINTS + 1
+    return [
+        order[start:start + span + 1]
+        for start in range(0, len(order) - 1, span)
+    ]
+
+
+def _stream_writer() -> Optional[Callable[[Any], None]]:
+    """Escritor del stream "custom" de LangGraph, o None fuera del grafo (p. ej. lotes)"""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
+
+
+def _emit_legs(
+    writer: Optional[Callable[[Any], None]],
+    state: GraphState,
+    position: int,
+    chunk: List[int],
+    steps: Optional[List[RouteStep]]
+) -> None:
+    """Emite un evento "leg" por tramo del bloque (los fallidos con datos de la matriz)"""
+    if writer is None:
+        return
+
+    source = "directions" if steps is not None else "matrix"
+    offset = position * (MAX_DIRECTIONS_WAYPOINTS + 1)
+    for index, step in enumerate(steps if steps is not None else _matrix_steps(state, chunk)):
+        writer({
+            "event": "leg",
+            "index": offset + index,
+            "from": step.from_location,
+            "to": step.to_location,
+            "distance_km": step.distance_km,
+            "duration_min": step.duration_min,
+            "polyline": step.polyline,
+            "source": source,
         })
-        
-    except Exception as e:
-        # Si falla Directions API, construir steps básicos desde la matriz
+
+
+def _chunk_points(state: GraphState, chunk: List[int]) -> List[Tuple[float, float]]:
+    return [(state.locations[idx].lat, state.locations[idx].lng) for idx in chunk]
+
+
+def _chunk_steps(
+    state: GraphState,
+    chunk: List[int],
+    directions: List[Dict[str, Any]]
+) -> Optional[List[RouteStep]]:
+    """Tramos de un bloque a partir de sus legs, o None si la respuesta no sirve"""
+    if not directions or len(directions[0]['legs']) != len(chunk) - 1:
+        return None
+
+    route = directions[0]
+    steps = []
+    for from_idx, to_idx, leg in zip(chunk, chunk[1:], route['legs']):
+        steps.append(RouteStep(
+            from_location=state.locations[from_idx].name,
+            to_location=state.locations[to_idx].name,
+            distance_km=round(leg['distance']['value'] / 1000.0, 2),
+            duration_min=leg['duration']['value'] // 60,
+            polyline=_leg_polyline(leg, route, len(chunk) - 1)
+        ))
+    return steps
+
+
+def _apply_results(
+    state: GraphState,
+    chunks: List[List[int]],
+    results: List[Optional[List[RouteStep]]]
+) -> None:
+    """Une los tramos de cada bloque; los bloques fallidos usan la matriz"""
+    route_steps: list[RouteStep] = []
+    failed_chunks = 0
+    for chunk, steps in zip(chunks, results):
+        if steps is None:
+            # Si falla Directions API, construir steps básicos desde la matriz
+            failed_chunks += 1
+            steps = _matrix_steps(state, chunk)
+        route_steps.extend(steps)
+
+    state.route_steps = route_steps
+
+    if failed_chunks:
         state.messages.append({
             "role": "system",
-            "content": f"⚠️ Usando datos de matriz (Directions API falló): {str(e)}"
+            "content": f"⚠️ Usando datos de matriz en {failed_chunks}/{len(chunks)} bloques "
+                      f"(Directions API falló)"
         })
-        
-        for i in range(len(state.optimized_order) - 1):
-            from_idx = state.optimized_order[i]
-            to_idx = state.optimized_order[i + 1]
-            
-            step = RouteStep(
-                from_location=state.locations[from_idx].name,
-                to_location=state.locations[to_idx].name,
-                distance_km=round(state.distance_matrix[from_idx][to_idx], 2),
-                duration_min=state.duration_matrix[from_idx][to_idx],
-                polyline=None
-            )
-            route_steps.append(step)
-        
-        state.route_steps = route_steps
-    
-    return state
\ No newline at end of file
+
+    state.messages.append({
+        "role": "system",
+        "content": f"✅ Direcciones obtenidas: {len(route_steps)} tramos en {len(chunks)} solicitudes"
+    })
+
+
+def _matrix_steps(state: GraphState, chunk: List[int]) -> List[RouteStep]:
+    """Tramos de un bloque construidos con la matriz de distancias"""
+    return [
+        RouteStep(
+            from_location=state.locations[from_idx].name,
+            to_location=state.locations[to_idx].name,
+            distance_km=round(state.distance_matrix[from_idx][to_idx], 2),
+            duration_min=state.duration_matrix[from_idx][to_idx],
+            polyline=None
+        )
+        for from_idx, to_idx in zip(chunk, chunk[1:])
+    ]
+
+
+def _leg_polyline(leg: Dict[str, Any], route: Dict[str, Any], n_legs: int) -> Optional[str]:
+    """
+    Polyline de un tramo: une las polylines de sus pasos. Con un solo
+    tramo coincide con la polyline general de la ruta.
+    """
+    if n_legs == 1:
+        return route['overview_polyline']['points']
+
+    points = []
+    for step in leg.get('steps', []):
+        points.extend(decode_polyline(step['polyline']['points']))
+    return encode_polyline(points) if points else None
@@ -0,0 +1,62 @@
+"""
+Nodo 4 (flota): Reparte las paradas entre varios vehículos (VRP)
+"""
+from app.config import get_settings
+from app.models.state import GraphState
+from app.services.tsp_solver import solve_vrp_ortools
+
+
+def optimize_fleet_node(state: GraphState) -> GraphState:
+    """
+    Calcula rutas por vehículo sobre la matriz compartida, respetando
+    capacidades y duración máxima si se indicaron
+    """
+    
+    if not state.distance_matrix:
+        state.error = "No hay matriz de distancias disponible"
+        return state
+    
+    settings = get_settings()
+    
+    try:
+        routes, unassigned = solve_vrp_ortools(
+            state.distance_matrix,
+            num_vehicles=state.num_vehicles,
+            duration_matrix=state.duration_matrix,
+            vehicle_capacities=state.vehicle_capacities or None,
+            demands=[0] + state.demands if state.demands else None,
+            max_route_duration_min=state.max_route_duration_min,
+            return_to_start=state.return_to_origin,
+            balance_coefficient=settings.fleet_balance_coefficient,
+            time_limit_ms=settings.fleet_time_limit_ms
+        )
+        
+        state.fleet_routes = routes
+        state.unassigned_stops = unassigned
+        
+        # Totales de la flota desde la matriz
+        total_distance = 0.0
+        total_duration = 0
+        for route in routes:
+            for from_idx, to_idx in zip(route, route[1:]):
+                total_distance += state.distance_matrix[from_idx][to_idx]
+                total_duration += state.duration_matrix[from_idx][to_idx]
+        
+        state.total_distance_km = round(total_distance, 2)
+        state.total_duration_min = total_duration
+        
+        used = sum(1 for route in routes if any(idx != 0 for idx in route))
+        state.messages.append({
+            "role": "system",
+            "content": f"✅ Flota optimizada: {used}/{state.num_vehicles} vehículos, "
+                      f"{len(unassigned)} paradas sin asignar"
+        })
+        state.messages.append({
+            "role": "system",
+            "content": f"📊 Distancia total: {state.total_distance_km} km, Tiempo: {state.total_duration_min} min"
+        })
+        
+    except Exception as e:
+        state.error = f"Error optimizando flota: {str(e)}"
+    
+    return state
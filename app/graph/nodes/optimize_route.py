@@ -1,8 +1,13 @@
 """
 Nodo 4: Optimiza el orden de visita usando TSP
 """
+from typing import Any, Dict, Optional, Tuple
+import time
+
+from app.config import get_settings
 from app.models.state import GraphState
-from app.services.tsp_solver import TSPSolver, solve_tsp_ortools
+from app.services.metrics import record_solver
+from app.services.tsp_solver import TSPSolver, HeldKarpSolver, solve_tsp_ortools
 
 
 def optimize_route_node(state: GraphState) -> GraphState:
@@ -10,27 +15,69 @@ def optimize_route_node(state: GraphState) -> GraphState:
     Calcula el orden óptimo de visita para minimizar distancia total
     usando algoritmos TSP
     """
-    
+    state, run = solve_route(state)
+    if run is not None:
+        record_solver(**run)
+    return state
+
+
+def solve_route(state: GraphState) -> Tuple[GraphState, Optional[Dict[str, Any]]]:
+    """
+    Trabajo del nodo sin registrar métricas, para ejecutarlo en otro
+    proceso (lotes) y registrar en el proceso que atiende /metrics
+
+    Returns:
+        (estado, argumentos de record_solver o None si hubo error)
+    """
+    run = None
     if not state.distance_matrix:
         state.error = "No hay matriz de distancias disponible"
-        return state
+        return state, run
     
     try:
         # Decidir qué solver usar según el tamaño del problema
         n = len(state.distance_matrix)
+        settings = get_settings()
+        start = time.perf_counter()
+        solver = None
         
-        if n > 15:
-            # Para problemas grandes, usar OR-Tools (más robusto)
-            optimized_indices, total_distance = solve_tsp_ortools(
+        if n <= settings.held_karp_max_n:
+            # Para problemas pequeños, solución exacta (Held-Karp)
+            solver_name = "held_karp"
+            solver = HeldKarpSolver(
                 state.distance_matrix,
-                return_to_start=state.return_to_origin
+                max_n=settings.held_karp_max_n
             )
-        else:
-            # Para problemas pequeños, usar heurística propia
-            solver = TSPSolver(state.distance_matrix)
             optimized_indices, total_distance = solver.solve(
                 return_to_start=state.return_to_origin
             )
+        elif state.time_budget_ms:
+            # El cliente fijó un presupuesto: búsqueda multi-arranque en paralelo
+            solver_name = "anytime"
+            solver = TSPSolver(state.distance_matrix)
+            optimized_indices, total_distance = solver.solve_anytime(
+                state.time_budget_ms,
+                return_to_start=state.return_to_origin,
+                max_workers=settings.tsp_max_workers or None
+            )
+        elif n >= settings.tsp_large_n:
+            # Para rutas muy grandes, búsqueda local con listas de candidatos
+            solver_name = "candidates"
+            solver = TSPSolver(state.distance_matrix)
+            optimized_indices, total_distance = solver.solve_large(
+                return_to_start=state.return_to_origin,
+                neighbors=settings.tsp_neighbors
+            )
+        else:
+            # Entre HELD_KARP_MAX_N y TSP_LARGE_N, OR-Tools (sin OR-Tools
+            # instalado, solve_tsp_ortools usa vecino más cercano + 2-opt)
+            solver_name = "ortools"
+            optimized_indices, total_distance = solve_tsp_ortools(
+                state.distance_matrix,
+                return_to_start=state.return_to_origin,
+                # Límite proporcional al tamaño: GLS siempre agota su tiempo
+                time_limit_ms=min(settings.ortools_time_limit_ms, settings.ortools_ms_per_stop * n)
+            )
         
         # Guardar orden optimizado
         state.optimized_order = optimized_indices
@@ -49,6 +96,14 @@ def optimize_route_node(state: GraphState) -> GraphState:
         
         state.total_distance_km = round(total_distance, 2)
         
+        # Held-Karp y OR-Tools no exponen iteraciones
+        run = {
+            "solver": solver_name,
+            "seconds": time.perf_counter() - start,
+            "iterations": getattr(solver, "iterations", None),
+            "cost_km": state.total_distance_km,
+        }
+        
         # Calcular tiempo total aproximado
         total_duration = 0
         for i in range(len(optimized_indices) - 1):
@@ -72,4 +127,4 @@ def optimize_route_node(state: GraphState) -> GraphState:
     except Exception as e:
         state.error = f"Error optimizando ruta: {str(e)}"
     
-    return state
\ No newline at end of file
+    return state, run
\ No newline at end of file
@@ -1,8 +1,12 @@
 """
 Nodo 1: Parseo del input del usuario con LLM
 """
+from typing import Any, Dict, Optional
+
+from app.config import get_settings
 from app.models.state import GraphState
-from app.services.llm_service import LLMService
+from app.services.fast_parser import parse_route_fast, parser_stats
+from app.services.registry import get_services
 from app.utils.helpers import sanitize_location_name
 
 
@@ -15,42 +19,75 @@ def parse_input_node(state: GraphState) -> GraphState:
 		state.error = "Entrada de usuario vacía"
 		return state
 
-	llm = LLMService()
-
 	try:
-		parsed = llm.parse_route_input(state.user_input)
-
-		origin = sanitize_location_name(parsed.get("origin", "").strip())
-		destinations = [
-			sanitize_location_name(d)
-			for d in parsed.get("destinations", [])
-			if isinstance(d, str) and d.strip()
-		]
-		return_to_origin = bool(parsed.get("return_to_origin", False))
-
-		# Si no hay origen explícito, usar el primero de la lista
-		if not origin and destinations:
-			origin = destinations[0]
-			destinations = destinations[1:]
-
-		if not origin:
-			state.error = "No se pudo identificar el origen"
-			return state
-
-		if not destinations:
-			state.error = "No se identificaron destinos"
-			return state
-
-		state.origin = origin
-		state.destinations = destinations
-		state.return_to_origin = return_to_origin
-
-		state.messages.append({
-			"role": "system",
-			"content": f"✅ Parseo: origen='{origin}', destinos={len(destinations)}, volver={return_to_origin}"
-		})
+		parsed, source = _parse_fast(state.user_input), "reglas"
+		if parsed is None:
+			parsed, source = get_services().llm.parse_route_input(state.user_input), "LLM"
+		_apply_parsed(state, parsed, source)
+	except Exception as e:
+		state.error = f"Error parseando entrada: {str(e)}"
+
+	return state
+
+
+async def aparse_input_node(state: GraphState) -> GraphState:
+	"""
+	Versión async de parse_input_node
+	"""
+	if not state.user_input or not state.user_input.strip():
+		state.error = "Entrada de usuario vacía"
+		return state
 
+	try:
+		parsed, source = _parse_fast(state.user_input), "reglas"
+		if parsed is None:
+			parsed, source = await get_services().llm.aparse_route_input(state.user_input), "LLM"
+		_apply_parsed(state, parsed, source)
 	except Exception as e:
 		state.error = f"Error parseando entrada: {str(e)}"
 
 	return state
+
+
+def _parse_fast(user_input: str) -> Optional[Dict[str, Any]]:
+	"""Parser por reglas; None si hay que recurrir al LLM"""
+	if not get_settings().fast_parser_enabled:
+		return None
+
+	parsed = parse_route_fast(user_input)
+	parser_stats.count("fast_path_hits" if parsed is not None else "llm_fallbacks")
+	return parsed
+
+
+def _apply_parsed(state: GraphState, parsed: Dict[str, Any], source: str) -> None:
+	"""Limpia la respuesta del LLM y la guarda en el estado"""
+	origin = sanitize_location_name(parsed.get("origin", "").strip())
+	destinations = [
+		sanitize_location_name(d)
+		for d in parsed.get("destinations", [])
+		if isinstance(d, str) and d.strip()
+	]
+	return_to_origin = bool(parsed.get("return_to_origin", False))
+
+	# Si no hay origen explícito, usar el primero de la lista
+	if not origin and destinations:
+		origin = destinations[0]
+		destinations = destinations[1:]
+
+	if not origin:
+		state.error = "No se pudo identificar el origen"
+		return
+
+	if not destinations:
+		state.error = "No se identificaron destinos"
+		return
+
+	state.origin = origin
+	state.destinations = destinations
+	state.return_to_origin = return_to_origin
+
+	state.messages.append({
+		"role": "system",
+		"content": f"✅ Parseo ({source}): origen='{origin}', "
+				   f"destinos={len(destinations)}, volver={return_to_origin}"
+	})
@@ -1,14 +1,20 @@
 """
 Definición del grafo de LangGraph para el agente de rutas
 """
-from typing import Dict, Any
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+import threading
+import time
 from langgraph.graph import StateGraph, START, END
-from app.models.state import GraphState
-from app.graph.nodes.parse_input import parse_input_node
-from app.graph.nodes.geocode import geocode_node
-from app.graph.nodes.distance_matrix import distance_matrix_node
+from app.models.state import GraphState, Location
+from app.services.metrics import instrument_node, reset_metrics
+from app.utils.helpers import sanitize_location_name
+from app.graph.nodes.parse_input import parse_input_node, aparse_input_node
+from app.graph.nodes.geocode import geocode_node, ageocode_node
+from app.graph.nodes.distance_matrix import distance_matrix_node, adistance_matrix_node
 from app.graph.nodes.optimize_route import optimize_route_node
-from app.graph.nodes.get_directions import get_directions_node
+from app.graph.nodes.optimize_fleet import optimize_fleet_node
+from app.graph.nodes.get_directions import get_directions_node, aget_directions_node
 from app.graph.nodes.format_output import format_output_node
 
 
@@ -16,16 +22,26 @@ def _has_error(state: GraphState) -> bool:
 	return bool(state.error)
 
 
-def build_workflow() -> StateGraph:
+def _add_node(graph: StateGraph, name: str, node: Callable) -> None:
+	"""Registra un nodo midiendo su latencia y sus errores (/metrics)"""
+	graph.add_node(name, instrument_node(name, node))
+
+
+def build_workflow(asynchronous: bool = False) -> StateGraph:
+	"""
+	Con asynchronous=True los nodos de I/O son corutinas (para ainvoke);
+	los nodos de CPU siguen siendo síncronos y LangGraph los ejecuta en
+	un hilo aparte
+	"""
 	graph = StateGraph(GraphState)
 
 	# Registrar nodos
-	graph.add_node("parse", parse_input_node)
-	graph.add_node("geocode", geocode_node)
-	graph.add_node("distance_matrix", distance_matrix_node)
-	graph.add_node("optimize", optimize_route_node)
-	graph.add_node("directions", get_directions_node)
-	graph.add_node("format", format_output_node)
+	_add_node(graph, "parse", aparse_input_node if asynchronous else parse_input_node)
+	_add_node(graph, "geocode", ageocode_node if asynchronous else geocode_node)
+	_add_node(graph, "distance_matrix", adistance_matrix_node if asynchronous else distance_matrix_node)
+	_add_node(graph, "optimize", optimize_route_node)
+	_add_node(graph, "directions", aget_directions_node if asynchronous else get_directions_node)
+	_add_node(graph, "format", format_output_node)
 
 	# Flujo principal
 	graph.add_edge(START, "parse")
@@ -40,11 +56,299 @@ def build_workflow() -> StateGraph:
 	return graph
 
 
-def run_workflow(user_input: str) -> GraphState:
+def run_workflow(user_input: str, time_budget_ms: Optional[int] = None) -> GraphState:
 	"""
 	Helper síncrono para ejecutar el grafo completo y devolver el estado final
 	"""
-	state = GraphState(user_input=user_input)
-	graph = build_workflow().compile()
+	state = GraphState(user_input=user_input, time_budget_ms=time_budget_ms)
+	graph = get_compiled_workflow("route")
+	final_state: GraphState = graph.invoke(state)
+	return final_state
+
+
+async def arun_workflow(user_input: str, time_budget_ms: Optional[int] = None) -> GraphState:
+	"""
+	Ejecuta el grafo con ainvoke: la espera de red no ocupa hilos, así un
+	worker atiende cientos de solicitudes en vuelo
+	"""
+	state = GraphState(user_input=user_input, time_budget_ms=time_budget_ms)
+	graph = get_compiled_workflow("route", asynchronous=True)
+	final_state: GraphState = await graph.ainvoke(state)
+	return final_state
+
+
+async def astream_workflow(
+	user_input: str,
+	time_budget_ms: Optional[int] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+	"""
+	Ejecuta el grafo async emitiendo el progreso de cada nodo
+
+	Yields:
+		(evento, datos): "parsed", "geocoded", "matrix" y "optimized" al
+		terminar cada nodo, "leg" por tramo en cuanto llega su bloque de
+		Directions, y al final ("final", GraphState). Si un nodo falla se
+		emite ("final", estado con error) y el grafo se detiene.
+	"""
+	state = GraphState(user_input=user_input, time_budget_ms=time_budget_ms)
+	graph = get_compiled_workflow("route", asynchronous=True)
+
+	# aclosing: si el cliente se desconecta o un nodo falla, se cancela el resto del grafo
+	async with aclosing(graph.astream(state, stream_mode=["updates", "custom"])) as stream:
+		async for mode, chunk in stream:
+			if mode == "custom":
+				yield chunk.pop("event"), chunk
+				continue
+
+			for node, update in chunk.items():
+				state = update if isinstance(update, GraphState) else GraphState.model_validate(update)
+				if state.error:
+					yield "final", state
+					return
+				event = _progress_event(node, state)
+				if event is not None:
+					yield event
+
+	yield "final", state
+
+
+def _progress_event(node: str, state: GraphState) -> Optional[Tuple[str, Dict[str, Any]]]:
+	"""Resultado parcial que se puede mostrar al terminar cada nodo"""
+	if node == "parse":
+		return "parsed", {
+			"origin": state.origin,
+			"destinations": state.destinations,
+			"return_to_origin": state.return_to_origin,
+		}
+	if node == "geocode":
+		return "geocoded", {"locations": [location.model_dump() for location in state.locations]}
+	if node == "distance_matrix":
+		return "matrix", {"size": len(state.distance_matrix)}
+	if node == "optimize":
+		# Orden y totales desde la matriz: la ruta ya se puede mostrar
+		return "optimized", {
+			"optimized_order": state.optimized_locations,
+			"total_distance_km": state.total_distance_km,
+			"estimated_time_min": state.total_duration_min,
+		}
+	return None
+
+
+def build_fleet_workflow(asynchronous: bool = False) -> StateGraph:
+	"""
+	Grafo para planificar una flota: las paradas ya vienen estructuradas,
+	así que no hay parseo; una sola matriz compartida para todos los vehículos
+	"""
+	graph = StateGraph(GraphState)
+
+	_add_node(graph, "geocode", ageocode_node if asynchronous else geocode_node)
+	_add_node(graph, "distance_matrix", adistance_matrix_node if asynchronous else distance_matrix_node)
+	_add_node(graph, "optimize_fleet", optimize_fleet_node)
+
+	graph.add_edge(START, "geocode")
+	graph.add_edge("geocode", "distance_matrix")
+	graph.add_edge("distance_matrix", "optimize_fleet")
+	graph.add_edge("optimize_fleet", END)
+
+	return graph
+
+
+def run_fleet_workflow(
+	origin: str,
+	stops: List[str],
+	num_vehicles: int,
+	vehicle_capacities: Optional[List[int]] = None,
+	demands: Optional[List[int]] = None,
+	max_route_duration_min: Optional[int] = None,
+	return_to_origin: bool = True,
+) -> GraphState:
+	"""
+	Helper síncrono para planificar una flota completa en una sola ejecución
+	"""
+	state = _fleet_state(
+		origin, stops, num_vehicles, vehicle_capacities, demands,
+		max_route_duration_min, return_to_origin
+	)
+	graph = get_compiled_workflow("fleet")
+	final_state: GraphState = graph.invoke(state)
+	return final_state
+
+
+async def arun_fleet_workflow(
+	origin: str,
+	stops: List[str],
+	num_vehicles: int,
+	vehicle_capacities: Optional[List[int]] = None,
+	demands: Optional[List[int]] = None,
+	max_route_duration_min: Optional[int] = None,
+	return_to_origin: bool = True,
+) -> GraphState:
+	"""
+	Versión async de run_fleet_workflow (ainvoke)
+	"""
+	state = _fleet_state(
+		origin, stops, num_vehicles, vehicle_capacities, demands,
+		max_route_duration_min, return_to_origin
+	)
+	graph = get_compiled_workflow("fleet", asynchronous=True)
+	final_state: GraphState = await graph.ainvoke(state)
+	return final_state
+
+
+def _fleet_state(
+	origin: str,
+	stops: List[str],
+	num_vehicles: int,
+	vehicle_capacities: Optional[List[int]],
+	demands: Optional[List[int]],
+	max_route_duration_min: Optional[int],
+	return_to_origin: bool,
+) -> GraphState:
+	# Las paradas en blanco se descartan junto con su demanda, para que
+	# cada demanda siga correspondiendo a su parada
+	kept = [i for i, stop in enumerate(stops) if stop.strip()]
+	return GraphState(
+		user_input=f"Flota de {num_vehicles} vehículos desde {origin}",
+		origin=sanitize_location_name(origin),
+		destinations=[sanitize_location_name(stops[i]) for i in kept],
+		return_to_origin=return_to_origin,
+		num_vehicles=num_vehicles,
+		vehicle_capacities=vehicle_capacities or [],
+		demands=[demands[i] for i in kept] if demands else [],
+		max_route_duration_min=max_route_duration_min,
+	)
+
+
+def build_structured_workflow(asynchronous: bool = False) -> StateGraph:
+	"""
+	Grafo para paradas con coordenadas conocidas: sin parseo ni geocoding,
+	entra directamente en la matriz de distancias
+	"""
+	graph = StateGraph(GraphState)
+
+	_add_node(graph, "distance_matrix", adistance_matrix_node if asynchronous else distance_matrix_node)
+	_add_node(graph, "optimize", optimize_route_node)
+	_add_node(graph, "directions", aget_directions_node if asynchronous else get_directions_node)
+	_add_node(graph, "format", format_output_node)
+
+	graph.add_edge(START, "distance_matrix")
+	graph.add_edge("distance_matrix", "optimize")
+	graph.add_edge("optimize", "directions")
+	graph.add_edge("directions", "format")
+	graph.add_edge("format", END)
+
+	return graph
+
+
+def run_structured_workflow(
+	locations: List[Location],
+	return_to_origin: bool = False,
+	time_budget_ms: Optional[int] = None,
+) -> GraphState:
+	"""
+	Helper síncrono para una ruta con coordenadas ya conocidas
+	(la primera ubicación es el origen)
+	"""
+	state = _structured_state(locations, return_to_origin, time_budget_ms)
+	graph = get_compiled_workflow("structured")
 	final_state: GraphState = graph.invoke(state)
 	return final_state
+
+
+async def arun_structured_workflow(
+	locations: List[Location],
+	return_to_origin: bool = False,
+	time_budget_ms: Optional[int] = None,
+) -> GraphState:
+	"""
+	Versión async de run_structured_workflow (ainvoke)
+	"""
+	state = _structured_state(locations, return_to_origin, time_budget_ms)
+	graph = get_compiled_workflow("structured", asynchronous=True)
+	final_state: GraphState = await graph.ainvoke(state)
+	return final_state
+
+
+def _structured_state(
+	locations: List[Location],
+	return_to_origin: bool,
+	time_budget_ms: Optional[int],
+) -> GraphState:
+	names = [location.name for location in locations]
+	return GraphState(
+		user_input=f"Ruta estructurada de {len(locations)} ubicaciones",
+		origin=names[0] if names else None,
+		destinations=names[1:],
+		return_to_origin=return_to_origin,
+		time_budget_ms=time_budget_ms,
+		locations=locations,
+		messages=[{
+			"role": "system",
+			"content": f"✅ Coordenadas recibidas: {len(locations)} ubicaciones (sin parseo ni geocoding)"
+		}],
+	)
+
+
+_BUILDERS = {
+	"route": build_workflow,
+	"fleet": build_fleet_workflow,
+	"structured": build_structured_workflow,
+}
+_compiled: Dict[Tuple[str, bool], Any] = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_workflow(name: str = "route", asynchronous: bool = False):
+	"""
+	Grafo compilado una sola vez por proceso y reutilizado por todas las
+	solicitudes (el grafo compilado no guarda estado entre ejecuciones)
+	"""
+	key = (name, asynchronous)
+	with _compiled_lock:
+		graph = _compiled.get(key)
+		if graph is None:
+			graph = _BUILDERS[name](asynchronous=asynchronous).compile()
+			_compiled[key] = graph
+		return graph
+
+
+async def warm_up_workflows() -> Dict[str, float]:
+	"""
+	Compila todos los grafos y ejecuta el de rutas una vez contra servicios
+	simulados (sin red), para que la primera solicitud real no pague la
+	compilación ni la importación perezosa de dependencias. El de flotas
+	solo se compila: OR-Tools agotaría su límite de tiempo completo.
+
+	Returns:
+		Milisegundos de compilación (+ ejecución) por grafo
+	"""
+	from app.services.fast_parser import parser_stats
+	from app.services.registry import use_services
+	from app.services.stubs import stub_registry
+
+	timings: Dict[str, float] = {}
+	with use_services(stub_registry()):
+		for asynchronous in (False, True):
+			suffix = "_async" if asynchronous else ""
+
+			start = time.perf_counter()
+			graph = get_compiled_workflow("route", asynchronous=asynchronous)
+			state = GraphState(user_input="Lima, Miraflores, Barranco y Surco")
+			if asynchronous:
+				await graph.ainvoke(state)
+			else:
+				graph.invoke(state)
+			timings[f"route{suffix}"] = (time.perf_counter() - start) * 1000
+
+			start = time.perf_counter()
+			get_compiled_workflow("fleet", asynchronous=asynchronous)
+			timings[f"fleet{suffix}"] = (time.perf_counter() - start) * 1000
+
+			start = time.perf_counter()
+			get_compiled_workflow("structured", asynchronous=asynchronous)
+			timings[f"structured{suffix}"] = (time.perf_counter() - start) * 1000
+
+	# Las métricas deben reflejar solo tráfico real
+	parser_stats.reset()
+	reset_metrics()
+	return timings
@@ -1,15 +1,88 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import json
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from app.config import get_settings
-from app.graph.workflow import run_workflow
-from app.models.state import GraphState
-from app.models.schemas import RouteRequest, RouteResponse, RouteStepResponse
-from app.utils.helpers import format_distance, format_duration
+from app.graph.batch import RouteBatch
+from app.graph.jobs import JobWorkerPool
+from app.graph.workflow import (
+    arun_workflow,
+    arun_fleet_workflow,
+    arun_structured_workflow,
+    astream_workflow,
+    run_workflow,
+    warm_up_workflows,
+)
+from app.models.state import GraphState, Location
+from app.models.schemas import (
+    RouteRequest,
+    RouteResponse,
+    StructuredRouteRequest,
+    BatchRouteRequest,
+    RouteJobResponse,
+    RouteStepResponse,
+    FleetRouteRequest,
+    FleetRouteResponse,
+    VehicleRouteResponse,
+    SessionStopRequest,
+    SessionPositionRequest,
+)
+from app.services.cache import cache_stats
+from app.services.fast_parser import parser_stats
+from app.services.metrics import render_metrics
+from app.services.profiler import profile_call, save_profile
+from app.services.single_flight import single_flight_stats
+from app.services.tsp_solver import shutdown_process_pool, solver_pool_workers, warm_up_process_pool
+from app.services.response_cache import (
+    get_response_cache,
+    route_cache_key,
+    make_entry,
+    entry_max_age,
+    etag_matches,
+)
+from app.services.registry import get_services, init_services, close_services
+from app.services.job_queue import DONE, FAILED, get_job_queue
+from app.services.route_sessions import (
+    get_session_store,
+    add_stop,
+    remove_stop,
+    update_position,
+)
+from app.utils.helpers import format_distance, format_duration, build_google_maps_url
 
 
 settings = get_settings()
 
-app = FastAPI(title=settings.app_name, debug=settings.debug)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Clientes con pools de conexiones compartidos por todas las solicitudes
+    services = init_services()
+    if settings.warm_up_connections:
+        await services.warm_up()
+    # Grafos compilados una sola vez y ejercitados con servicios simulados
+    if settings.warm_up_graphs:
+        app.state.warm_up_ms = await warm_up_workflows()
+    # Pool de procesos de solve_anytime y de los lotes: crearlo en la primera
+    # solicitud con presupuesto se comería ese presupuesto
+    if settings.warm_up_solver_pool:
+        await asyncio.to_thread(warm_up_process_pool, solver_pool_workers())
+    # Procesos trabajadores de la cola de rutas (fuera del camino de las solicitudes)
+    app.state.job_pool = None
+    if settings.job_workers > 0:
+        app.state.job_pool = JobWorkerPool(get_job_queue(), settings.job_workers)
+        app.state.job_pool.start()
+    yield
+    if app.state.job_pool is not None:
+        await asyncio.to_thread(app.state.job_pool.stop)
+    shutdown_process_pool()
+    await close_services()
+
+
+app = FastAPI(title=settings.app_name, debug=settings.debug, lifespan=lifespan)
 
 # CORS (abierto por defecto; ajustar para producción)
 app.add_middleware(
@@ -30,12 +103,30 @@ def health():
         "status": "ok",
         "service": settings.app_name,
         "version": "1.0.0",
+        "caches": cache_stats(),
+        "clients": get_services().stats(),
+        "parser": parser_stats.stats(),
+        "single_flight": single_flight_stats(),
+        "jobs": app.state.job_pool.stats() if getattr(app.state, "job_pool", None) else None,
     }
-@app.post("/api/route", response_model=RouteResponse)
-def create_route(req: RouteRequest):
-    result = run_workflow(req.query)
 
-    # langgraph>=0.6 devuelve dict; convertir a GraphState
+
+@app.get("/metrics")
+def metrics():
+    """
+    Métricas del proceso en formato Prometheus (cada worker de uvicorn
+    exporta las suyas; Prometheus las agrega)
+    """
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Métricas deshabilitadas (METRICS_ENABLED=false)")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _to_state(result) -> GraphState:
+    """
+    langgraph>=0.6 devuelve dict; convertir a GraphState y
+    propagar el error del grafo como HTTP 400
+    """
     if isinstance(result, dict):
         try:
             result = GraphState.model_validate(result)
@@ -47,6 +138,10 @@ def create_route(req: RouteRequest):
     if result.error:
         raise HTTPException(status_code=400, detail=result.error)
 
+    return result
+
+
+def _build_route_response(result: GraphState, session_id: Optional[str] = None) -> RouteResponse:
     # Construir respuesta
     steps: list[RouteStepResponse] = []
     for s in result.route_steps:
@@ -68,10 +163,366 @@ def create_route(req: RouteRequest):
         estimated_time_min=result.total_duration_min,
         steps=steps,
         google_maps_url=result.google_maps_url,
+        session_id=session_id,
     )
     return resp
 
 
+@app.post("/api/route", response_model=RouteResponse)
+async def create_route(
+    req: RouteRequest,
+    if_none_match: Optional[str] = Header(None),
+    x_profile: Optional[str] = Header(None),
+    profile: bool = Query(False),
+):
+    """
+    Las consultas repetidas (mismo texto normalizado y opciones) se responden
+    desde la caché sin ejecutar el grafo; ETag + If-None-Match devuelven 304.
+    Con X-Profile: 1 o ?profile=1 (requiere PROFILING_ENABLED) se perfila
+    la ejecución y el id del perfil vuelve en X-Profile-Id.
+    """
+    if profile or (x_profile or "").lower() in ("1", "true", "yes"):
+        return await _create_profiled_route(req)
+
+    cache = get_response_cache()
+    key = route_cache_key(req.query, req.time_budget_ms)
+    entry = cache.get(key) if cache is not None else None
+    status = "HIT"
+
+    if entry is None or entry_max_age(entry) <= 0:
+        result = _to_state(await arun_workflow(req.query, time_budget_ms=req.time_budget_ms))
+        entry = make_entry(_build_route_response(result).model_dump(mode="json", by_alias=True))
+        if cache is not None:
+            cache.set(key, entry)
+        status = "MISS"
+
+    headers = {
+        "ETag": entry["etag"],
+        "Cache-Control": f"private, max-age={max(entry_max_age(entry), 0)}",
+        "X-Cache": status,
+    }
+    if etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=entry["body"], headers=headers)
+
+
+def _profiled_route(req: RouteRequest):
+    """
+    Ejecuta el grafo síncrono (todos los nodos en este hilo) bajo el
+    muestreador de pila y guarda el perfil; devuelve (resultado, id)
+    """
+    result, sampler = profile_call(run_workflow, req.query, time_budget_ms=req.time_budget_ms)
+    error = result.get("error") if isinstance(result, dict) else result.error
+    profile_id = save_profile(
+        sampler,
+        name=f"POST /api/route: {req.query[:80]}",
+        metadata={
+            "endpoint": "/api/route",
+            "query": req.query,
+            "time_budget_ms": req.time_budget_ms,
+            "error": error,
+        }
+    )
+    return result, profile_id
+
+
+async def _create_profiled_route(req: RouteRequest) -> JSONResponse:
+    """Siempre ejecuta el grafo (sin caché de respuestas) y adjunta X-Profile-Id"""
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=403, detail="Perfilado deshabilitado (PROFILING_ENABLED=false)")
+
+    result, profile_id = await asyncio.to_thread(_profiled_route, req)
+    headers = {"X-Profile-Id": profile_id, "Cache-Control": "no-store"}
+    try:
+        state = _to_state(result)
+    except HTTPException as e:
+        # Las rutas que fallan también se pueden analizar
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+    return JSONResponse(content=_build_route_response(state).model_dump(mode="json", by_alias=True), headers=headers)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _route_event_stream(query: str, time_budget_ms: Optional[int]) -> StreamingResponse:
+    """
+    Server-sent events con el progreso del grafo: parsed, geocoded, matrix,
+    optimized, un leg por tramo y al final result (o error)
+    """
+    async def stream():
+        async for event, data in astream_workflow(query, time_budget_ms=time_budget_ms):
+            if event != "final":
+                yield _sse(event, data)
+            elif data.error:
+                yield _sse("error", {"detail": data.error})
+            else:
+                yield _sse("result", _build_route_response(data).model_dump(mode="json", by_alias=True))
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Sin buffering en proxies (nginx) para que cada evento llegue al instante
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/route/stream")
+def stream_route_get(
+    query: str = Query(..., min_length=1),
+    time_budget_ms: Optional[int] = Query(None, ge=50, le=60000),
+):
+    """Igual que POST /api/route/stream, para EventSource (solo admite GET)"""
+    return _route_event_stream(query, time_budget_ms)
+
+
+@app.post("/api/route/stream")
+def stream_route(req: RouteRequest):
+    """
+    Calcula la ruta emitiendo cada etapa por SSE: el orden optimizado se
+    puede mostrar antes de que lleguen las direcciones
+    """
+    return _route_event_stream(req.query, req.time_budget_ms)
+
+
+@app.post("/api/route/structured", response_model=RouteResponse)
+async def create_structured_route(req: StructuredRouteRequest):
+    """
+    Ruta a partir de coordenadas conocidas: sin LLM ni geocoding,
+    entra directamente en la matriz de distancias
+    """
+    locations = [Location(name=loc.name.strip(), lat=loc.lat, lng=loc.lng) for loc in req.locations]
+    result = _to_state(await arun_structured_workflow(
+        locations,
+        return_to_origin=req.return_to_origin,
+        time_budget_ms=req.time_budget_ms,
+    ))
+    return _build_route_response(result)
+
+
+@app.post("/api/routes/batch")
+async def create_route_batch(req: BatchRouteRequest):
+    """
+    Planifica muchas rutas en una sola solicitud: cada ubicación distinta
+    se geocodifica una vez y las celdas de matriz se piden una vez para
+    todo el lote. Responde NDJSON: una línea por ruta en cuanto termina
+    ({"index", "id", "route"} o {"index", "id", "error"}) y al final
+    {"summary": ...} con las llamadas realizadas.
+    """
+    if len(req.routes) > settings.batch_max_routes:
+        raise HTTPException(status_code=400, detail=f"Máximo {settings.batch_max_routes} rutas por lote")
+
+    batch = RouteBatch()
+    for item in req.routes:
+        if item.locations is not None:
+            batch.add_locations(
+                [Location(name=loc.name.strip(), lat=loc.lat, lng=loc.lng) for loc in item.locations],
+                return_to_origin=item.return_to_origin,
+                time_budget_ms=item.time_budget_ms,
+            )
+        else:
+            batch.add_query(item.query, time_budget_ms=item.time_budget_ms)
+
+    async def stream():
+        async for index, state in batch.run():
+            line = {"index": index, "id": req.routes[index].id}
+            if state.error:
+                line["error"] = state.error
+            else:
+                line["route"] = _build_route_response(state).model_dump(by_alias=True)
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        yield json.dumps({"summary": batch.stats}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _job_response(job: dict) -> RouteJobResponse:
+    result = None
+    if job["status"] == DONE and job["result"]:
+        result = _build_route_response(GraphState.model_validate(job["result"]))
+    return RouteJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        attempts=job["attempts"],
+        result=result,
+        error=job["error"],
+    )
+
+
+@app.post("/api/route/jobs", response_model=RouteJobResponse, status_code=202)
+def create_route_job(req: RouteRequest, response: Response):
+    """
+    Encola la ruta para los procesos trabajadores y responde al instante;
+    el resultado se consulta en GET /api/route/jobs/{job_id}
+    """
+    if settings.job_workers <= 0:
+        raise HTTPException(status_code=503, detail="Cola de trabajos deshabilitada (JOB_WORKERS=0)")
+
+    queue = get_job_queue()
+    job_id = queue.enqueue({"query": req.query, "time_budget_ms": req.time_budget_ms})
+    response.headers["Location"] = f"/api/route/jobs/{job_id}"
+    return _job_response(queue.get(job_id))
+
+
+@app.get("/api/route/jobs/{job_id}", response_model=RouteJobResponse)
+async def get_route_job(job_id: str, wait_s: float = 0):
+    """
+    Estado y resultado del trabajo. Con wait_s (máx. 30) espera a que
+    termine antes de responder (long polling)
+    
+    Las lecturas de SQLite van a un hilo: la espera no bloquea el event loop
+    """
+    queue = await asyncio.to_thread(get_job_queue)
+    job = await asyncio.to_thread(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+
+    deadline = asyncio.get_running_loop().time() + min(max(wait_s, 0), 30)
+    while job["status"] not in (DONE, FAILED) and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(settings.job_poll_interval_s)
+        job = await asyncio.to_thread(queue.get, job_id)
+
+    return await asyncio.to_thread(_job_response, job)
+
+
+@app.post("/api/route/sessions", response_model=RouteResponse)
+async def create_route_session(req: RouteRequest):
+    """
+    Calcula la ruta y guarda el estado para actualizaciones incrementales
+    """
+    result = _to_state(await arun_workflow(req.query, time_budget_ms=req.time_budget_ms))
+    session_id = get_session_store().create(result)
+    return _build_route_response(result, session_id)
+
+
+def _update_session(session_id: str, operation) -> RouteResponse:
+    """
+    Aplica una operación incremental sobre una copia del estado de la
+    sesión y solo la guarda si tuvo éxito
+    """
+    store = get_session_store()
+    session = store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+
+    with session.lock:
+        state = session.state.model_copy(deep=True)
+        try:
+            state = operation(state)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        store.save(session_id, state)
+
+    return _build_route_response(state, session_id)
+
+
+@app.get("/api/route/sessions/{session_id}", response_model=RouteResponse)
+def get_route_session(session_id: str):
+    session = get_session_store().get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+    return _build_route_response(session.state, session_id)
+
+
+@app.post("/api/route/sessions/{session_id}/stops", response_model=RouteResponse)
+def add_session_stop(session_id: str, req: SessionStopRequest):
+    """
+    Agrega una parada (inserción más barata + 2-opt local)
+    """
+    return _update_session(session_id, lambda state: add_stop(state, req.location))
+
+
+@app.delete("/api/route/sessions/{session_id}/stops/{location}", response_model=RouteResponse)
+def remove_session_stop(session_id: str, location: str):
+    """
+    Quita una parada sin llamadas externas
+    """
+    return _update_session(session_id, lambda state: remove_stop(state, location))
+
+
+@app.put("/api/route/sessions/{session_id}/position", response_model=RouteResponse)
+def update_session_position(session_id: str, req: SessionPositionRequest):
+    """
+    Actualiza la posición del conductor (nuevo origen)
+    """
+    coordinates = (req.lat, req.lng) if req.lat is not None and req.lng is not None else None
+    return _update_session(
+        session_id,
+        lambda state: update_position(state, req.location, coordinates)
+    )
+
+
+@app.delete("/api/route/sessions/{session_id}")
+def delete_route_session(session_id: str):
+    if not get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o expirada")
+    return {"status": "deleted", "session_id": session_id}
+
+
+@app.post("/api/route/fleet", response_model=FleetRouteResponse)
+async def create_fleet_route(req: FleetRouteRequest):
+    """
+    Planifica toda la flota en una sola ejecución (una sola matriz compartida)
+    """
+    result = _to_state(await arun_fleet_workflow(
+        origin=req.origin,
+        stops=req.stops,
+        num_vehicles=req.num_vehicles,
+        vehicle_capacities=req.vehicle_capacities,
+        demands=req.demands,
+        max_route_duration_min=req.max_route_duration_min,
+        return_to_origin=req.return_to_origin,
+    ))
+
+    vehicles: list[VehicleRouteResponse] = []
+    for vehicle, route in enumerate(result.fleet_routes):
+        # Omitir vehículos sin paradas asignadas
+        if not any(idx != 0 for idx in route):
+            continue
+
+        names = [result.locations[idx].name for idx in route]
+        steps: list[RouteStepResponse] = []
+        distance_km = 0.0
+        duration_min = 0
+        for from_idx, to_idx in zip(route, route[1:]):
+            leg_km = result.distance_matrix[from_idx][to_idx]
+            leg_min = result.duration_matrix[from_idx][to_idx]
+            distance_km += leg_km
+            duration_min += leg_min
+            steps.append(
+                RouteStepResponse(
+                    **{
+                        "from": result.locations[from_idx].name,
+                        "to": result.locations[to_idx].name,
+                        "distance": format_distance(leg_km),
+                        "time": format_duration(leg_min),
+                    }
+                )
+            )
+
+        vehicles.append(
+            VehicleRouteResponse(
+                vehicle=vehicle,
+                optimized_order=names,
+                total_distance_km=round(distance_km, 2),
+                estimated_time_min=duration_min,
+                steps=steps,
+                google_maps_url=build_google_maps_url(names),
+            )
+        )
+
+    return FleetRouteResponse(
+        origin=result.origin or "",
+        vehicles=vehicles,
+        unassigned=[result.locations[idx].name for idx in result.unassigned_stops],
+        total_distance_km=result.total_distance_km,
+        estimated_time_min=result.total_duration_min,
+    )
+
+
 @app.get("/api/info")
 def api_info():
     """
@@ -82,7 +533,14 @@ def api_info():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "calculate_route": "POST /api/route",
+            "structured_route": "POST /api/route/structured",
+            "batch_routes": "POST /api/routes/batch",
+            "route_jobs": "POST /api/route/jobs",
+            "route_stream": "GET/POST /api/route/stream",
+            "plan_fleet": "POST /api/route/fleet",
+            "route_sessions": "POST /api/route/sessions",
             "docs": "/docs",
             "openapi": "/openapi.json",
         },
@@ -102,4 +560,5 @@ def root():
         "docs": "/docs",
         "api_info": "/api/info",
         "health": "/health",
+        "metrics": "/metrics",
     }
\ No newline at end of file
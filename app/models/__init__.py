@@ -4,7 +4,21 @@
 Modelos de datos usando Pydantic V2
 """
 from app.models.state import GraphState, Location, RouteStep
-from app.models.schemas import RouteRequest, RouteResponse, RouteStepResponse
+from app.models.schemas import (
+    RouteRequest,
+    RouteResponse,
+    RouteStepResponse,
+    StructuredLocation,
+    StructuredRouteRequest,
+    BatchRouteItem,
+    BatchRouteRequest,
+    RouteJobResponse,
+    SessionStopRequest,
+    SessionPositionRequest,
+    FleetRouteRequest,
+    FleetRouteResponse,
+    VehicleRouteResponse
+)
 
 __all__ = [
     "GraphState",
@@ -12,5 +26,15 @@ __all__ = [
     "RouteStep",
     "RouteRequest",
     "RouteResponse",
-    "RouteStepResponse"
+    "RouteStepResponse",
+    "StructuredLocation",
+    "StructuredRouteRequest",
+    "BatchRouteItem",
+    "BatchRouteRequest",
+    "RouteJobResponse",
+    "SessionStopRequest",
+    "SessionPositionRequest",
+    "FleetRouteRequest",
+    "FleetRouteResponse",
+    "VehicleRouteResponse"
 ]
\ No newline at end of file
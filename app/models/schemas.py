@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from typing import Optional
+from pydantic import BaseModel, Field, model_validator
 
 class RouteRequest(BaseModel):
     query: str = Field(
@@ -6,6 +7,57 @@ class RouteRequest(BaseModel):
         description="Texto natural describiendo la ruta",
         examples=["Estoy en Lima, quiero ir a Miraflores, Barranco y Surco"]
     )
+    time_budget_ms: Optional[int] = Field(
+        None,
+        ge=50,
+        le=60000,
+        description="Presupuesto de tiempo del optimizador en ms (búsqueda multi-arranque en paralelo)",
+        examples=[200, 10000]
+    )
+
+class StructuredLocation(BaseModel):
+    name: str = Field(..., min_length=1, examples=["Miraflores"])
+    lat: float = Field(..., ge=-90, le=90, examples=[-12.1211])
+    lng: float = Field(..., ge=-180, le=180, examples=[-77.0297])
+
+class StructuredRouteRequest(BaseModel):
+    locations: list[StructuredLocation] = Field(
+        ...,
+        min_length=2,
+        description="Ubicaciones con coordenadas; la primera es el origen",
+        examples=[[
+            {"name": "Lima", "lat": -12.0464, "lng": -77.0428},
+            {"name": "Miraflores", "lat": -12.1211, "lng": -77.0297},
+            {"name": "Barranco", "lat": -12.1400, "lng": -77.0210},
+        ]]
+    )
+    return_to_origin: bool = False
+    time_budget_ms: Optional[int] = Field(
+        None,
+        ge=50,
+        le=60000,
+        description="Presupuesto de tiempo del optimizador en ms (búsqueda multi-arranque en paralelo)"
+    )
+
+class BatchRouteItem(BaseModel):
+    id: Optional[str] = Field(None, description="Identificador del cliente, se devuelve con el resultado")
+    query: Optional[str] = Field(None, description="Texto natural describiendo la ruta")
+    locations: Optional[list[StructuredLocation]] = Field(
+        None,
+        min_length=2,
+        description="Ubicaciones con coordenadas (en lugar de query); la primera es el origen"
+    )
+    return_to_origin: bool = False
+    time_budget_ms: Optional[int] = Field(None, ge=50, le=60000)
+
+    @model_validator(mode="after")
+    def check_input(self):
+        if (self.query is None) == (self.locations is None):
+            raise ValueError("Cada ruta necesita query o locations (solo uno)")
+        return self
+
+class BatchRouteRequest(BaseModel):
+    routes: list[BatchRouteItem] = Field(..., min_length=1)
 
 class RouteStepResponse(BaseModel):
     from_location: str = Field(alias="from")
@@ -20,6 +72,79 @@ class RouteResponse(BaseModel):
     estimated_time_min: int
     steps: list[RouteStepResponse]
     google_maps_url: str = ""
+    session_id: Optional[str] = None
 
     class Config:
-        populate_by_name = True
\ No newline at end of file
+        populate_by_name = True
+
+
+class RouteJobResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, done o failed")
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    attempts: int = 0
+    result: Optional[RouteResponse] = None
+    error: Optional[str] = None
+
+
+class SessionStopRequest(BaseModel):
+    location: str = Field(..., min_length=1, examples=["Surco"])
+
+class SessionPositionRequest(BaseModel):
+    location: str = Field(
+        ...,
+        min_length=1,
+        description="Nombre de la posición actual del conductor",
+        examples=["Av. Javier Prado 123"]
+    )
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lng: Optional[float] = Field(None, ge=-180, le=180)
+
+class FleetRouteRequest(BaseModel):
+    origin: str = Field(
+        ...,
+        description="Punto de partida común de todos los vehículos (depósito)",
+        examples=["Lima"]
+    )
+    stops: list[str] = Field(
+        ...,
+        min_length=1,
+        description="Paradas a repartir entre la flota",
+        examples=[["Miraflores", "Barranco", "Surco", "San Isidro"]]
+    )
+    num_vehicles: int = Field(..., ge=1, le=100)
+    vehicle_capacities: Optional[list[int]] = Field(
+        None,
+        description="Capacidad de cada vehículo (una por vehículo)"
+    )
+    demands: Optional[list[int]] = Field(
+        None,
+        description="Demanda de cada parada (una por parada); por defecto 1"
+    )
+    max_route_duration_min: Optional[int] = Field(None, ge=1)
+    return_to_origin: bool = True
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        if self.vehicle_capacities is not None and len(self.vehicle_capacities) != self.num_vehicles:
+            raise ValueError("vehicle_capacities debe tener un valor por vehículo")
+        if self.demands is not None and len(self.demands) != len(self.stops):
+            raise ValueError("demands debe tener un valor por parada")
+        return self
+
+class VehicleRouteResponse(BaseModel):
+    vehicle: int
+    optimized_order: list[str]
+    total_distance_km: float
+    estimated_time_min: int
+    steps: list[RouteStepResponse]
+    google_maps_url: str = ""
+
+class FleetRouteResponse(BaseModel):
+    origin: str
+    vehicles: list[VehicleRouteResponse]
+    unassigned: list[str]
+    total_distance_km: float
+    estimated_time_min: int
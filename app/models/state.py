@@ -29,6 +29,15 @@ class GraphState(BaseModel):
     destinations: list[str] = Field(default_factory=list)
     return_to_origin: bool = False
 
+    # Solver options
+    time_budget_ms: Optional[int] = None
+
+    # Fleet planning (VRP)
+    num_vehicles: int = 1
+    vehicle_capacities: list[int] = Field(default_factory=list)
+    demands: list[int] = Field(default_factory=list)
+    max_route_duration_min: Optional[int] = None
+
     # Geocoded locations
     locations: list[Location] = Field(default_factory=list)
 
@@ -40,6 +49,10 @@ class GraphState(BaseModel):
     optimized_order: list[int] = Field(default_factory=list)
     optimized_locations: list[str] = Field(default_factory=list)
 
+    # Optimized fleet routes (índices por vehículo)
+    fleet_routes: list[list[int]] = Field(default_factory=list)
+    unassigned_stops: list[int] = Field(default_factory=list)
+
     # Final route details
     route_steps: list[RouteStep] = Field(default_factory=list)
     total_distance_km: float = 0.0
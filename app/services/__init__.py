@@ -4,12 +4,24 @@
 Servicios para APIs externas
 """
 from app.services.google_maps import GoogleMapsService
+from app.services.google_maps_async import AsyncGoogleMapsService
 from app.services.llm_service import LLMService
-from app.services.tsp_solver import TSPSolver, solve_tsp_ortools
+from app.services.registry import ServiceRegistry, get_services
+from app.services.tsp_solver import (
+    TSPSolver,
+    HeldKarpSolver,
+    solve_tsp_ortools,
+    solve_vrp_ortools
+)
 
 __all__ = [
     "GoogleMapsService",
+    "AsyncGoogleMapsService",
     "LLMService",
+    "ServiceRegistry",
+    "get_services",
     "TSPSolver",
-    "solve_tsp_ortools"
+    "HeldKarpSolver",
+    "solve_tsp_ortools",
+    "solve_vrp_ortools"
 ]
\ No newline at end of file
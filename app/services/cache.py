@@ -0,0 +1,366 @@
+"""
+Caché de dos niveles: LRU en memoria del proceso delante de un almacén
+SQLite en disco compartido entre procesos (varios workers de uvicorn)
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import get_settings
+
+
+class LRUCache:
+    """LRU en memoria con TTL, seguro entre hilos"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        """ttl_seconds acorta el TTL de la entrada (p. ej. lo que le queda en disco)"""
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Almacén clave/valor JSON en SQLite con TTL y tamaño acotado
+
+    Usa modo WAL y timeout de espera para que varios procesos lean y
+    escriban el mismo archivo. Cada hilo abre su propia conexión.
+
+    Los aciertos no escriben accessed_at al momento: se acumulan y se
+    guardan en una sola transacción cada TOUCH_BATCH aciertos o
+    TOUCH_FLUSH_S segundos (y antes de desalojar), así las lecturas no
+    toman el bloqueo de escritura de la base.
+    """
+
+    # Cada cuántas escrituras se revisa el límite de tamaño
+    EVICT_EVERY = 100
+
+    # Aciertos acumulados antes de guardar sus accessed_at
+    TOUCH_BATCH = 100
+    TOUCH_FLUSH_S = 5.0
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 100000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        # Contador compartido por los hilos (cada uno con su conexión)
+        self._writes_lock = threading.Lock()
+        self._writes = 0
+        # accessed_at pendientes de guardar, por clave
+        self._touch_lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._touched_since = time.time()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_with_expiry(key)
+        return entry[0] if entry is not None else None
+
+    def get_with_expiry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, expires_at) o None si no está o expiró"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+
+        self._touch([key], now)
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + (ttl_seconds or self.ttl_seconds), now)
+        )
+        self._count_writes(1)
+
+    # Máximo de parámetros por consulta IN (...)
+    BATCH_SIZE = 500
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Lee varias claves con una consulta por lote"""
+        return {key: value for key, (value, _) in self.get_many_with_expiry(keys).items()}
+
+    def get_many_with_expiry(self, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        """Como get_many, con el expires_at de cada clave encontrada"""
+        conn = self._connect()
+        now = time.time()
+        found: Dict[str, Tuple[Any, float]] = {}
+
+        for start in range(0, len(keys), self.BATCH_SIZE):
+            batch = keys[start:start + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, value, expires_at FROM cache WHERE key IN ({placeholders}) AND expires_at >= ?",
+                (*batch, now)
+            ).fetchall()
+            for key, value, expires_at in rows:
+                found[key] = (json.loads(value), expires_at)
+
+        if found:
+            self._touch(found, now)
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Escribe varias claves en una sola transacción"""
+        if not items:
+            return
+        now = time.time()
+        self._execute_many(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            [(key, json.dumps(value), now + self.ttl_seconds, now) for key, value in items.items()]
+        )
+        self._count_writes(len(items))
+
+    def _count_writes(self, writes: int) -> None:
+        """Cuenta escrituras y, cada EVICT_EVERY, revisa el límite (en un solo hilo)"""
+        with self._writes_lock:
+            self._writes += writes
+            due = self._writes >= self.EVICT_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def _touch(self, keys: Iterable[str], now: float) -> None:
+        """Anota el acceso; se guarda al juntar TOUCH_BATCH o pasar TOUCH_FLUSH_S"""
+        with self._touch_lock:
+            for key in keys:
+                self._touched[key] = now
+            if len(self._touched) < self.TOUCH_BATCH and now - self._touched_since < self.TOUCH_FLUSH_S:
+                return
+        self.flush_touches()
+
+    def flush_touches(self) -> None:
+        """Guarda los accessed_at pendientes en una transacción"""
+        with self._touch_lock:
+            rows = [(accessed_at, key) for key, accessed_at in self._touched.items()]
+            self._touched.clear()
+            self._touched_since = time.time()
+        if not rows:
+            return
+        try:
+            self._execute_many("UPDATE cache SET accessed_at = ? WHERE key = ?", rows)
+        except sqlite3.Error:
+            # Solo afecta el orden de desalojo: no vale la pena fallar la lectura
+            pass
+
+    def _execute_many(self, sql: str, rows: List[tuple]) -> None:
+        """executemany dentro de una única transacción"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(sql, rows)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def evict(self) -> None:
+        """Elimina expirados y, si se supera el límite, los menos usados"""
+        self.flush_touches()
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+
+class TieredCache:
+    """LRU en memoria + SQLite en disco, con contadores de aciertos"""
+
+    def __init__(self, name: str, memory: LRUCache, disk: Optional[SQLiteCache] = None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.disk is not None:
+            try:
+                entry = self.disk.get_with_expiry(key)
+            except sqlite3.Error:
+                entry = None
+            if entry is not None:
+                value, expires_at = entry
+                # En memoria solo por lo que le queda en disco
+                self.memory.set(key, value, ttl_seconds=expires_at - time.time())
+                self._count("disk_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error:
+                # El disco es una optimización: si falla, seguir solo en memoria
+                pass
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Busca varias claves: primero en memoria, el resto en disco en lote"""
+        found: Dict[str, Any] = {}
+        pending: List[str] = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                pending.append(key)
+        memory_hits = len(found)
+
+        disk_hits = 0
+        if pending and self.disk is not None:
+            try:
+                from_disk = self.disk.get_many_with_expiry(pending)
+            except sqlite3.Error:
+                from_disk = {}
+            now = time.time()
+            for key, (value, expires_at) in from_disk.items():
+                self.memory.set(key, value, ttl_seconds=expires_at - now)
+                found[key] = value
+            disk_hits = len(from_disk)
+
+        self._count("memory_hits", memory_hits)
+        self._count("disk_hits", disk_hits)
+        self._count("misses", len(pending) - disk_hits)
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        for key, value in items.items():
+            self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set_many(items)
+            except sqlite3.Error:
+                pass
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(
+    name: str,
+    ttl_seconds: float,
+    max_entries: int,
+    memory_entries: int = 1024,
+    persistent: bool = True
+) -> TieredCache:
+    """
+    Caché compartida por el proceso, creada la primera vez que se pide.
+    El archivo en disco es {cache_dir}/{name}.sqlite3.
+    """
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            disk = None
+            if persistent:
+                path = os.path.join(get_settings().cache_dir, f"{name}.sqlite3")
+                try:
+                    disk = SQLiteCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries)
+                except (sqlite3.Error, OSError):
+                    # Sin disco escribible: solo caché en memoria
+                    disk = None
+            cache = TieredCache(
+                name,
+                LRUCache(max_entries=memory_entries, ttl_seconds=ttl_seconds),
+                disk
+            )
+            _caches[name] = cache
+        return cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Contadores de todas las cachés creadas en este proceso"""
+    with _caches_lock:
+        return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,160 @@
+"""
+Parser determinista para consultas ya estructuradas. Reconoce cadenas con
+flechas ("A -> B -> C"), listas con origen explícito ("Desde X: A, B y C")
+y la palabra de regreso ("y volver"). Si no está seguro (conectores como
+"a", "desde" o "pero", regreso negado) devuelve None y el nodo de parseo
+recurre al LLM.
+"""
+from typing import Any, Dict, List, Optional
+import re
+import threading
+
+
+# Cadena con flechas: A -> B -> C
+_ARROW = re.compile(r"\s*(?:->|→|=>|➔)\s*")
+
+# Origen explícito al inicio: "desde X: ...", "origen X, ...", "from X: ..."
+_ORIGIN = re.compile(
+    r"^\s*(?:desde|origen|partiendo de|saliendo de|salgo de|from)\s*:?\s+"
+    r"(?P<origin>[^:,;]+?)\s*(?::|,|;|\s+(?:a|hacia|visitar|visitando|to)\s+)\s*(?P<rest>.+)$",
+    re.IGNORECASE
+)
+
+# Regreso al final: "y volver", "regresar al inicio", "ida y vuelta", "and return"
+_RETURN = re.compile(
+    r"(?:[,;]?\s*(?:y|e|and|then)?\s*)"
+    r"(?:volver|regresar|retornar|return|ida y vuelta|round trip)"
+    r"(?:\s+(?:a|al|to)\s+(?:casa|inicio|origen|home|start|la base))?\s*\.?\s*$",
+    re.IGNORECASE
+)
+
+# Regreso negado ("sin volver", "no regresar", "don't return"): lo decide el LLM
+_NEGATED_RETURN = re.compile(
+    r"\b(?:sin|no|nunca|not|without|don'?t)\b(?:\s+\S+){0,3}?\s+"
+    r"(?:volver|regresar|retornar|return|ida y vuelta|round trip)\b",
+    re.IGNORECASE
+)
+
+# Separadores de lista: comas, punto y coma, saltos de línea, " y ", " e ", " and "
+_SEPARATORS = re.compile(r"\s*(?:[,;\n]|\s+y\s+|\s+e\s+|\s+and\s+)\s*", re.IGNORECASE)
+
+# Palabras que indican texto libre: mejor que lo interprete el LLM
+_FREE_TEXT_WORDS = {
+    "quiero", "necesito", "tengo", "debo", "luego", "después", "despues",
+    "primero", "pasar", "pasando", "ir", "voy", "estoy", "visitar", "me",
+    "mi", "mis", "want", "need", "then", "visit", "i'm", "im",
+}
+
+# Preposiciones y conectores que no forman parte de un nombre de lugar
+# ("De Lima a Miraflores", "Barranco desde Lima", "pero evitando Surco")
+_CONNECTOR_WORDS = {
+    "a", "al", "hacia", "hasta", "desde", "sin", "no", "pero", "evitando",
+    "evitar", "excepto", "salvo", "menos", "por", "para", "con", "entre",
+    "hoy", "mañana", "manana", "ayer", "tarde", "noche", "antes",
+    "to", "from", "via", "but", "avoid", "avoiding", "except", "without",
+    "today", "tomorrow",
+}
+
+# "de" sí aparece dentro de nombres (San Juan de Lurigancho, Cercado de
+# Lima), pero no al inicio
+_LEADING_WORDS = {"de", "del", "of"}
+
+# Límites para aceptar un elemento como nombre de lugar
+_MAX_WORDS = 6
+_MAX_CHARS = 60
+
+
+class FastParserStats:
+    """Contadores de aciertos del parser rápido y de recurso al LLM"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_path_hits = 0
+        self.llm_fallbacks = 0
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.fast_path_hits = 0
+            self.llm_fallbacks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.fast_path_hits + self.llm_fallbacks
+        return {
+            "fast_path_hits": self.fast_path_hits,
+            "llm_fallbacks": self.llm_fallbacks,
+            "fast_path_ratio": round(self.fast_path_hits / total, 4) if total else 0.0,
+        }
+
+
+parser_stats = FastParserStats()
+
+
+def parse_route_fast(user_input: str) -> Optional[Dict[str, Any]]:
+    """
+    Intenta extraer la ruta sin LLM
+
+    Args:
+        user_input: Texto del usuario
+
+    Returns:
+        Dict con origin, destinations y return_to_origin (mismo formato que
+        LLMService.parse_route_input), o None si el texto no es estructurado
+    """
+    text = " ".join(user_input.split())
+    if not text:
+        return None
+
+    if _NEGATED_RETURN.search(text):
+        return None
+
+    return_to_origin = False
+    match = _RETURN.search(text)
+    if match:
+        return_to_origin = True
+        text = text[:match.start()].strip()
+
+    if _ARROW.search(text):
+        places = [part for part in _ARROW.split(text) if part]
+        # "A -> B -> A": cerrar el circuito equivale a volver al origen
+        if len(places) > 2 and places[-1].lower() == places[0].lower():
+            places = places[:-1]
+            return_to_origin = True
+        origin, destinations = (places[0], places[1:]) if places else ("", [])
+    else:
+        match = _ORIGIN.match(text)
+        if match:
+            origin = match.group("origin")
+            destinations = _split_list(match.group("rest"))
+        else:
+            # Lista simple: el primer lugar es el origen (misma regla que el LLM)
+            places = _split_list(text)
+            origin, destinations = (places[0], places[1:]) if places else ("", [])
+
+    if not destinations or not all(_looks_like_place(p) for p in [origin] + destinations):
+        return None
+
+    return {
+        "origin": origin.strip(),
+        "destinations": [d.strip() for d in destinations],
+        "return_to_origin": return_to_origin,
+    }
+
+
+def _split_list(text: str) -> List[str]:
+    return [part.strip(" .") for part in _SEPARATORS.split(text) if part.strip(" .")]
+
+
+def _looks_like_place(text: str) -> bool:
+    """Nombre corto sin verbos, pronombres ni conectores de texto libre"""
+    words = text.lower().split()
+    if not words or len(words) > _MAX_WORDS or len(text) > _MAX_CHARS:
+        return False
+    if any(word in _FREE_TEXT_WORDS or word in _CONNECTOR_WORDS for word in words):
+        return False
+    if words[0] in _LEADING_WORDS:
+        return False
+    return not any(char in text for char in "?!:>")
@@ -2,17 +2,348 @@
 Servicio completo para interactuar con Google Maps APIs
 """
 import googlemaps
-from typing import List, Tuple, Optional, Dict, Any
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Iterable, List, Tuple, Optional, Dict, Any
 from app.config import get_settings
 from app.models.state import Location
+from app.services.cache import get_cache
+from app.services.metrics import record_matrix_elements, track_call
+from app.services.rate_limiter import get_rate_limiter
+from app.services.single_flight import coalesce
+from app.utils.helpers import sanitize_location_name
 
 
-class GoogleMapsService:
-    """Cliente para todas las APIs de Google Maps"""
+# Límites por solicitud de Distance Matrix API
+MAX_MATRIX_ORIGINS = 25
+MAX_MATRIX_DESTINATIONS = 25
+MAX_MATRIX_ELEMENTS = 100
+
+# Paradas intermedias por solicitud de Directions API
+MAX_DIRECTIONS_WAYPOINTS = 25
+
+
+# Estadísticas de la última matriz (por hilo o tarea asyncio)
+_matrix_stats: ContextVar[Dict[str, int]] = ContextVar("matrix_stats", default={})
+
+
+class BaseGoogleMapsService:
+    """Lógica común de los clientes síncrono y asíncrono: cachés y claves"""
     
     def __init__(self):
         self.settings = get_settings()
-        self.client = googlemaps.Client(key=self.settings.google_maps_api_key)
+    
+    @property
+    def last_matrix_stats(self) -> Dict[str, int]:
+        """Estadísticas de la última matriz pedida en este contexto"""
+        return _matrix_stats.get()
+    
+    def _geocode_cache(self):
+        if not self.settings.geocode_cache_enabled:
+            return None
+        return get_cache(
+            "geocode",
+            ttl_seconds=self.settings.geocode_cache_ttl_s,
+            max_entries=self.settings.geocode_cache_max_entries,
+            memory_entries=self.settings.geocode_cache_memory_entries
+        )
+    
+    def _geocode_cache_key(self, address: str) -> str:
+        """Clave normalizada: nombre limpio + idioma + país"""
+        name = sanitize_location_name(address).lower()
+        return f"{name}|{self.settings.geocoding_language}|{self.settings.default_country}"
+    
+    @staticmethod
+    def _location_from_results(address: str, results: List[Dict[str, Any]]) -> Location:
+        """Primer resultado de Geocoding API como Location"""
+        if not results:
+            raise ValueError(f"No se encontraron resultados para: {address}")
+        
+        location_data = results[0]
+        geometry = location_data['geometry']['location']
+        
+        return Location(
+            name=address,
+            address=location_data['formatted_address'],
+            lat=geometry['lat'],
+            lng=geometry['lng']
+        )
+    
+    def _matrix_cache(self):
+        if not self.settings.matrix_cache_enabled:
+            return None
+        return get_cache(
+            "distance_matrix",
+            ttl_seconds=self.settings.matrix_cache_ttl_s,
+            max_entries=self.settings.matrix_cache_max_entries,
+            memory_entries=self.settings.matrix_cache_memory_entries
+        )
+    
+    def _matrix_cache_key(self, origin: Location, destination: Location, mode: str) -> str:
+        """Clave de celda: coordenadas redondeadas + modo de transporte"""
+        precision = self.settings.matrix_cache_precision
+        return (
+            f"{origin.lat:.{precision}f},{origin.lng:.{precision}f}|"
+            f"{destination.lat:.{precision}f},{destination.lng:.{precision}f}|{mode}"
+        )
+    
+    def _matrix_request_key(self, origins: List[Location], destinations: List[Location], mode: str) -> str:
+        """Clave de single-flight de un bloque: mismas coordenadas redondeadas que la caché"""
+        precision = self.settings.matrix_cache_precision
+        def points(locations: List[Location]) -> str:
+            return "|".join(f"{loc.lat:.{precision}f},{loc.lng:.{precision}f}" for loc in locations)
+        return f"{points(origins)}>{points(destinations)}|{mode}"
+    
+    @staticmethod
+    def _directions_request_key(
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        mode: str,
+        alternatives: bool,
+        waypoints: Optional[List[Tuple[float, float]]]
+    ) -> Tuple[Any, ...]:
+        return (tuple(origin), tuple(destination), tuple(map(tuple, waypoints or [])), mode, alternatives)
+    
+    @staticmethod
+    def _matrix_tiles(n_origins: int, n_destinations: int) -> List[Tuple[int, int, int, int]]:
+        """
+        Divide una matriz n_origins x n_destinations en bloques
+        (o_lo, o_hi, d_lo, d_hi) dentro de los límites de la API
+        """
+        # Forma de bloque que minimiza la cantidad de solicitudes
+        def calls(shape: Tuple[int, int]) -> int:
+            origin_chunk, dest_chunk = shape
+            return -(-n_origins // origin_chunk) * -(-n_destinations // dest_chunk)
+        
+        origin_chunk, dest_chunk = min(
+            (
+                (min(MAX_MATRIX_ORIGINS, MAX_MATRIX_ELEMENTS // dest_chunk, max(n_origins, 1)), dest_chunk)
+                for dest_chunk in range(1, min(MAX_MATRIX_DESTINATIONS, max(n_destinations, 1)) + 1)
+            ),
+            key=calls
+        )
+        
+        return [
+            (o_lo, min(o_lo + origin_chunk, n_origins), d_lo, min(d_lo + dest_chunk, n_destinations))
+            for o_lo in range(0, n_origins, origin_chunk)
+            for d_lo in range(0, n_destinations, dest_chunk)
+        ]
+    
+    def _group_tiles(self, missing: Dict[int, Tuple[int, ...]]) -> List[Tuple[List[int], List[int]]]:
+        """
+        Agrupa los orígenes con los mismos destinos faltantes (cada grupo es
+        un rectángulo) y divide cada rectángulo en bloques (filas, columnas)
+        """
+        groups: Dict[Tuple[int, ...], List[int]] = {}
+        for i, cols in missing.items():
+            if cols:
+                groups.setdefault(cols, []).append(i)
+        
+        return [
+            (rows[o_lo:o_hi], list(cols[d_lo:d_hi]))
+            for cols, rows in groups.items()
+            for o_lo, o_hi, d_lo, d_hi in self._matrix_tiles(len(rows), len(cols))
+        ]
+
+
+class MatrixAssembly:
+    """
+    Matriz en construcción: lee de la caché las celdas conocidas, agrupa
+    las faltantes en bloques dentro de los límites de la API, vuelca cada
+    respuesta en arreglos NumPy y al final guarda las celdas nuevas.
+    
+    Con la caché de pares activa, los orígenes con el mismo conjunto de
+    destinos faltantes forman un rectángulo, que luego se divide en bloques.
+    """
+    
+    def __init__(
+        self,
+        service: BaseGoogleMapsService,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str
+    ):
+        self.origins = origins
+        self.destinations = destinations
+        n_origins, n_destinations = len(origins), len(destinations)
+        self.distances = np.empty((n_origins, n_destinations), dtype=float)
+        self.durations = np.empty((n_origins, n_destinations), dtype=np.int64)
+        self.missing = np.ones((n_origins, n_destinations), dtype=bool)
+        self._fetched: List[Dict[str, Any]] = []
+        
+        self.cache = service._matrix_cache()
+        self.keys: List[List[str]] = []
+        if self.cache is not None:
+            self.keys = [
+                [service._matrix_cache_key(o, d, mode) for d in destinations]
+                for o in origins
+            ]
+            cached = self.cache.get_many([key for row in self.keys for key in row])
+            for i in range(n_origins):
+                for j in range(n_destinations):
+                    value = cached.get(self.keys[i][j])
+                    if value is not None:
+                        self.distances[i, j], self.durations[i, j] = value
+                        self.missing[i, j] = False
+        
+        self.tiles = service._group_tiles({
+            i: tuple(np.flatnonzero(self.missing[i]).tolist()) for i in range(n_origins)
+        })
+    
+    def tile_locations(self, tile: Tuple[List[int], List[int]]) -> Tuple[List[Location], List[Location]]:
+        rows, cols = tile
+        return [self.origins[i] for i in rows], [self.destinations[j] for j in cols]
+    
+    def apply(self, tile: Tuple[List[int], List[int]], result: Dict[str, Any]) -> None:
+        """
+        Vuelca la respuesta de un bloque en la matriz
+        
+        Raises:
+            ValueError: Si el bloque no responde OK
+        """
+        if result['status'] != 'OK':
+            raise ValueError(f"Error en Distance Matrix API: {result['status']}")
+        
+        rows, cols = tile
+        fetched: Dict[str, Any] = {}
+        for i, row in zip(rows, result['rows']):
+            for j, element in zip(cols, row['elements']):
+                if element['status'] != 'OK':
+                    # Si no hay ruta, usar un valor muy grande (no se guarda en caché)
+                    self.distances[i, j] = 999999.0
+                    self.durations[i, j] = 999999
+                else:
+                    # Distancia en kilómetros, duración en minutos
+                    self.distances[i, j] = element['distance']['value'] / 1000.0
+                    self.durations[i, j] = element['duration']['value'] // 60
+                    if self.cache is not None:
+                        fetched[self.keys[i][j]] = [float(self.distances[i, j]), int(self.durations[i, j])]
+        self._fetched.append(fetched)
+    
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Guarda las celdas nuevas y devuelve (distancias km, duraciones min)"""
+        if self.cache is not None:
+            self.cache.set_many({key: value for fetched in self._fetched for key, value in fetched.items()})
+        
+        stats = {
+            "cached_elements": int(self.missing.size - self.missing.sum()),
+            "fetched_elements": int(self.missing.sum()),
+            "requests": len(self.tiles),
+        }
+        _matrix_stats.set(stats)
+        record_matrix_elements("cache", stats["cached_elements"])
+        return self.distances, self.durations
+
+
+class MatrixCellBatch:
+    """
+    Celdas sueltas de muchas matrices pedidas de una sola vez (planificación
+    por lotes): cada par origen-destino se pide una vez aunque aparezca en
+    varias rutas, y nunca se piden pares que ninguna ruta necesita (como la
+    diagonal o los cruces entre rutas distintas).
+    """
+    
+    def __init__(
+        self,
+        service: BaseGoogleMapsService,
+        locations: List[Location],
+        pairs: Iterable[Tuple[int, int]],
+        mode: str
+    ):
+        self.locations = locations
+        self.values: Dict[Tuple[int, int], Tuple[float, int]] = {}
+        self._fetched: Dict[str, Any] = {}
+        pairs = sorted({(i, j) for i, j in pairs if i != j})
+        
+        self.cache = service._matrix_cache()
+        self.keys: Dict[Tuple[int, int], str] = {}
+        if self.cache is not None:
+            self.keys = {
+                (i, j): service._matrix_cache_key(locations[i], locations[j], mode)
+                for i, j in pairs
+            }
+            cached = self.cache.get_many(list(self.keys.values()))
+            for pair, key in self.keys.items():
+                value = cached.get(key)
+                if value is not None:
+                    self.values[pair] = tuple(value)
+        
+        missing: Dict[int, List[int]] = {}
+        for i, j in pairs:
+            if (i, j) not in self.values:
+                missing.setdefault(i, []).append(j)
+        
+        self.cached_elements = len(self.values)
+        self.fetched_elements = len(pairs) - self.cached_elements
+        self.tiles = service._group_tiles({i: tuple(cols) for i, cols in missing.items()})
+    
+    def tile_locations(self, tile: Tuple[List[int], List[int]]) -> Tuple[List[Location], List[Location]]:
+        rows, cols = tile
+        return [self.locations[i] for i in rows], [self.locations[j] for j in cols]
+    
+    def apply(self, tile: Tuple[List[int], List[int]], result: Dict[str, Any]) -> None:
+        """
+        Guarda las celdas de la respuesta de un bloque
+        
+        Raises:
+            ValueError: Si el bloque no responde OK
+        """
+        if result['status'] != 'OK':
+            raise ValueError(f"Error en Distance Matrix API: {result['status']}")
+        
+        rows, cols = tile
+        for i, row in zip(rows, result['rows']):
+            for j, element in zip(cols, row['elements']):
+                if element['status'] != 'OK':
+                    # Sin ruta: valor muy grande (no se guarda en caché)
+                    self.values[(i, j)] = (999999.0, 999999)
+                else:
+                    value = (element['distance']['value'] / 1000.0, element['duration']['value'] // 60)
+                    self.values[(i, j)] = value
+                    if self.cache is not None:
+                        self._fetched[self.keys[(i, j)]] = list(value)
+    
+    def finish(self) -> Dict[str, int]:
+        """Guarda las celdas nuevas y devuelve las estadísticas del lote"""
+        if self.cache is not None:
+            self.cache.set_many(self._fetched)
+        
+        stats = {
+            "cached_elements": self.cached_elements,
+            "fetched_elements": self.fetched_elements,
+            "requests": len(self.tiles),
+        }
+        _matrix_stats.set(stats)
+        record_matrix_elements("cache", self.cached_elements)
+        return stats
+    
+    def matrix(self, indices: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matriz de una ruta a partir de las celdas del lote
+        
+        Args:
+            indices: Índices en `locations` de las ubicaciones de la ruta, en orden
+            
+        Returns:
+            (distancias en km, duraciones en min)
+        """
+        n = len(indices)
+        distances = np.zeros((n, n), dtype=float)
+        durations = np.zeros((n, n), dtype=np.int64)
+        for a, i in enumerate(indices):
+            for b, j in enumerate(indices):
+                if i != j:
+                    distances[a, b], durations[a, b] = self.values[(i, j)]
+        return distances, durations
+
+
+class GoogleMapsService(BaseGoogleMapsService):
+    """Cliente para todas las APIs de Google Maps"""
+    
+    def __init__(self, client: Optional[googlemaps.Client] = None):
+        super().__init__()
+        self.client = client or googlemaps.Client(key=self.settings.google_maps_api_key)
     
     def geocode(self, address: str) -> Location:
         """
@@ -27,25 +358,35 @@ class GoogleMapsService:
         Raises:
             ValueError: Si no se puede geocodificar
         """
+        cache = self._geocode_cache()
+        if cache is not None:
+            key = self._geocode_cache_key(address)
+            cached = cache.get(key)
+            if cached is not None:
+                return Location(name=address, **cached)
+        
+        # Geocodificaciones simultáneas del mismo lugar comparten una llamada
+        location = coalesce(
+            "geocode", self._geocode_cache_key(address), lambda: self._geocode_uncached(address)
+        ).model_copy(update={"name": address})
+        
+        if cache is not None:
+            cache.set(key, location.model_dump(exclude={"name"}))
+        
+        return location
+    
+    def _geocode_uncached(self, address: str) -> Location:
+        """Llamada directa a Geocoding API"""
+        get_rate_limiter("geocode", self.settings.geocode_qps).acquire()
         try:
-            result = self.client.geocode(
-                address,
-                language=self.settings.geocoding_language,
-                region=self.settings.default_country
-            )
+            with track_call("google_maps", "geocode"):
+                result = self.client.geocode(
+                    address,
+                    language=self.settings.geocoding_language,
+                    region=self.settings.default_country
+                )
             
-            if not result:
-                raise ValueError(f"No se encontraron resultados para: {address}")
-            
-            location_data = result[0]
-            geometry = location_data['geometry']['location']
-            
-            return Location(
-                name=address,
-                address=location_data['formatted_address'],
-                lat=geometry['lat'],
-                lng=geometry['lng']
-            )
+            return self._location_from_results(address, result)
             
         except googlemaps.exceptions.ApiError as e:
             raise ValueError(f"Error en Geocoding API: {str(e)}")
@@ -72,26 +413,106 @@ class GoogleMapsService:
         origin_coords = [(loc.lat, loc.lng) for loc in origins]
         dest_coords = [(loc.lat, loc.lng) for loc in destinations]
         
-        try:
-            result = self.client.distance_matrix(
-                origins=origin_coords,
-                destinations=dest_coords,
-                mode=mode,
-                language=self.settings.geocoding_language,
-                units="metric"
-            )
-            
+        def request() -> Dict[str, Any]:
+            try:
+                with track_call("google_maps", "distance_matrix"):
+                    result = self.client.distance_matrix(
+                        origins=origin_coords,
+                        destinations=dest_coords,
+                        mode=mode,
+                        language=self.settings.geocoding_language,
+                        units="metric"
+                    )
+            except googlemaps.exceptions.ApiError as e:
+                raise ValueError(f"Error en Distance Matrix API: {str(e)}")
+            # Google factura por elemento (origen x destino) de cada solicitud
+            record_matrix_elements("billed", len(origins) * len(destinations))
             return result
+        
+        return coalesce("distance_matrix", self._matrix_request_key(origins, destinations, mode), request)
+    
+    def get_distance_matrix_values(
+        self,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str = "driving"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Obtiene la matriz completa dividiéndola en bloques que respetan los
+        límites de la API (25 orígenes, 25 destinos, 100 elementos por
+        solicitud). Solo se piden las celdas que no están en caché; los
+        bloques se piden en paralelo con concurrencia acotada y se ensamblan
+        directamente en arreglos NumPy.
+        
+        Args:
+            origins: Lista de ubicaciones origen
+            destinations: Lista de ubicaciones destino
+            mode: Modo de transporte
             
-        except googlemaps.exceptions.ApiError as e:
-            raise ValueError(f"Error en Distance Matrix API: {str(e)}")
+        Returns:
+            (distancias en km, duraciones en min) con una fila por origen
+            
+        Raises:
+            ValueError: Si algún bloque no responde OK
+        """
+        assembly = MatrixAssembly(self, origins, destinations, mode)
+        
+        def fetch(tile: Tuple[List[int], List[int]]) -> None:
+            tile_origins, tile_destinations = assembly.tile_locations(tile)
+            assembly.apply(tile, self.get_distance_matrix(tile_origins, tile_destinations, mode=mode))
+        
+        if len(assembly.tiles) == 1:
+            fetch(assembly.tiles[0])
+        elif assembly.tiles:
+            workers = min(self.settings.matrix_max_concurrency, len(assembly.tiles))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # list() propaga la primera excepción de cualquier bloque
+                list(executor.map(fetch, assembly.tiles))
+        
+        return assembly.finish()
+    
+    def get_matrix_cells(
+        self,
+        locations: List[Location],
+        pairs: Iterable[Tuple[int, int]],
+        mode: str = "driving"
+    ) -> MatrixCellBatch:
+        """
+        Pide solo los pares (origen, destino) indicados, cada uno una vez,
+        en bloques paralelos como get_distance_matrix_values
+        
+        Args:
+            locations: Ubicaciones únicas del lote
+            pairs: Pares de índices en `locations` que se necesitan
+            mode: Modo de transporte
+            
+        Returns:
+            MatrixCellBatch con los valores; .matrix(indices) arma cada ruta
+            
+        Raises:
+            ValueError: Si algún bloque no responde OK
+        """
+        cells = MatrixCellBatch(self, locations, pairs, mode)
+        
+        def fetch(tile: Tuple[List[int], List[int]]) -> None:
+            tile_origins, tile_destinations = cells.tile_locations(tile)
+            cells.apply(tile, self.get_distance_matrix(tile_origins, tile_destinations, mode=mode))
+        
+        if cells.tiles:
+            workers = min(self.settings.matrix_max_concurrency, len(cells.tiles))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(fetch, cells.tiles))
+        
+        cells.finish()
+        return cells
     
     def get_directions(
         self,
         origin: Tuple[float, float],
         destination: Tuple[float, float],
         mode: str = "driving",
-        alternatives: bool = False
+        alternatives: bool = False,
+        waypoints: Optional[List[Tuple[float, float]]] = None
     ) -> List[Dict[str, Any]]:
         """
         Obtiene direcciones detalladas usando Directions API
@@ -101,24 +522,32 @@ class GoogleMapsService:
             destination: Tupla (lat, lng) del destino
             mode: Modo de transporte
             alternatives: Si debe devolver rutas alternativas
+            waypoints: Paradas intermedias en orden fijo (máx. 25); la
+                respuesta trae un leg por tramo
             
         Returns:
             Lista de rutas con pasos detallados
         """
-        try:
-            result = self.client.directions(
-                origin=origin,
-                destination=destination,
-                mode=mode,
-                alternatives=alternatives,
-                language=self.settings.geocoding_language,
-                units="metric"
-            )
-            
-            return result
-            
-        except googlemaps.exceptions.ApiError as e:
-            raise ValueError(f"Error en Directions API: {str(e)}")
+        if waypoints and len(waypoints) > MAX_DIRECTIONS_WAYPOINTS:
+            raise ValueError(f"Máximo {MAX_DIRECTIONS_WAYPOINTS} waypoints por solicitud")
+        
+        def request() -> List[Dict[str, Any]]:
+            try:
+                with track_call("google_maps", "directions"):
+                    return self.client.directions(
+                        origin=origin,
+                        destination=destination,
+                        waypoints=waypoints or None,
+                        mode=mode,
+                        alternatives=alternatives,
+                        language=self.settings.geocoding_language,
+                        units="metric"
+                    )
+            except googlemaps.exceptions.ApiError as e:
+                raise ValueError(f"Error en Directions API: {str(e)}")
+        
+        key = self._directions_request_key(origin, destination, mode, alternatives, waypoints)
+        return coalesce("directions", key, request)
     
     def get_place_details(self, place_id: str) -> Dict[str, Any]:
         """
@@ -131,10 +560,11 @@ class GoogleMapsService:
             Detalles completos del lugar
         """
         try:
-            result = self.client.place(
-                place_id=place_id,
-                language=self.settings.geocoding_language
-            )
+            with track_call("google_maps", "place_details"):
+                result = self.client.place(
+                    place_id=place_id,
+                    language=self.settings.geocoding_language
+                )
             
             return result
             
@@ -153,11 +583,12 @@ class GoogleMapsService:
             Lista de lugares encontrados
         """
         try:
-            result = self.client.places(
-                query=query,
-                location=location,
-                language=self.settings.geocoding_language
-            )
+            with track_call("google_maps", "search_places"):
+                result = self.client.places(
+                    query=query,
+                    location=location,
+                    language=self.settings.geocoding_language
+                )
             
             return result.get('results', [])
             
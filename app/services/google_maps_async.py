@@ -0,0 +1,246 @@
+"""
+Cliente asíncrono de Google Maps (Geocoding, Distance Matrix, Directions)
+sobre un httpx.AsyncClient con pool de conexiones
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import random
+import time
+
+import httpx
+import numpy as np
+from googlemaps.convert import latlng, location_list
+
+from app.models.state import Location
+from app.services.google_maps import (
+    BaseGoogleMapsService,
+    MatrixAssembly,
+    MatrixCellBatch,
+    MAX_DIRECTIONS_WAYPOINTS,
+)
+from app.services.metrics import error_status, record_call, record_matrix_elements
+from app.services.rate_limiter import get_rate_limiter
+from app.services.single_flight import acoalesce
+
+
+BASE_URL = "https://maps.googleapis.com"
+
+# Estados que vale la pena reintentar (igual que googlemaps.Client)
+_RETRIABLE_STATUSES = {"OVER_QUERY_LIMIT", "UNKNOWN_ERROR"}
+_RETRIABLE_HTTP = {500, 503, 504}
+
+
+class AsyncGoogleMapsService(BaseGoogleMapsService):
+    """Versión async de GoogleMapsService: mismas cachés, límites y respuestas"""
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, base_url: str = BASE_URL):
+        super().__init__()
+        self.client = client or httpx.AsyncClient()
+        self.base_url = base_url
+
+    async def _request(self, path: str, params: Dict[str, Any], api_name: str, method: str) -> Dict[str, Any]:
+        """
+        GET a un endpoint JSON de Maps con reintentos y backoff exponencial.
+        Cada intento se registra en /metrics como una llamada de `method`.
+
+        Raises:
+            ValueError: Si la API responde con error o se agotan los reintentos
+        """
+        params = {**params, "key": self.settings.google_maps_api_key}
+        last_error = ""
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1) * (1 + random.random()))
+
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(f"{self.base_url}{path}", params=params)
+            except httpx.TransportError as e:
+                record_call("google_maps", method, error_status(e), time.perf_counter() - start)
+                last_error = str(e)
+                continue
+
+            if response.status_code != 200:
+                record_call("google_maps", method, str(response.status_code), time.perf_counter() - start)
+                if response.status_code in _RETRIABLE_HTTP:
+                    last_error = f"HTTP {response.status_code}"
+                    continue
+                raise ValueError(f"Error en {api_name}: HTTP {response.status_code}")
+
+            body = response.json()
+            status = body.get("status")
+            record_call(
+                "google_maps", method, "ok" if status in ("OK", "ZERO_RESULTS") else status,
+                time.perf_counter() - start
+            )
+            if status in ("OK", "ZERO_RESULTS"):
+                return body
+            if status in _RETRIABLE_STATUSES:
+                last_error = status
+                continue
+            raise ValueError(f"Error en {api_name}: {status} {body.get('error_message', '')}".strip())
+
+        raise ValueError(f"Error en {api_name}: {last_error}")
+
+    async def geocode(self, address: str) -> Location:
+        """
+        Convierte dirección en coordenadas usando Geocoding API
+
+        Raises:
+            ValueError: Si no se puede geocodificar
+        """
+        cache = self._geocode_cache()
+        if cache is not None:
+            key = self._geocode_cache_key(address)
+            cached = cache.get(key)
+            if cached is not None:
+                return Location(name=address, **cached)
+
+        # Geocodificaciones simultáneas del mismo lugar comparten una llamada
+        location = (await acoalesce(
+            "geocode", self._geocode_cache_key(address), lambda: self._geocode_uncached(address)
+        )).model_copy(update={"name": address})
+
+        if cache is not None:
+            cache.set(key, location.model_dump(exclude={"name"}))
+
+        return location
+
+    async def _geocode_uncached(self, address: str) -> Location:
+        """Llamada directa a Geocoding API"""
+        await get_rate_limiter("geocode", self.settings.geocode_qps).acquire_async()
+        try:
+            body = await self._request(
+                "/maps/api/geocode/json",
+                {
+                    "address": address,
+                    "language": self.settings.geocoding_language,
+                    "region": self.settings.default_country,
+                },
+                "Geocoding API",
+                "geocode"
+            )
+            return self._location_from_results(address, body.get("results", []))
+        except ValueError as e:
+            raise ValueError(f"Error geocodificando '{address}': {str(e)}")
+
+    async def get_distance_matrix(
+        self,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str = "driving"
+    ) -> Dict[str, Any]:
+        """Respuesta completa de Distance Matrix API para un bloque"""
+        params = {
+            "origins": location_list([(loc.lat, loc.lng) for loc in origins]),
+            "destinations": location_list([(loc.lat, loc.lng) for loc in destinations]),
+            "mode": mode,
+            "language": self.settings.geocoding_language,
+            "units": "metric",
+        }
+        async def request() -> Dict[str, Any]:
+            body = await self._request(
+                "/maps/api/distancematrix/json", params, "Distance Matrix API", "distance_matrix"
+            )
+            # Google factura por elemento (origen x destino) de cada solicitud
+            record_matrix_elements("billed", len(origins) * len(destinations))
+            return body
+
+        return await acoalesce("distance_matrix", self._matrix_request_key(origins, destinations, mode), request)
+
+    async def get_distance_matrix_values(
+        self,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str = "driving"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Igual que GoogleMapsService.get_distance_matrix_values: solo pide
+        las celdas fuera de caché, en bloques concurrentes acotados por
+        MATRIX_MAX_CONCURRENCY
+
+        Raises:
+            ValueError: Si algún bloque no responde OK
+        """
+        assembly = MatrixAssembly(self, origins, destinations, mode)
+        semaphore = asyncio.Semaphore(self.settings.matrix_max_concurrency)
+
+        async def fetch(tile: Tuple[List[int], List[int]]) -> None:
+            tile_origins, tile_destinations = assembly.tile_locations(tile)
+            async with semaphore:
+                result = await self.get_distance_matrix(tile_origins, tile_destinations, mode=mode)
+            assembly.apply(tile, result)
+
+        # gather propaga la primera excepción de cualquier bloque
+        await asyncio.gather(*(fetch(tile) for tile in assembly.tiles))
+
+        return assembly.finish()
+
+    async def get_matrix_cells(
+        self,
+        locations: List[Location],
+        pairs: Iterable[Tuple[int, int]],
+        mode: str = "driving"
+    ) -> MatrixCellBatch:
+        """
+        Igual que GoogleMapsService.get_matrix_cells: cada par se pide una
+        sola vez, en bloques concurrentes acotados por MATRIX_MAX_CONCURRENCY
+
+        Raises:
+            ValueError: Si algún bloque no responde OK
+        """
+        cells = MatrixCellBatch(self, locations, pairs, mode)
+        semaphore = asyncio.Semaphore(self.settings.matrix_max_concurrency)
+
+        async def fetch(tile: Tuple[List[int], List[int]]) -> None:
+            tile_origins, tile_destinations = cells.tile_locations(tile)
+            async with semaphore:
+                result = await self.get_distance_matrix(tile_origins, tile_destinations, mode=mode)
+            cells.apply(tile, result)
+
+        await asyncio.gather(*(fetch(tile) for tile in cells.tiles))
+
+        cells.finish()
+        return cells
+
+    async def get_directions(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        mode: str = "driving",
+        alternatives: bool = False,
+        waypoints: Optional[List[Tuple[float, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Lista de rutas de Directions API (un leg por tramo)
+
+        Raises:
+            ValueError: Si la API responde con error
+        """
+        if waypoints and len(waypoints) > MAX_DIRECTIONS_WAYPOINTS:
+            raise ValueError(f"Máximo {MAX_DIRECTIONS_WAYPOINTS} waypoints por solicitud")
+
+        params = {
+            "origin": latlng(origin),
+            "destination": latlng(destination),
+            "mode": mode,
+            "alternatives": "true" if alternatives else "false",
+            "language": self.settings.geocoding_language,
+            "units": "metric",
+        }
+        if waypoints:
+            params["waypoints"] = location_list(waypoints)
+
+        key = self._directions_request_key(origin, destination, mode, alternatives, waypoints)
+        body = await acoalesce(
+            "directions",
+            key,
+            lambda: self._request("/maps/api/directions/json", params, "Directions API", "directions")
+        )
+        return body.get("routes", [])
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
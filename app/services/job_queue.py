@@ -0,0 +1,205 @@
+"""
+Cola de trabajos persistente en SQLite (sin broker externo): la API
+encola y los procesos trabajadores toman, ejecutan y guardan el resultado
+"""
+from typing import Any, Dict, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from app.config import get_settings
+
+
+# Estados de un trabajo
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Tabla de trabajos compartida por la API y los trabajadores. Igual que
+    SQLiteCache usa WAL y una conexión por hilo, así varios procesos pueden
+    encolar y tomar trabajos del mismo archivo.
+
+    El trabajador dueño de un trabajo renueva heartbeat_at mientras lo
+    ejecuta; solo vuelve a la cola un trabajo sin latidos recientes (su
+    trabajador murió), nunca uno que sigue en curso aunque sea lento.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 2):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " heartbeat_at REAL,"
+            " finished_at REAL)"
+        )
+        # Archivos creados antes de existir los latidos
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        """Encola un trabajo y devuelve su id"""
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(payload), time.time())
+        )
+        return job_id
+
+    def claim(self, worker: str, stale_after_s: float) -> Optional[Dict[str, Any]]:
+        """
+        Toma el trabajo en cola más antiguo (de forma atómica entre procesos).
+        Antes devuelve a la cola los trabajos de trabajadores caídos (sin
+        latido hace más de stale_after_s) o los marca fallidos si ya
+        agotaron sus intentos.
+
+        Returns:
+            El trabajo tomado, o None si la cola está vacía
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?"
+                " WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+                (FAILED, "El trabajador no terminó el trabajo", now, RUNNING, now - stale_after_s, self.max_attempts)
+            )
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, heartbeat_at = NULL"
+                " WHERE status = ? AND heartbeat_at < ?",
+                (QUEUED, RUNNING, now - stale_after_s)
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat_at = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    (RUNNING, worker, now, now, row["id"])
+                )
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+        if row is None:
+            return None
+        job = self._to_dict(row)
+        job.update(status=RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=row["attempts"] + 1)
+        return job
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """
+        Renueva el latido de un trabajo en curso
+
+        Returns:
+            False si el trabajo ya no pertenece a `worker`
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time(), job_id, worker, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def complete(self, job_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        return self._finish(job_id, worker, DONE, result=json.dumps(result))
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        return self._finish(job_id, worker, FAILED, error=error)
+
+    def _finish(
+        self,
+        job_id: str,
+        worker: str,
+        status: str,
+        result: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> bool:
+        """
+        Guarda el final del trabajo solo si sigue en manos de `worker`: si
+        volvió a la cola y lo tomó otro, el resultado de este se descarta
+
+        Returns:
+            False si el trabajo ya no pertenece a `worker`
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?"
+            " WHERE id = ? AND worker = ? AND status = ?",
+            (status, result, error, time.time(), job_id, worker, RUNNING)
+        )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def purge(self, older_than_s: float) -> int:
+        """Borra trabajos terminados hace más de older_than_s; devuelve cuántos"""
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+            (DONE, FAILED, time.time() - older_than_s)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Cola compartida por el proceso (creación perezosa)"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            settings = get_settings()
+            _queue = JobQueue(settings.job_queue_path, max_attempts=settings.job_max_attempts)
+        return _queue
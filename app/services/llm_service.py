@@ -1,18 +1,27 @@
 """
 Servicio para interactuar con LLMs (OpenAI)
 """
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from app.config import get_settings
+from app.services.cache import get_cache
+from app.services.metrics import track_call
+from app.services.single_flight import acoalesce, coalesce
+from app.utils.helpers import normalize_query_text
 import json
 from typing import Dict, Any, Optional
 
 
+# Cambiar al modificar el prompt de parseo para invalidar la caché
+PARSE_PROMPT_VERSION = 1
+
+
 class LLMService:
     """Cliente para llamadas a modelos de lenguaje"""
     
-    def __init__(self):
+    def __init__(self, client: Optional[OpenAI] = None, async_client: Optional[AsyncOpenAI] = None):
         self.settings = get_settings()
-        self.client = OpenAI(api_key=self.settings.openai_api_key)
+        self.client = client or OpenAI(api_key=self.settings.openai_api_key)
+        self.async_client = async_client
     
     def parse_route_input(self, user_input: str) -> Dict[str, Any]:
         """
@@ -34,6 +43,90 @@ class LLMService:
             }
         """
         
+        key = self._parse_cache_key(user_input)
+        cache = self._parse_cache()
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        
+        # Consultas equivalentes simultáneas comparten una llamada al modelo
+        parsed_data = coalesce("llm_parse", key, lambda: self._complete_parse(user_input))
+        
+        if cache is not None:
+            cache.set(key, parsed_data)
+        return parsed_data
+    
+    async def aparse_route_input(self, user_input: str) -> Dict[str, Any]:
+        """
+        Versión async de parse_route_input (crea el cliente async si no se inyectó)
+        
+        Raises:
+            ValueError: Si el LLM falla o la respuesta no es válida
+        """
+        if self.async_client is None:
+            self.async_client = AsyncOpenAI(api_key=self.settings.openai_api_key)
+        
+        key = self._parse_cache_key(user_input)
+        cache = self._parse_cache()
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        
+        parsed_data = await acoalesce("llm_parse", key, lambda: self._acomplete_parse(user_input))
+        
+        if cache is not None:
+            cache.set(key, parsed_data)
+        return parsed_data
+    
+    def _complete_parse(self, user_input: str) -> Dict[str, Any]:
+        """Llamada directa al modelo"""
+        try:
+            with track_call("openai", "parse_route_input"):
+                response = self.client.chat.completions.create(**self._parse_request(user_input))
+            return self._parse_response(response.choices[0].message.content)
+            
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error parseando respuesta del LLM: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"Error llamando al LLM: {str(e)}")
+    
+    async def _acomplete_parse(self, user_input: str) -> Dict[str, Any]:
+        """Versión async de _complete_parse"""
+        try:
+            with track_call("openai", "parse_route_input"):
+                response = await self.async_client.chat.completions.create(**self._parse_request(user_input))
+            return self._parse_response(response.choices[0].message.content)
+            
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error parseando respuesta del LLM: {str(e)}")
+        except Exception as e:
+            raise ValueError(f"Error llamando al LLM: {str(e)}")
+    
+    def _parse_cache(self):
+        """
+        Caché de parseos (memoria + disco, compartida entre workers). Solo
+        con temperatura 0: con otra temperatura la respuesta no es determinista.
+        """
+        if not self.settings.llm_cache_enabled or self.settings.llm_temperature != 0:
+            return None
+        return get_cache(
+            "llm_parse",
+            ttl_seconds=self.settings.llm_cache_ttl_s,
+            max_entries=self.settings.llm_cache_max_entries,
+            memory_entries=self.settings.llm_cache_memory_entries
+        )
+    
+    def _parse_cache_key(self, user_input: str) -> str:
+        """Consulta normalizada + modelo + temperatura + versión del prompt"""
+        return (
+            f"{normalize_query_text(user_input)}|{self.settings.llm_model}|"
+            f"{self.settings.llm_temperature}|v{PARSE_PROMPT_VERSION}"
+        )
+    
+    def _parse_request(self, user_input: str) -> Dict[str, Any]:
+        """Argumentos de chat.completions.create para extraer la ruta"""
         system_prompt = """Eres un asistente especializado en extraer información de rutas.
 
 Tu tarea es analizar texto en lenguaje natural y extraer:
@@ -55,36 +148,32 @@ Reglas importantes:
 
 Responde con un JSON válido."""
         
-        try:
-            response = self.client.chat.completions.create(
-                model=self.settings.llm_model,
-                temperature=self.settings.llm_temperature,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            content = response.choices[0].message.content
-            parsed_data = json.loads(content)
-            
-            # Validación básica
-            if "origin" not in parsed_data:
-                raise ValueError("No se pudo identificar el origen")
-            
-            if "destinations" not in parsed_data or not isinstance(parsed_data["destinations"], list):
-                raise ValueError("No se pudieron identificar los destinos")
-            
-            # Asegurar que return_to_origin sea boolean
-            parsed_data["return_to_origin"] = bool(parsed_data.get("return_to_origin", False))
-            
-            return parsed_data
-            
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error parseando respuesta del LLM: {str(e)}")
-        except Exception as e:
-            raise ValueError(f"Error llamando al LLM: {str(e)}")
+        return {
+            "model": self.settings.llm_model,
+            "temperature": self.settings.llm_temperature,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "response_format": {"type": "json_object"}
+        }
+    
+    @staticmethod
+    def _parse_response(content: str) -> Dict[str, Any]:
+        """Valida el JSON devuelto por el LLM"""
+        parsed_data = json.loads(content)
+        
+        # Validación básica
+        if "origin" not in parsed_data:
+            raise ValueError("No se pudo identificar el origen")
+        
+        if "destinations" not in parsed_data or not isinstance(parsed_data["destinations"], list):
+            raise ValueError("No se pudieron identificar los destinos")
+        
+        # Asegurar que return_to_origin sea boolean
+        parsed_data["return_to_origin"] = bool(parsed_data.get("return_to_origin", False))
+        
+        return parsed_data
     
     def suggest_optimization(
         self, 
@@ -115,15 +204,16 @@ Proporciona 2-3 observaciones breves y útiles sobre:
 Sé conciso y práctico."""
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.settings.llm_model,
-                temperature=0.7,
-                messages=[
-                    {"role": "system", "content": "Eres un asistente de planificación de rutas."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=300
-            )
+            with track_call("openai", "suggest_optimization"):
+                response = self.client.chat.completions.create(
+                    model=self.settings.llm_model,
+                    temperature=0.7,
+                    messages=[
+                        {"role": "system", "content": "Eres un asistente de planificación de rutas."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=300
+                )
             
             return response.choices[0].message.content.strip()
             
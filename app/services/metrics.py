@@ -0,0 +1,300 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (/metrics):
+latencia por nodo del grafo, llamadas externas por estado, elementos de
+Distance Matrix facturados, iteraciones y costo del optimizador, y
+aciertos de caché
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import functools
+import inspect
+import math
+import threading
+import time
+
+from app.config import get_settings
+
+
+# Buckets en segundos: desde aciertos de caché (ms) hasta optimizaciones largas
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def value(self, **labels: Any) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """Histograma acumulado con buckets fijos y etiquetas"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Por etiquetas: [conteo por bucket..., suma, conteo total]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[i] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def count(self, **labels: Any) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            values = self._values.get(key)
+            return int(values[-1]) if values else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(values)) for key, values in self._values.items())
+        lines = []
+        for key, values in items:
+            for bound, count in zip(self.buckets + (math.inf,), values[:-2] + [values[-1]]):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(count)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(values[-1])}")
+        return lines
+
+
+# Nodos del grafo
+NODE_SECONDS = Histogram(
+    "route_agent_node_duration_seconds", "Latencia de cada nodo del grafo", ["node"]
+)
+NODE_ERRORS = Counter(
+    "route_agent_node_errors_total", "Nodos que terminaron con state.error o excepción", ["node"]
+)
+
+# Llamadas externas (Google Maps, OpenAI); las coalescidas o en caché no cuentan
+EXTERNAL_CALL_SECONDS = Histogram(
+    "route_agent_external_call_duration_seconds", "Latencia de las llamadas a APIs externas", ["service", "method"]
+)
+EXTERNAL_CALLS = Counter(
+    "route_agent_external_calls_total", "Llamadas a APIs externas por estado", ["service", "method", "status"]
+)
+
+# Distance Matrix: elementos (origen x destino) facturados y servidos desde caché
+MATRIX_ELEMENTS = Counter(
+    "route_agent_matrix_elements_total", "Elementos de Distance Matrix", ["source"]
+)
+
+# Optimizador
+SOLVER_SECONDS = Histogram(
+    "route_agent_solver_duration_seconds", "Tiempo de optimización por solver", ["solver"]
+)
+SOLVER_ITERATIONS = Histogram(
+    "route_agent_solver_iterations", "Pasadas o movimientos de búsqueda local por optimización", ["solver"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+)
+TOUR_COST_KM = Histogram(
+    "route_agent_tour_cost_km", "Distancia total de la ruta optimizada (matriz)", ["solver"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+)
+
+_METRICS = [
+    NODE_SECONDS, NODE_ERRORS, EXTERNAL_CALL_SECONDS, EXTERNAL_CALLS,
+    MATRIX_ELEMENTS, SOLVER_SECONDS, SOLVER_ITERATIONS, TOUR_COST_KM,
+]
+
+
+def reset_metrics() -> None:
+    """Borra lo registrado (p. ej. tras el calentamiento con servicios simulados)"""
+    for metric in _METRICS:
+        metric.reset()
+
+
+def metrics_enabled() -> bool:
+    return get_settings().metrics_enabled
+
+
+def error_status(error: BaseException) -> str:
+    """
+    Estado de una llamada fallida: el status de la API si lo trae
+    (googlemaps.ApiError, HTTPError y errores de OpenAI), si no el tipo
+    """
+    for attribute in ("status", "status_code"):
+        status = getattr(error, attribute, None)
+        if status:
+            return str(status)
+    return type(error).__name__
+
+
+def record_call(service: str, method: str, status: str, seconds: float) -> None:
+    if not metrics_enabled():
+        return
+    EXTERNAL_CALL_SECONDS.observe(seconds, service=service, method=method)
+    EXTERNAL_CALLS.inc(service=service, method=method, status=status)
+
+
+@contextmanager
+def track_call(service: str, method: str) -> Iterator[None]:
+    """
+    Mide una llamada a una API externa (también sirve alrededor de un
+    await); la excepción se propaga
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_call(service, method, error_status(e), time.perf_counter() - start)
+        raise
+    record_call(service, method, "ok", time.perf_counter() - start)
+
+
+def record_matrix_elements(source: str, elements: int) -> None:
+    """source: "billed" (enviados en una solicitud) o "cache" (servidos desde caché)"""
+    if metrics_enabled() and elements:
+        MATRIX_ELEMENTS.inc(elements, source=source)
+
+
+def record_solver(solver: str, seconds: float, iterations: Optional[int], cost_km: float) -> None:
+    if not metrics_enabled():
+        return
+    SOLVER_SECONDS.observe(seconds, solver=solver)
+    if iterations is not None:
+        SOLVER_ITERATIONS.observe(iterations, solver=solver)
+    TOUR_COST_KM.observe(cost_km, solver=solver)
+
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    """
+    Envuelve un nodo del grafo (síncrono o corutina) para medir su latencia
+    y contar los errores que deja en state.error o que lanza
+    """
+    def finish(start: float, had_error: bool, result: Any, failed: bool = False) -> None:
+        if not metrics_enabled():
+            return
+        NODE_SECONDS.observe(time.perf_counter() - start, node=name)
+        # Los nodos modifican el estado recibido: el error previo se mira antes
+        if failed or (not had_error and getattr(result, "error", None)):
+            NODE_ERRORS.inc(node=name)
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            start, had_error = time.perf_counter(), bool(getattr(state, "error", None))
+            try:
+                result = await node(state)
+            except Exception:
+                finish(start, had_error, None, failed=True)
+                raise
+            finish(start, had_error, result)
+            return result
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        start, had_error = time.perf_counter(), bool(getattr(state, "error", None))
+        try:
+            result = node(state)
+        except Exception:
+            finish(start, had_error, None, failed=True)
+            raise
+        finish(start, had_error, result)
+        return result
+    return wrapper
+
+
+def _family(name: str, kind: str, documentation: str, lines: List[str]) -> List[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"] + lines
+
+
+def _cache_samples() -> List[str]:
+    """Contadores de las cachés (se leen al exportar, no se duplican)"""
+    # Importación tardía: cache importa config y este módulo debe poder
+    # importarse desde cualquier servicio sin ciclos
+    from app.services.cache import cache_stats
+
+    stats = cache_stats()
+    lookups, ratios = [], []
+    for cache, values in sorted(stats.items()):
+        for result in ("memory_hits", "disk_hits", "misses"):
+            lookups.append(
+                f'route_agent_cache_lookups_total{{cache="{_escape(cache)}",result="{result}"}} {values[result]}'
+            )
+        ratios.append(f'route_agent_cache_hit_ratio{{cache="{_escape(cache)}"}} {_format_value(values["hit_ratio"])}')
+
+    return (
+        _family("route_agent_cache_lookups_total", "counter", "Búsquedas en caché por resultado", lookups)
+        + _family("route_agent_cache_hit_ratio", "gauge", "Aciertos (memoria + disco) / búsquedas", ratios)
+    )
+
+
+def render_metrics() -> str:
+    """Todas las métricas del proceso en formato de texto de Prometheus 0.0.4"""
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines += _family(metric.name, metric.kind, metric.documentation, metric.samples())
+    lines += _cache_samples()
+    return "\n".join(lines) + "\n"
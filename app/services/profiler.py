@@ -0,0 +1,317 @@
+"""
+Perfilado por solicitud (opt-in): un hilo muestrea la pila del hilo que
+ejecuta el grafo y el perfil se guarda en formato speedscope
+(https://www.speedscope.app) en PROFILE_DIR
+
+Uso del CLI:
+    python -m app.services.profiler list
+    python -m app.services.profiler show <id> [--top 25]
+    python -m app.services.profiler collapsed <id> > perfil.folded
+"""
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+
+from app.config import get_settings
+
+
+# (función, archivo, línea) de cada nivel de la pila, de la raíz hacia la hoja
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+_PROFILE_ID = re.compile(r"^[0-9a-z-]+$")
+_SUFFIX = ".speedscope.json"
+
+
+class StackSampler:
+    """
+    Muestreador de pila de un hilo: cada `interval_s` lee su frame actual
+    con sys._current_frames(). Cada muestra pesa el tiempo real transcurrido
+    desde la anterior, así los totales suman el tiempo de reloj aunque el
+    hilo perfilado retenga el GIL más que el intervalo.
+    """
+
+    def __init__(self, thread_id: int, interval_s: float = 0.005, root: Optional[Any] = None):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        # Código de la función raíz: se descartan los niveles por encima
+        self.root = root
+        # Muestras en orden cronológico; las consecutivas iguales se fusionan
+        self.samples: List[Tuple[Stack, float]] = []
+        self.started_at = 0.0
+        self.elapsed_s = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed_s = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        last = self.started_at
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            self._add(self._stack(frame), now - last)
+            last = now
+
+    def _stack(self, frame: Any) -> Stack:
+        stack: List[Frame] = []
+        while frame is not None:
+            code = frame.f_code
+            if code is self.root:
+                break
+            stack.append((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _add(self, stack: Stack, weight_s: float) -> None:
+        if self.samples and self.samples[-1][0] == stack:
+            self.samples[-1] = (stack, self.samples[-1][1] + weight_s)
+        else:
+            self.samples.append((stack, weight_s))
+
+
+def profile_call(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, StackSampler]:
+    """
+    Ejecuta fn en el hilo actual bajo el muestreador
+
+    Returns:
+        (resultado de fn, muestreador con las muestras)
+
+    Raises:
+        La excepción de fn (el muestreador se detiene igual)
+    """
+    sampler = StackSampler(
+        threading.get_ident(),
+        interval_s=get_settings().profile_interval_ms / 1000,
+        root=profile_call.__code__
+    )
+    sampler.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        sampler.stop()
+    return result, sampler
+
+
+def _display_path(filename: str) -> str:
+    """Rutas relativas al proyecto, a site-packages o a la librería estándar"""
+    paths = sysconfig.get_paths()
+    for prefix in (os.getcwd(), paths["purelib"], paths["platlib"], paths["stdlib"]):
+        prefix = prefix.rstrip(os.sep) + os.sep
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def save_profile(sampler: StackSampler, name: str, metadata: Dict[str, Any]) -> str:
+    """
+    Guarda el perfil en formato speedscope y borra los más antiguos si se
+    supera PROFILE_MAX_FILES
+
+    Returns:
+        Id del perfil
+    """
+    settings = get_settings()
+    profile_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+
+    frames: List[Dict[str, Any]] = []
+    frame_index: Dict[Frame, int] = {}
+    samples: List[List[int]] = []
+    weights: List[float] = []
+    for stack, weight_s in sampler.samples:
+        indices = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                function, filename, line = frame
+                frames.append({"name": function, "file": _display_path(filename), "line": line})
+            indices.append(frame_index[frame])
+        samples.append(indices)
+        weights.append(round(weight_s * 1000, 3))
+
+    elapsed_ms = round(sampler.elapsed_s * 1000, 1)
+    document = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "exporter": "route-agent",
+        "name": name,
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": elapsed_ms,
+            "samples": samples,
+            "weights": weights,
+        }],
+        # Campo propio (speedscope lo ignora): lo usa el CLI
+        "metadata": {
+            **metadata,
+            "id": profile_id,
+            "created_at": time.time(),
+            "elapsed_ms": elapsed_ms,
+            "samples": len(samples),
+            "interval_ms": sampler.interval_s * 1000,
+        },
+    }
+
+    os.makedirs(settings.profile_dir, exist_ok=True)
+    with open(os.path.join(settings.profile_dir, profile_id + _SUFFIX), "w", encoding="utf-8") as f:
+        json.dump(document, f, ensure_ascii=False, separators=(",", ":"))
+
+    _prune(settings.profile_dir, settings.profile_max_files)
+    return profile_id
+
+
+def _profile_files(directory: str) -> List[str]:
+    """Archivos de perfil del más antiguo al más reciente"""
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if name.endswith(_SUFFIX)]
+    return sorted(names, key=lambda name: (os.path.getmtime(os.path.join(directory, name)), name))
+
+
+def _prune(directory: str, max_files: int) -> None:
+    files = _profile_files(directory)
+    for name in files[:max(len(files) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def load_profile(profile_id: str) -> Dict[str, Any]:
+    """
+    Raises:
+        ValueError: Si el id no es válido o el perfil no existe
+    """
+    if not _PROFILE_ID.match(profile_id):
+        raise ValueError(f"Id de perfil inválido: '{profile_id}'")
+    path = os.path.join(get_settings().profile_dir, profile_id + _SUFFIX)
+    if not os.path.exists(path):
+        raise ValueError(f"Perfil no encontrado: '{profile_id}'")
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Metadatos de los perfiles guardados, del más reciente al más antiguo"""
+    directory = get_settings().profile_dir
+    profiles = []
+    for name in reversed(_profile_files(directory)):
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                profiles.append(json.load(f).get("metadata", {}))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def top_functions(document: Dict[str, Any], limit: int = 25) -> List[Dict[str, Any]]:
+    """
+    Funciones con más tiempo propio (hoja de la pila) y su tiempo total
+    (presentes en la pila, contadas una vez por muestra), en ms
+    """
+    frames = document["shared"]["frames"]
+    profile = document["profiles"][0]
+    own: Dict[int, float] = defaultdict(float)
+    total: Dict[int, float] = defaultdict(float)
+
+    for stack, weight in zip(profile["samples"], profile["weights"]):
+        if stack:
+            own[stack[-1]] += weight
+        for index in set(stack):
+            total[index] += weight
+
+    ranked = sorted(total, key=lambda index: (own[index], total[index]), reverse=True)[:limit]
+    return [
+        {
+            "function": frames[index]["name"],
+            "location": f"{frames[index]['file']}:{frames[index]['line']}",
+            "self_ms": round(own[index], 1),
+            "total_ms": round(total[index], 1),
+        }
+        for index in ranked
+    ]
+
+
+def collapsed_stacks(document: Dict[str, Any]) -> List[str]:
+    """
+    Pilas en formato "colapsado" (una línea "f1;f2;f3 peso" por pila, peso
+    en microsegundos) para flamegraph.pl, inferno o speedscope
+    """
+    frames = document["shared"]["frames"]
+    profile = document["profiles"][0]
+    merged: Dict[str, float] = defaultdict(float)
+    for stack, weight in zip(profile["samples"], profile["weights"]):
+        key = ";".join(frames[index]["name"] for index in stack) or "(idle)"
+        merged[key] += weight
+    return [f"{stack} {int(round(weight * 1000))}" for stack, weight in sorted(merged.items())]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.services.profiler", description="Perfiles guardados")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Perfiles guardados, del más reciente al más antiguo")
+    show = commands.add_parser("show", help="Funciones con más tiempo de un perfil")
+    show.add_argument("profile_id")
+    show.add_argument("--top", type=int, default=25)
+    collapsed = commands.add_parser("collapsed", help="Exporta el perfil en formato de pilas colapsadas")
+    collapsed.add_argument("profile_id")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        profiles = list_profiles()
+        if not profiles:
+            print(f"Sin perfiles en {get_settings().profile_dir}")
+        for meta in profiles:
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta.get("created_at", 0)))
+            status = "error" if meta.get("error") else "ok"
+            print(f"{meta.get('id')}  {created}  {meta.get('elapsed_ms', 0):>9.1f} ms  {status:<5}  {meta.get('query', '')[:60]}")
+        return 0
+
+    try:
+        document = load_profile(args.profile_id)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    if args.command == "collapsed":
+        print("\n".join(collapsed_stacks(document)))
+        return 0
+
+    meta = document.get("metadata", {})
+    print(f"{meta.get('id')}: {meta.get('elapsed_ms')} ms, {meta.get('samples')} muestras")
+    print(f"Consulta: {meta.get('query', '')}")
+    if meta.get("error"):
+        print(f"Error: {meta['error']}")
+    print()
+    print(f"{'propio ms':>10} {'total ms':>10}  función")
+    for row in top_functions(document, args.top):
+        print(f"{row['self_ms']:>10.1f} {row['total_ms']:>10.1f}  {row['function']}  ({row['location']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
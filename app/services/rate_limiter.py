@@ -0,0 +1,79 @@
+"""
+Limitador token bucket compartido por todo el proceso para respetar
+la cuota de consultas por segundo de las APIs externas
+"""
+from typing import Dict, Optional
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket seguro entre hilos: se recargan `rate` fichas por segundo
+    hasta un máximo de `burst`. Cada llamada a la API consume una ficha.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Bloquea hasta disponer de `tokens` fichas
+
+        Returns:
+            Segundos esperados
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited_s += waited
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Igual que acquire() pero espera sin bloquear el event loop"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    self.waited_s += waited
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, rate: float, burst: Optional[float] = None) -> TokenBucket:
+    """Limitador compartido por el proceso, creado la primera vez que se pide"""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            limiter = TokenBucket(rate, burst)
+            _limiters[name] = limiter
+        return limiter
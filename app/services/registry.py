@@ -0,0 +1,241 @@
+"""
+Registro de servicios del proceso: crea una sola vez los clientes de
+Google Maps y OpenAI con pools de conexiones persistentes (keep-alive/TLS)
+y los comparte entre todas las solicitudes
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import threading
+
+import googlemaps
+import httpx
+import requests
+from openai import AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.config import Settings, get_settings
+from app.services.google_maps import GoogleMapsService
+from app.services.google_maps_async import AsyncGoogleMapsService, BASE_URL
+from app.services.llm_service import LLMService
+
+
+class ConnectionStats:
+    """Contadores de solicitudes y conexiones nuevas de un cliente HTTP"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter de requests que cuenta solicitudes y conexiones abiertas"""
+
+    def __init__(self, connection_stats: ConnectionStats, **kwargs):
+        self.connection_stats = connection_stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.connection_stats
+
+        class CountingHTTPPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.count("new_connections")
+                return super()._new_conn()
+
+        class CountingHTTPSPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.count("new_connections")
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPPool,
+            "https": CountingHTTPSPool,
+        }
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        # Solo las solicitudes respondidas (las fallidas no reutilizan nada)
+        self.connection_stats.count("requests")
+        return response
+
+
+def _build_maps_client(settings: Settings, connection_stats: ConnectionStats) -> googlemaps.Client:
+    """googlemaps.Client sobre una requests.Session con pool acotado"""
+    session = requests.Session()
+    adapter = _CountingAdapter(
+        connection_stats,
+        pool_connections=settings.http_pool_connections,
+        pool_maxsize=settings.http_pool_maxsize
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return googlemaps.Client(
+        key=settings.google_maps_api_key,
+        connect_timeout=settings.http_connect_timeout_s,
+        read_timeout=settings.http_read_timeout_s,
+        requests_session=session
+    )
+
+
+def _httpx_options(settings: Settings, connection_stats: ConnectionStats, asynchronous: bool) -> Dict[str, Any]:
+    """Límites, timeouts y hooks de conteo para httpx.Client / httpx.AsyncClient"""
+
+    def count_connection(event_name: str) -> None:
+        # httpcore solo emite connect_tcp al abrir una conexión nueva
+        if event_name == "connection.connect_tcp.complete":
+            connection_stats.count("new_connections")
+
+    if asynchronous:
+        async def on_trace(event_name: str, info: Dict[str, Any]) -> None:
+            count_connection(event_name)
+
+        async def on_request(request: httpx.Request) -> None:
+            request.extensions["trace"] = on_trace
+
+        async def on_response(response: httpx.Response) -> None:
+            connection_stats.count("requests")
+    else:
+        def on_trace(event_name: str, info: Dict[str, Any]) -> None:
+            count_connection(event_name)
+
+        def on_request(request: httpx.Request) -> None:
+            request.extensions["trace"] = on_trace
+
+        def on_response(response: httpx.Response) -> None:
+            connection_stats.count("requests")
+
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.http_pool_maxsize,
+            max_keepalive_connections=settings.http_pool_maxsize
+        ),
+        "timeout": httpx.Timeout(
+            settings.http_read_timeout_s,
+            connect=settings.http_connect_timeout_s
+        ),
+        "event_hooks": {"request": [on_request], "response": [on_response]},
+    }
+
+
+@dataclass
+class ServiceRegistry:
+    """Servicios compartidos y sus métricas de reutilización de conexiones"""
+    google_maps: GoogleMapsService
+    google_maps_async: AsyncGoogleMapsService
+    llm: LLMService
+    connection_stats: Dict[str, ConnectionStats] = field(default_factory=dict)
+    # Clientes async y URL base a las que conviene abrir conexión al arrancar
+    warm_up_targets: List[Tuple[httpx.AsyncClient, str]] = field(default_factory=list)
+
+    @classmethod
+    def create(cls, settings: Optional[Settings] = None) -> "ServiceRegistry":
+        settings = settings or get_settings()
+        maps_stats, maps_async_stats, openai_stats = ConnectionStats(), ConnectionStats(), ConnectionStats()
+        maps_http = httpx.AsyncClient(**_httpx_options(settings, maps_async_stats, asynchronous=True))
+        openai_http = httpx.AsyncClient(**_httpx_options(settings, openai_stats, asynchronous=True))
+        async_openai = AsyncOpenAI(api_key=settings.openai_api_key, http_client=openai_http)
+        return cls(
+            google_maps=GoogleMapsService(client=_build_maps_client(settings, maps_stats)),
+            google_maps_async=AsyncGoogleMapsService(client=maps_http),
+            llm=LLMService(
+                client=OpenAI(
+                    api_key=settings.openai_api_key,
+                    http_client=httpx.Client(**_httpx_options(settings, openai_stats, asynchronous=False))
+                ),
+                async_client=async_openai
+            ),
+            connection_stats={
+                "google_maps": maps_stats,
+                "google_maps_async": maps_async_stats,
+                "openai": openai_stats,
+            },
+            warm_up_targets=[(maps_http, BASE_URL), (openai_http, str(async_openai.base_url))]
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.stats() for name, stats in self.connection_stats.items()}
+
+    async def warm_up(self) -> None:
+        """
+        Abre de antemano una conexión (TCP + TLS) por cliente con un HEAD a
+        la URL base, que no consume cuota. Si no hay red, no hace nada.
+        """
+        async def head(client: httpx.AsyncClient, url: str) -> None:
+            try:
+                await client.head(url)
+            except httpx.HTTPError:
+                pass
+
+        await asyncio.gather(*(head(client, url) for client, url in self.warm_up_targets))
+
+    async def aclose(self) -> None:
+        """Cierra los pools de conexiones"""
+        session = getattr(self.google_maps.client, "session", None)
+        if session is not None:
+            session.close()
+        self.llm.client.close()
+        await self.google_maps_async.aclose()
+        if self.llm.async_client is not None:
+            await self.llm.async_client.close()
+
+
+_registry: Optional[ServiceRegistry] = None
+_registry_lock = threading.Lock()
+
+# Registro que reemplaza al del proceso en el contexto actual (p. ej. simulados)
+_override: ContextVar[Optional[ServiceRegistry]] = ContextVar("services_override", default=None)
+
+
+def get_services() -> ServiceRegistry:
+    """Registro compartido por el proceso (se crea al arrancar la app o al primer uso)"""
+    global _registry
+    override = _override.get()
+    if override is not None:
+        return override
+    with _registry_lock:
+        if _registry is None:
+            _registry = ServiceRegistry.create()
+        return _registry
+
+
+@contextmanager
+def use_services(registry: ServiceRegistry) -> Iterator[ServiceRegistry]:
+    """Usa `registry` en lugar del registro del proceso dentro del bloque"""
+    token = _override.set(registry)
+    try:
+        yield registry
+    finally:
+        _override.reset(token)
+
+
+def init_services() -> ServiceRegistry:
+    """Crea el registro al arrancar la aplicación"""
+    return get_services()
+
+
+async def close_services() -> None:
+    """Cierra los clientes al apagar la aplicación"""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
@@ -0,0 +1,57 @@
+"""
+Caché de respuestas completas de /api/route con ETag: una consulta repetida
+(mismo texto normalizado y mismas opciones) se responde sin ejecutar el grafo
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import time
+
+from app.config import get_settings
+from app.services.cache import TieredCache, get_cache
+from app.utils.helpers import normalize_query_text
+
+
+def get_response_cache() -> Optional[TieredCache]:
+    """Caché compartida entre workers, o None si RESPONSE_CACHE_ENABLED=false"""
+    settings = get_settings()
+    if not settings.response_cache_enabled:
+        return None
+    return get_cache(
+        "route_response",
+        ttl_seconds=settings.response_cache_ttl_s,
+        max_entries=settings.response_cache_max_entries,
+        memory_entries=settings.response_cache_memory_entries
+    )
+
+
+def route_cache_key(query: str, time_budget_ms: Optional[int] = None, mode: str = "driving") -> str:
+    """Consulta normalizada + modo de transporte + opciones del optimizador"""
+    return f"{normalize_query_text(query)}|{mode}|budget={time_budget_ms or 0}"
+
+
+def make_entry(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Entrada de caché: cuerpo JSON, ETag fuerte (hash del cuerpo) y momento de creación"""
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    etag = '"' + hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32] + '"'
+    return {"body": body, "etag": etag, "stored_at": time.time()}
+
+
+def entry_max_age(entry: Dict[str, Any]) -> int:
+    """Segundos de validez restantes (0 o menos: vencida)"""
+    age = time.time() - entry["stored_at"]
+    return int(get_settings().response_cache_ttl_s - age)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Compara If-None-Match con el ETag (comparación débil, RFC 9110):
+    acepta listas separadas por comas, W/ y "*"
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
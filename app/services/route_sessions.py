@@ -0,0 +1,258 @@
+"""
+Sesiones de ruta: conservan el último estado del grafo para aplicar
+cambios incrementales (agregar/quitar paradas, nueva posición del conductor)
+sin volver a ejecutar el flujo completo
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import uuid
+
+from app.config import get_settings
+from app.models.state import GraphState, Location, RouteStep
+from app.services.google_maps import GoogleMapsService
+from app.services.registry import get_services
+from app.services.tsp_solver import TSPSolver
+from app.utils.helpers import build_google_maps_url, sanitize_location_name
+
+
+@dataclass
+class RouteSession:
+    """Estado guardado de una sesión y su candado de actualización"""
+    state: GraphState
+    updated_at: float = field(default_factory=time.time)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class RouteSessionStore:
+    """Almacén en memoria de sesiones con TTL y expulsión LRU"""
+
+    def __init__(self, ttl_seconds: int = 3600, max_sessions: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, RouteSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, state: GraphState) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = RouteSession(state=state)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[RouteSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def save(self, session_id: str, state: GraphState) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.state = state
+                session.updated_at = time.time()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+
+_store: Optional[RouteSessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> RouteSessionStore:
+    """Almacén compartido por el proceso (creación perezosa)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            settings = get_settings()
+            _store = RouteSessionStore(
+                ttl_seconds=settings.route_session_ttl_s,
+                max_sessions=settings.route_session_max
+            )
+        return _store
+
+
+def add_stop(
+    state: GraphState,
+    location_name: str,
+    google_service: Optional[GoogleMapsService] = None
+) -> GraphState:
+    """
+    Agrega una parada: geocodifica solo la nueva ubicación, obtiene su fila
+    y columna de la matriz (2n elementos) y la inserta en la posición más
+    barata con reparación 2-opt local
+
+    Raises:
+        ValueError: Si la parada ya existe o falla una API
+    """
+    name = sanitize_location_name(location_name)
+    if any(loc.name == name for loc in state.locations):
+        raise ValueError(f"'{name}' ya está en la ruta")
+
+    google_service = google_service or get_services().google_maps
+    location = google_service.geocode(name)
+
+    dist_out, dur_out = google_service.get_distance_matrix_values([location], state.locations)
+    dist_in, dur_in = google_service.get_distance_matrix_values(state.locations, [location])
+
+    for i in range(len(state.locations)):
+        state.distance_matrix[i].append(float(dist_in[i, 0]))
+        state.duration_matrix[i].append(int(dur_in[i, 0]))
+    state.distance_matrix.append(dist_out[0].tolist() + [0.0])
+    state.duration_matrix.append(dur_out[0].tolist() + [0])
+
+    node = len(state.locations)
+    state.locations.append(location)
+    state.destinations.append(name)
+
+    solver = TSPSolver(state.distance_matrix)
+    state.optimized_order = solver.insert_node(
+        state.optimized_order, node, closed=state.return_to_origin
+    )
+
+    _refresh_route(state, f"➕ Parada agregada: {name}")
+    return state
+
+
+def remove_stop(state: GraphState, location_name: str) -> GraphState:
+    """
+    Quita una parada sin llamadas externas: elimina su fila/columna, une a
+    sus vecinos en la ruta y repara con 2-opt local
+
+    Raises:
+        ValueError: Si la parada no existe, es el origen o es la última
+    """
+    name = sanitize_location_name(location_name)
+    node = next(
+        (i for i, loc in enumerate(state.locations) if loc.name == name and i != 0),
+        None
+    )
+    if node is None:
+        raise ValueError(f"'{name}' no es una parada de la ruta")
+    if len(state.locations) <= 2:
+        raise ValueError("La ruta debe tener al menos un destino")
+
+    position = state.optimized_order.index(node)
+    state.optimized_order = [
+        idx - 1 if idx > node else idx
+        for idx in state.optimized_order
+        if idx != node
+    ]
+
+    del state.distance_matrix[node]
+    del state.duration_matrix[node]
+    for row in state.distance_matrix:
+        del row[node]
+    for row in state.duration_matrix:
+        del row[node]
+    del state.locations[node]
+    state.destinations = [d for d in state.destinations if d != name]
+
+    solver = TSPSolver(state.distance_matrix)
+    state.optimized_order = solver.repair(
+        state.optimized_order, [position], closed=state.return_to_origin
+    )
+
+    _refresh_route(state, f"➖ Parada eliminada: {name}")
+    return state
+
+
+def update_position(
+    state: GraphState,
+    location_name: str,
+    coordinates: Optional[Tuple[float, float]] = None,
+    google_service: Optional[GoogleMapsService] = None
+) -> GraphState:
+    """
+    El conductor está ahora en otra ubicación: reemplaza el origen (nodo 0),
+    obtiene solo su fila y columna y repara los tramos que salen de él
+    (y el regreso, si la ruta es cerrada)
+
+    Raises:
+        ValueError: Si falla una API
+    """
+    name = sanitize_location_name(location_name)
+    google_service = google_service or get_services().google_maps
+
+    if coordinates is not None:
+        location = Location(name=name, lat=coordinates[0], lng=coordinates[1])
+    else:
+        location = google_service.geocode(name)
+
+    # Los tramos que salían del origen anterior ya no son válidos
+    old_name = state.locations[0].name
+    state.route_steps = [
+        step for step in state.route_steps
+        if old_name not in (step.from_location, step.to_location)
+    ]
+
+    others = state.locations[1:]
+    dist_out, dur_out = google_service.get_distance_matrix_values([location], others)
+    dist_in, dur_in = google_service.get_distance_matrix_values(others, [location])
+
+    state.distance_matrix[0] = [0.0] + dist_out[0].tolist()
+    state.duration_matrix[0] = [0] + dur_out[0].tolist()
+    for i in range(1, len(state.locations)):
+        state.distance_matrix[i][0] = float(dist_in[i - 1, 0])
+        state.duration_matrix[i][0] = int(dur_in[i - 1, 0])
+
+    state.locations[0] = location
+    state.origin = name
+
+    solver = TSPSolver(state.distance_matrix)
+    route = solver.repair(state.optimized_order, [1], closed=state.return_to_origin)
+    if state.return_to_origin:
+        route = solver.repair(route, [len(route) - 2], closed=True)
+    state.optimized_order = route
+
+    _refresh_route(state, f"📍 Nueva posición: {name}")
+    return state
+
+
+def _refresh_route(state: GraphState, message: str) -> None:
+    """
+    Recalcula nombres, totales, tramos y URL tras un cambio incremental.
+    Los tramos que no cambiaron conservan los datos de Directions.
+    """
+    previous: Dict[Tuple[str, str], RouteStep] = {
+        (step.from_location, step.to_location): step for step in state.route_steps
+    }
+
+    order = state.optimized_order
+    state.optimized_locations = [state.locations[idx].name for idx in order]
+
+    steps: List[RouteStep] = []
+    for from_idx, to_idx in zip(order, order[1:]):
+        from_name = state.locations[from_idx].name
+        to_name = state.locations[to_idx].name
+        step = previous.get((from_name, to_name))
+        if step is None:
+            step = RouteStep(
+                from_location=from_name,
+                to_location=to_name,
+                distance_km=round(state.distance_matrix[from_idx][to_idx], 2),
+                duration_min=state.duration_matrix[from_idx][to_idx],
+                polyline=None
+            )
+        steps.append(step)
+
+    state.route_steps = steps
+    state.total_distance_km = round(sum(step.distance_km for step in steps), 2)
+    state.total_duration_min = sum(step.duration_min for step in steps)
+    state.google_maps_url = build_google_maps_url(state.optimized_locations)
+
+    state.messages.append({
+        "role": "system",
+        "content": f"{message} → {len(steps)} tramos, {state.total_distance_km} km"
+    })
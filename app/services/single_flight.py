@@ -0,0 +1,138 @@
+"""
+Coalescencia de llamadas externas (single-flight): las llamadas
+concurrentes con la misma clave esperan a una sola solicitud en vuelo
+y comparten su resultado o su error
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import threading
+
+from app.config import get_settings
+
+
+class _Call:
+    """Llamada síncrona en vuelo"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Grupo de llamadas deduplicadas por clave. Las llamadas síncronas se
+    comparten entre hilos; las asíncronas entre tareas del mismo event loop.
+    Solo se deduplican llamadas simultáneas: al terminar, la clave se libera.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Ejecuta fn() o espera a la llamada en vuelo con la misma clave
+
+        Raises:
+            La excepción de fn(), también en las llamadas que esperaban
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Versión async de do(): la llamada corre en una tarea propia, así
+        cancelar a quien espera no cancela la solicitud compartida
+
+        Raises:
+            La excepción de fn(), también en las llamadas que esperaban
+        """
+        task_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._tasks[task_key] = task
+                task.add_done_callback(lambda t: self._release(task_key, t))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        return await asyncio.shield(task)
+
+    def _release(self, task_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        # Si nadie esperaba el resultado, evitar el aviso de excepción no leída
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.calls + self.coalesced
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / total, 4) if total else 0.0,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Grupo compartido por el proceso, creado la primera vez que se pide"""
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = SingleFlight()
+            _groups[name] = group
+        return group
+
+
+def coalesce(name: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    """fn() deduplicada en el grupo `name` (directa si SINGLE_FLIGHT_ENABLED=false)"""
+    if not get_settings().single_flight_enabled:
+        return fn()
+    return get_single_flight(name).do(key, fn)
+
+
+async def acoalesce(name: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Versión async de coalesce()"""
+    if not get_settings().single_flight_enabled:
+        return await fn()
+    return await get_single_flight(name).ado(key, fn)
+
+
+def single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    """Llamadas reales y deduplicadas de cada grupo (para /health)"""
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.stats() for name, group in groups.items()}
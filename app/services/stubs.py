@@ -0,0 +1,139 @@
+"""
+Servicios simulados sin red: responden con datos deterministas para
+calentar el grafo al arrancar y para benchmarks
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+
+import numpy as np
+
+from app.models.state import Location
+from app.services.google_maps import BaseGoogleMapsService, MatrixCellBatch
+from app.services.registry import ServiceRegistry
+from app.utils.helpers import haversine_distance
+
+
+# Velocidad media supuesta para las duraciones simuladas
+_STUB_SPEED_KMH = 30.0
+
+
+def _stub_coordinates(address: str) -> Tuple[float, float]:
+    """Coordenadas estables alrededor de Lima derivadas del nombre"""
+    digest = hashlib.md5(address.lower().encode("utf-8")).digest()
+    return -12.0 - digest[0] / 255 * 0.3, -77.0 - digest[1] / 255 * 0.3
+
+
+class StubGoogleMapsService(BaseGoogleMapsService):
+    """GoogleMapsService sin llamadas externas ni cachés"""
+
+    def _matrix_cache(self):
+        # Sin caché: los valores simulados no deben mezclarse con los reales
+        return None
+
+    def geocode(self, address: str) -> Location:
+        lat, lng = _stub_coordinates(address)
+        return Location(name=address, address=f"{address} (simulado)", lat=lat, lng=lng)
+
+    def get_distance_matrix_values(
+        self,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str = "driving"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        distances = np.array([
+            [haversine_distance((o.lat, o.lng), (d.lat, d.lng)) for d in destinations]
+            for o in origins
+        ], dtype=float).reshape(len(origins), len(destinations))
+        durations = (distances / _STUB_SPEED_KMH * 60).astype(np.int64)
+        return distances, durations
+
+    def get_matrix_cells(
+        self,
+        locations: List[Location],
+        pairs: Iterable[Tuple[int, int]],
+        mode: str = "driving"
+    ) -> MatrixCellBatch:
+        cells = MatrixCellBatch(self, locations, pairs, mode)
+        for tile in cells.tiles:
+            tile_origins, tile_destinations = cells.tile_locations(tile)
+            # Llamada explícita a la versión síncrona: en AsyncStubGoogleMapsService
+            # self.get_distance_matrix_values es una corutina
+            distances, durations = StubGoogleMapsService.get_distance_matrix_values(
+                self, tile_origins, tile_destinations, mode
+            )
+            cells.apply(tile, {
+                "status": "OK",
+                "rows": [
+                    {"elements": [
+                        {"status": "OK", "distance": {"value": km * 1000}, "duration": {"value": minutes * 60}}
+                        for km, minutes in zip(distance_row.tolist(), duration_row.tolist())
+                    ]}
+                    for distance_row, duration_row in zip(distances, durations)
+                ],
+            })
+        cells.finish()
+        return cells
+
+    def get_directions(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        mode: str = "driving",
+        alternatives: bool = False,
+        waypoints: Optional[List[Tuple[float, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        # Sin rutas: el nodo usa los datos de la matriz
+        return []
+
+
+class AsyncStubGoogleMapsService(StubGoogleMapsService):
+    """Versión async de StubGoogleMapsService"""
+
+    async def geocode(self, address: str) -> Location:
+        return StubGoogleMapsService.geocode(self, address)
+
+    async def get_distance_matrix_values(
+        self,
+        origins: List[Location],
+        destinations: List[Location],
+        mode: str = "driving"
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return StubGoogleMapsService.get_distance_matrix_values(self, origins, destinations, mode)
+
+    async def get_matrix_cells(
+        self,
+        locations: List[Location],
+        pairs: Iterable[Tuple[int, int]],
+        mode: str = "driving"
+    ) -> MatrixCellBatch:
+        return StubGoogleMapsService.get_matrix_cells(self, locations, pairs, mode)
+
+    async def get_directions(self, *args, **kwargs) -> List[Dict[str, Any]]:
+        return []
+
+
+class StubLLMService:
+    """LLMService que separa el texto por comas e 'y' en lugar de llamar al modelo"""
+
+    def parse_route_input(self, user_input: str) -> Dict[str, Any]:
+        parts = [
+            part.strip()
+            for chunk in user_input.split(",")
+            for part in chunk.split(" y ")
+            if part.strip()
+        ]
+        if len(parts) < 2:
+            raise ValueError("No se pudieron identificar los destinos")
+        return {"origin": parts[0], "destinations": parts[1:], "return_to_origin": False}
+
+    async def aparse_route_input(self, user_input: str) -> Dict[str, Any]:
+        return self.parse_route_input(user_input)
+
+
+def stub_registry() -> ServiceRegistry:
+    """Registro con todos los servicios simulados (sin red)"""
+    return ServiceRegistry(
+        google_maps=StubGoogleMapsService(),
+        google_maps_async=AsyncStubGoogleMapsService(),
+        llm=StubLLMService()
+    )
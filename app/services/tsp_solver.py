@@ -1,11 +1,24 @@
 """
 Servicio para resolver el problema del viajante (TSP)
-Usa heurística Nearest Neighbor y optimización 2-opt
+Usa heurística Nearest Neighbor y optimización 2-opt, o Held-Karp exacto
+para rutas pequeñas
 """
-from typing import List, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import os
+import random
+import threading
+import time
 import numpy as np
 
 
+# Margen sobre el presupuesto para recoger los procesos de solve_anytime
+ANYTIME_GRACE_S = 0.05
+
+
 class TSPSolver:
     """Resuelve TSP para rutas pequeñas (<20 nodos)"""
     
@@ -14,8 +27,11 @@ class TSPSolver:
         Args:
             distance_matrix: Matriz NxN de distancias entre ubicaciones
         """
-        self.matrix = np.array(distance_matrix)
+        self.matrix = np.asarray(distance_matrix, dtype=float)
         self.n = len(distance_matrix)
+        self._open_matrix: Optional[np.ndarray] = None
+        # Pasadas de 2-opt y movimientos de la búsqueda con candidatos (/metrics)
+        self.iterations = 0
     
     def solve(self, return_to_start: bool = False) -> Tuple[List[int], float]:
         """
@@ -36,38 +52,253 @@ class TSPSolver:
         # Heurística: Nearest Neighbor desde el nodo 0
         route = self._nearest_neighbor()
         
-        # Optimización: 2-opt
-        route = self._two_opt(route)
-        
-        # Si debe volver al inicio, agregar el nodo 0 al final
+        # Si debe volver al inicio, el nodo 0 cierra el tour y 2-opt
+        # optimiza también la arista de regreso
         if return_to_start:
             route.append(0)
         
+        # Optimización: 2-opt
+        route = self._two_opt(route, closed=return_to_start)
+        
         total_distance = self._calculate_route_distance(route)
         
         return route, total_distance
     
-    def _nearest_neighbor(self) -> List[int]:
-        """Heurística del vecino más cercano"""
+    def solve_anytime(
+        self,
+        time_budget_ms: int,
+        return_to_start: bool = False,
+        max_workers: Optional[int] = None
+    ) -> Tuple[List[int], float]:
+        """
+        Búsqueda local multi-arranque en paralelo con presupuesto de tiempo
+        
+        Cada proceso del pool ejecuta búsqueda local iterada (arranques
+        aleatorizados + perturbaciones double-bridge + 2-opt) hasta agotar el
+        presupuesto. La matriz se comparte por memoria compartida: a cada
+        tarea solo se le envía el nombre del bloque. Mientras tanto este
+        hilo corre OR-Tools con el mismo presupuesto y se devuelve la mejor
+        de las dos rutas: el presupuesto nunca da una ruta peor que OR-Tools
+        con ese tiempo (2-opt rinde poco en matrices asimétricas).
+        
+        El pool debería existir de antemano (warm_up_process_pool): si se
+        crea aquí, su arranque consume el presupuesto. Los procesos que no
+        terminen a tiempo (+ANYTIME_GRACE_S) se descartan.
+        
+        Args:
+            time_budget_ms: Tiempo de reloj disponible en milisegundos
+            return_to_start: Si debe volver al punto inicial
+            max_workers: Procesos a usar (por defecto, todos los núcleos)
+            
+        Returns:
+            (ruta_ordenada, distancia_total) de la mejor ruta encontrada
+        """
+        if self.n <= 3:
+            return self.solve(return_to_start)
+        
+        workers = max_workers or os.cpu_count() or 1
+        deadline = time.time() + time_budget_ms / 1000.0
+        
+        shm = shared_memory.SharedMemory(create=True, size=self.matrix.nbytes)
+        try:
+            shared = np.ndarray(self.matrix.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = self.matrix
+            
+            pool = _get_process_pool(workers)
+            futures = [
+                pool.submit(
+                    _multi_start_worker, shm.name, self.matrix.shape,
+                    seed, deadline, return_to_start
+                )
+                for seed in range(workers)
+            ]
+            
+            reference = solve_tsp_ortools(
+                self.matrix,
+                return_to_start=return_to_start,
+                time_limit_ms=max(int((deadline - time.time()) * 1000), 1)
+            )
+            
+            # Margen corto para que los procesos terminen su último 2-opt
+            done, _ = wait(futures, timeout=max(deadline - time.time(), 0) + ANYTIME_GRACE_S)
+            results = [f.result() for f in done if f.exception() is None]
+        finally:
+            shm.close()
+            shm.unlink()
+        
+        self.iterations += sum(result[2] for result in results)
+        results.append((reference[0], reference[1], 0))
+        route, distance, _ = min(results, key=lambda result: result[1])
+        return route, distance
+    
+    def solve_large(
+        self,
+        return_to_start: bool = False,
+        neighbors: int = 10
+    ) -> Tuple[List[int], float]:
+        """
+        Heurística para rutas grandes (cientos de paradas)
+        
+        Vecino más cercano seguido de búsqueda local restringida a listas de
+        candidatos (k vecinos más cercanos por nodo) con don't-look bits.
+        Revisar un nodo cuesta O(k) en lugar de O(n); aplicar un movimiento
+        cuesta O(largo del tramo que cambia), más un desplazamiento
+        vectorizado (numpy) de las sumas prefijas posteriores.
+        
+        Args:
+            return_to_start: Si debe volver al punto inicial
+            neighbors: Tamaño k de la lista de candidatos por nodo
+            
+        Returns:
+            (ruta_ordenada, distancia_total)
+        """
+        if self.n <= 3:
+            return self.solve(return_to_start)
+        
+        route = self._nearest_neighbor()
+        if return_to_start:
+            route.append(0)
+        
+        route = self._candidate_search(route, closed=return_to_start, neighbors=neighbors)
+        
+        return route, self._calculate_route_distance(route)
+    
+    def insert_node(
+        self,
+        route: List[int],
+        node: int,
+        closed: bool = False,
+        radius: int = 3
+    ) -> List[int]:
+        """
+        Inserta un nodo en la posición más barata de una ruta existente y
+        repara localmente con 2-opt alrededor de la inserción
+        
+        Args:
+            route: Ruta actual (comienza en 0; termina en 0 si es cerrada)
+            node: Nodo a insertar (índice de la matriz)
+            closed: Si la ruta termina en 0
+            radius: Posiciones a cada lado de la inserción a reparar
+        """
+        idx = np.asarray(route)
+        prev, nxt = idx[:-1], idx[1:]
+        
+        # Insertar entre route[p-1] y route[p]
+        costs = self.matrix[prev, node] + self.matrix[node, nxt] - self.matrix[prev, nxt]
+        best = int(np.argmin(costs)) + 1
+        if not closed and self.matrix[route[-1], node] < costs[best - 1]:
+            best = len(route)  # Al final de una ruta abierta
+        
+        new_route = route[:best] + [node] + route[best:]
+        return self.repair(new_route, [best], closed=closed, radius=radius)
+    
+    def repair(
+        self,
+        route: List[int],
+        positions: List[int],
+        closed: bool = False,
+        radius: int = 3
+    ) -> List[int]:
+        """
+        2-opt localizado alrededor de las posiciones modificadas
+        
+        Args:
+            route: Ruta a reparar
+            positions: Posiciones de la ruta donde hubo cambios
+            closed: Si la ruta termina en 0
+            radius: Posiciones a cada lado a reparar
+        """
+        if not positions:
+            return list(route)
+        
+        lo = max(1, min(positions) - radius)
+        hi = min(len(route) - 1, max(positions) + radius)
+        return self._two_opt(route, closed=closed, window=(lo, hi))
+    
+    def _nearest_neighbor(
+        self,
+        rng: Optional[random.Random] = None,
+        candidates: int = 3
+    ) -> List[int]:
+        """
+        Heurística del vecino más cercano
+        
+        Args:
+            rng: Si se indica, elige al azar entre los `candidates` vecinos
+                más cercanos (arranques aleatorizados)
+        """
+        if rng is None:
+            return self._nearest_neighbor_greedy()
+        
         unvisited = set(range(1, self.n))  # Comenzamos desde 0
         route = [0]
         current = 0
         
         while unvisited:
-            # Encontrar el más cercano no visitado
-            nearest = min(unvisited, key=lambda x: self.matrix[current][x])
+            # Elegir al azar entre los más cercanos no visitados
+            options = sorted(unvisited, key=lambda x: self.matrix[current][x])[:candidates]
+            nearest = rng.choice(options)
             route.append(nearest)
             unvisited.remove(nearest)
             current = nearest
         
         return route
     
-    def _two_opt(self, route: List[int], max_iterations: int = 1000) -> List[int]:
+    def _nearest_neighbor_greedy(self) -> List[int]:
+        """Vecino más cercano determinista, vectorizado por fila"""
+        visited = np.zeros(self.n, dtype=bool)
+        visited[0] = True
+        route = [0]
+        current = 0
+        
+        for _ in range(self.n - 1):
+            row = np.where(visited, np.inf, self.matrix[current])
+            current = int(np.argmin(row))
+            visited[current] = True
+            route.append(current)
+        
+        return route
+    
+    def _two_opt(
+        self,
+        route: List[int],
+        max_iterations: int = 1000,
+        closed: bool = False,
+        window: Optional[Tuple[int, int]] = None
+    ) -> List[int]:
         """
-        Optimización 2-opt: intercambia pares de aristas para mejorar la ruta
+        Optimización 2-opt: invierte segmentos de la ruta para mejorarla
+        
+        Cada movimiento se evalúa por diferencia de aristas en O(1) usando
+        sumas prefijas de la ruta en ambos sentidos, lo que mantiene el
+        cálculo correcto en matrices asimétricas (ida != vuelta). Las
+        mejoras se aplican en el lugar y el barrido continúa sin reiniciar.
+        
+        Args:
+            route: Ruta inicial (comienza en el nodo 0)
+            max_iterations: Máximo de pasadas completas sobre la ruta
+            closed: Si la ruta termina en 0 (tour cerrado); el último nodo
+                queda fijo. En rutas abiertas el final puede cambiar.
+            window: Posiciones (lo, hi) a reparar; solo se prueban inversiones
+                que empiezan o terminan dentro de la ventana
         """
-        best_route = route.copy()
-        best_distance = self._calculate_route_distance(best_route)
+        if len(route) < 4:
+            return list(route)
+        
+        # Nodo terminal fijo: en rutas abiertas se agrega un nodo ficticio
+        # con costo 0 hacia/desde todos, así ambos casos se tratan igual
+        if closed:
+            matrix = self.matrix
+            r = np.array(route, dtype=np.intp)
+        else:
+            if self._open_matrix is None:
+                self._open_matrix = np.zeros((self.n + 1, self.n + 1))
+                self._open_matrix[:self.n, :self.n] = self.matrix
+            matrix = self._open_matrix
+            r = np.array(list(route) + [self.n], dtype=np.intp)
+        
+        m = len(r)
+        fwd, bwd = self._prefix_costs(matrix, r)
         improved = True
         iteration = 0
         
@@ -75,90 +306,664 @@ class TSPSolver:
             improved = False
             iteration += 1
             
-            for i in range(1, len(route) - 2):
-                for j in range(i + 1, len(route)):
-                    if j - i == 1:
+            # Segmento r[i:j] con i >= 1 y j <= m - 1 (inicio y fin fijos)
+            for i in range(1, m - 2):
+                if window is None or window[0] <= i <= window[1]:
+                    js = np.arange(i + 2, m)
+                else:
+                    # Fuera de la ventana: solo segmentos que terminan en ella
+                    js = np.arange(max(i + 2, window[0] + 1), min(m - 1, window[1] + 1) + 1)
+                    if len(js) == 0:
                         continue
-                    
-                    # Crear nueva ruta invirtiendo el segmento
-                    new_route = route[:i] + route[i:j][::-1] + route[j:]
-                    new_distance = self._calculate_route_distance(new_route)
-                    
-                    if new_distance < best_distance:
-                        best_route = new_route
-                        best_distance = new_distance
-                        route = new_route
-                        improved = True
-                        break
+                prev, first = r[i - 1], r[i]
+                last, nxt = r[js - 1], r[js]
+                
+                delta = (
+                    matrix[prev, last] + matrix[first, nxt]
+                    - matrix[prev, first] - matrix[last, nxt]
+                    + (bwd[js - 1] - bwd[i]) - (fwd[js - 1] - fwd[i])
+                )
                 
-                if improved:
-                    break
+                k = int(np.argmin(delta))
+                if delta[k] < -1e-9:
+                    j = int(js[k])
+                    r[i:j] = r[i:j][::-1]
+                    fwd, bwd = self._prefix_costs(matrix, r)
+                    improved = True
         
+        self.iterations += iteration
+        best_route = r.tolist()
+        if not closed:
+            best_route.pop()
         return best_route
     
+    def _candidate_search(
+        self,
+        route: List[int],
+        closed: bool = False,
+        neighbors: int = 10
+    ) -> List[int]:
+        """
+        Búsqueda local con listas de candidatos y don't-look bits
+        
+        Para cada nodo activo c1 y cada candidato c2 entre sus k vecinos
+        más cercanos prueba:
+        - 2-opt que une c1 con c2 (inversión de segmento)
+        - Or-opt: reubicar el segmento de 1-3 nodos que empieza o termina en
+          c1 junto a c2 (antes o después, en ambos sentidos); con un solo
+          nodo es la inserción del movimiento 2h-opt
+        
+        Las inversiones se evalúan con sumas prefijas (matrices asimétricas);
+        tras cada movimiento solo se recalculan las del tramo que cambió.
+        Un nodo solo se vuelve a revisar si cambia alguna de sus aristas.
+        
+        Args:
+            route: Ruta inicial (comienza en el nodo 0)
+            closed: Si la ruta termina en 0 (tour cerrado)
+            neighbors: Tamaño k de la lista de candidatos
+        """
+        if len(route) < 5:
+            return list(route)
+        
+        if closed:
+            matrix = self.matrix
+            r = list(route)
+        else:
+            if self._open_matrix is None:
+                self._open_matrix = np.zeros((self.n + 1, self.n + 1))
+                self._open_matrix[:self.n, :self.n] = self.matrix
+            matrix = self._open_matrix
+            r = list(route) + [self.n]
+        
+        m = len(r)
+        d = matrix.tolist()
+        
+        # k vecinos más cercanos de cada nodo por costo ida + vuelta
+        # (sin sí mismo ni el origen)
+        k = min(neighbors, self.n - 2)
+        masked = self.matrix + self.matrix.T
+        np.fill_diagonal(masked, np.inf)
+        masked[:, 0] = np.inf
+        candidates = np.argpartition(masked, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(masked, candidates, axis=1).argsort(axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1).tolist()
+        
+        pos = [0] * len(d)
+        for idx, node in enumerate(r):
+            pos[node] = idx
+        fwd, bwd = self._prefix_costs(matrix, np.array(r, dtype=np.intp))
+        
+        def refresh(lo: int, hi: int) -> None:
+            # Solo cambió r[lo:hi]: se recalculan sus aristas (de r[lo-1] a
+            # r[hi]) y el resto de las sumas se desplaza por la diferencia
+            for idx in range(lo, hi):
+                pos[r[idx]] = idx
+            seg = np.array(r[lo - 1:hi + 1], dtype=np.intp)
+            new_fwd = fwd[lo - 1] + np.cumsum(matrix[seg[:-1], seg[1:]])
+            new_bwd = bwd[lo - 1] + np.cumsum(matrix[seg[1:], seg[:-1]])
+            fwd[hi + 1:] += new_fwd[-1] - fwd[hi]
+            bwd[hi + 1:] += new_bwd[-1] - bwd[hi]
+            fwd[lo:hi + 1] = new_fwd
+            bwd[lo:hi + 1] = new_bwd
+        
+        def reversal_delta(i: int, j: int) -> float:
+            # Invertir r[i:j] (1 <= i, j <= m - 1, al menos 2 nodos)
+            prev, first, last, nxt = r[i - 1], r[i], r[j - 1], r[j]
+            return (
+                d[prev][last] + d[first][nxt] - d[prev][first] - d[last][nxt]
+                + (bwd[j - 1] - bwd[i]) - (fwd[j - 1] - fwd[i])
+            )
+        
+        def relocation_delta(p: int, length: int, x: int, reverse: bool) -> float:
+            # Mover r[p:p+length] entre x y su sucesor
+            first, last = r[p], r[p + length - 1]
+            a, b = r[p - 1], r[p + length]
+            y = r[pos[x] + 1]
+            removed = d[a][first] + d[last][b] - d[a][b]
+            if reverse:
+                # Segmentos de 2-3 nodos: sus aristas se leen directo de la matriz
+                if length == 2:
+                    internal = d[last][first] - d[first][last]
+                else:
+                    mid = r[p + 1]
+                    internal = d[last][mid] + d[mid][first] - d[first][mid] - d[mid][last]
+                added = d[x][last] + d[first][y] - d[x][y] + internal
+            else:
+                added = d[x][first] + d[last][y] - d[x][y]
+            return added - removed
+        
+        active = deque(r[1:m - 1])
+        queued = [False] * len(d)
+        for node in active:
+            queued[node] = True
+        
+        def wake(*nodes: int) -> None:
+            for node in nodes:
+                if 1 <= pos[node] <= m - 2:
+                    if not queued[node]:
+                        queued[node] = True
+                        active.append(node)
+        
+        while active:
+            c1 = active.popleft()
+            queued[c1] = False
+            best = (-1e-9, None)
+            
+            for c2 in candidates[c1]:
+                p1, p2 = pos[c1], pos[c2]
+                
+                # 2-opt: crea la arista c1 -> c2 o c2 -> c1 según cuál va primero
+                lo, hi = min(p1, p2), max(p1, p2)
+                for i, j in ((lo + 1, hi + 1), (lo, hi)):
+                    if i >= 1 and j <= m - 1 and j - i >= 2:
+                        delta = reversal_delta(i, j)
+                        if delta < best[0]:
+                            best = (delta, ("2opt", i, j))
+                
+                # Or-opt: segmentos que empiezan o terminan en c1
+                for length in (1, 2, 3):
+                    for p in ((p1,) if length == 1 else (p1, p1 - length + 1)):
+                        if p < 1 or p + length > m - 1:
+                            continue
+                        for x in (c2, r[p2 - 1] if p2 >= 1 else -1):
+                            if x < 0 or pos[x] >= m - 1:
+                                continue
+                            if p - 1 <= pos[x] < p + length:
+                                continue
+                            for reverse in ((False, True) if length > 1 else (False,)):
+                                delta = relocation_delta(p, length, x, reverse)
+                                if delta < best[0]:
+                                    best = (delta, ("oropt", p, length, x, reverse))
+            
+            move = best[1]
+            if move is None:
+                continue
+            self.iterations += 1
+            
+            if move[0] == "2opt":
+                _, i, j = move
+                touched = (r[i - 1], r[i], r[j - 1], r[j])
+                r[i:j] = r[i:j][::-1]
+                refresh(i, j)
+                wake(*touched)
+            else:
+                _, p, length, x, reverse = move
+                segment = r[p:p + length]
+                if reverse:
+                    segment.reverse()
+                px = pos[x]
+                touched = (r[p - 1], r[p], r[p + length - 1], r[p + length], x, r[px + 1])
+                del r[p:p + length]
+                insert_at = px + 1 if px < p else px + 1 - length
+                r[insert_at:insert_at] = segment
+                lo, hi = min(p, insert_at), max(p + length, insert_at + length)
+                refresh(lo, hi)
+                wake(*touched)
+            
+            # c1 puede seguir mejorando
+            if not queued[c1]:
+                queued[c1] = True
+                active.append(c1)
+        
+        if not closed:
+            r.pop()
+        return r
+    
+    @staticmethod
+    def _double_bridge(route: List[int], rng: random.Random, closed: bool) -> List[int]:
+        """
+        Perturbación double-bridge: corta la ruta en A|B|C|D y la reconecta
+        como A|C|B|D. Mantiene fijo el origen (y el regreso si es cerrada).
+        """
+        end = len(route) - 1 if closed else len(route)
+        if end - 1 < 4:
+            return list(route)
+        
+        a, b, c = sorted(rng.sample(range(2, end), 3))
+        return route[:a] + route[b:c] + route[a:b] + route[c:]
+    
+    @staticmethod
+    def _prefix_costs(matrix: np.ndarray, route: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sumas prefijas del costo de la ruta recorrida hacia adelante y
+        hacia atrás: fwd[k] = costo de route[0..k], bwd[k] = mismo tramo invertido
+        """
+        fwd = np.concatenate(([0.0], np.cumsum(matrix[route[:-1], route[1:]])))
+        bwd = np.concatenate(([0.0], np.cumsum(matrix[route[1:], route[:-1]])))
+        return fwd, bwd
+    
+    def _calculate_route_distance(self, route: List[int]) -> float:
+        """Calcula la distancia total de una ruta"""
+        if len(route) < 2:
+            return 0.0
+        idx = np.asarray(route)
+        return float(self.matrix[idx[:-1], idx[1:]].sum())
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+def _pool_context() -> multiprocessing.context.BaseContext:
+    """
+    forkserver (spawn donde no existe): hacer fork desde la API copiaría
+    sus hilos, locks tomados y clientes HTTP a los procesos del pool
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Los procesos nacen con numpy y el solver ya importados
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Pool de procesos compartido por todas las solicitudes (creación perezosa)"""
+    global _process_pool, _process_pool_workers
+    
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers < workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def solver_pool_workers() -> int:
+    """Procesos que necesitará el pool: el mayor de TSP_MAX_WORKERS y BATCH_SOLVER_WORKERS"""
+    # Importación tardía: el solver no depende de la configuración
+    from app.config import get_settings
+    
+    cpus = os.cpu_count() or 1
+    settings = get_settings()
+    return max(settings.tsp_max_workers or cpus, settings.batch_solver_workers or cpus)
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def warm_up_process_pool(workers: int) -> None:
+    """
+    Crea el pool y arranca sus procesos (al iniciar la app), para que la
+    primera solicitud con presupuesto no lo pague. También importa OR-Tools,
+    que solve_anytime usa en el proceso actual.
+    """
+    try:
+        from ortools.constraint_solver import pywrapcp  # noqa: F401
+    except ImportError:
+        pass
+    pool = _get_process_pool(workers)
+    # Una tarea por proceso: el pool arranca uno por cada tarea sin atender
+    wait([pool.submit(_worker_ready) for _ in range(workers)])
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool, _process_pool_workers
+    
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool, _process_pool_workers = None, 0
+
+
+_attached_matrices: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _multi_start_worker(
+    shm_name: str,
+    shape: Tuple[int, int],
+    seed: int,
+    deadline: float,
+    return_to_start: bool
+) -> Tuple[List[int], float, int]:
+    """
+    Tarea del pool: búsqueda local iterada sobre la matriz compartida
+    hasta el deadline (time.time()). El arranque 0 es el vecino más cercano
+    determinista, así el resultado nunca es peor que solve().
+    
+    Returns:
+        (ruta, distancia, pasadas de 2-opt realizadas)
+    """
+    shm = _attached_matrices.get(shm_name)
+    if shm is None:
+        # Solo se conserva el último bloque; los anteriores ya fueron liberados
+        for stale in _attached_matrices.values():
+            stale.close()
+        _attached_matrices.clear()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _attached_matrices[shm_name] = shm
+    
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    solver = TSPSolver(matrix)
+    rng = random.Random(seed)
+    
+    def local_search(route: List[int]) -> Tuple[List[int], float]:
+        route = solver._two_opt(route, closed=return_to_start)
+        return route, solver._calculate_route_distance(route)
+    
+    start = solver._nearest_neighbor(rng if seed else None)
+    if return_to_start:
+        start.append(0)
+    best_route, best_distance = local_search(start)
+    
+    while time.time() < deadline:
+        candidate = solver._double_bridge(best_route, rng, return_to_start)
+        route, distance = local_search(candidate)
+        if distance < best_distance - 1e-9:
+            best_route, best_distance = route, distance
+    
+    return best_route, best_distance, solver.iterations
+
+
+class HeldKarpSolver:
+    """
+    Resuelve TSP de forma exacta con programación dinámica (Held-Karp)
+    
+    dp[S, j] = costo mínimo de salir de 0, visitar el conjunto S y terminar
+    en j. Los subconjuntos se procesan por capas de igual cardinalidad y
+    cada capa se calcula con operaciones vectorizadas de NumPy.
+    Memoria O(2^n · n): limitado a max_n nodos.
+    """
+    
+    def __init__(self, distance_matrix: List[List[float]], max_n: int = 15):
+        """
+        Args:
+            distance_matrix: Matriz NxN de distancias entre ubicaciones
+            max_n: Máximo de nodos admitidos (acota la memoria de la tabla)
+            
+        Raises:
+            ValueError: Si la matriz supera max_n nodos
+        """
+        self.matrix = np.array(distance_matrix, dtype=float)
+        self.n = len(distance_matrix)
+        
+        if self.n > max_n:
+            raise ValueError(f"Held-Karp admite hasta {max_n} nodos (recibidos: {self.n})")
+    
+    def solve(self, return_to_start: bool = False) -> Tuple[List[int], float]:
+        """
+        Encuentra la ruta óptima exacta desde el nodo 0
+        
+        Args:
+            return_to_start: Si debe volver al punto inicial (tour cerrado);
+                si no, se optimiza un camino abierto con final libre
+            
+        Returns:
+            (ruta_ordenada, distancia_total)
+        """
+        if self.n <= 2:
+            route = list(range(self.n))
+            if return_to_start and self.n == 2:
+                route.append(0)
+            return route, self._calculate_route_distance(route)
+        
+        m = self.n - 1  # Nodos a visitar (sin contar el origen)
+        full = (1 << m) - 1
+        sub = self.matrix[1:, 1:]
+        
+        dp = np.full((1 << m, m), np.inf)
+        parent = np.zeros((1 << m, m), dtype=np.int8)
+        
+        bits = np.arange(m)
+        dp[1 << bits, bits] = self.matrix[0, 1:]
+        
+        masks = np.arange(1 << m)
+        popcount = np.zeros(1 << m, dtype=np.int64)
+        for b in range(m):
+            popcount += (masks >> b) & 1
+        
+        for size in range(2, m + 1):
+            layer = masks[popcount == size]
+            for j in range(m):
+                sel = layer[(layer >> j) & 1 == 1]
+                candidates = dp[sel ^ (1 << j)] + sub[:, j]
+                best = np.argmin(candidates, axis=1)
+                dp[sel, j] = candidates[np.arange(len(sel)), best]
+                parent[sel, j] = best
+        
+        final = dp[full].copy()
+        if return_to_start:
+            final += self.matrix[1:, 0]
+        last = int(np.argmin(final))
+        
+        # Reconstruir el camino desde el final
+        path = []
+        mask, j = full, last
+        while mask:
+            path.append(j + 1)
+            prev = int(parent[mask, j])
+            mask ^= 1 << j
+            j = prev
+        
+        route = [0] + path[::-1]
+        if return_to_start:
+            route.append(0)
+        
+        return route, self._calculate_route_distance(route)
+    
     def _calculate_route_distance(self, route: List[int]) -> float:
         """Calcula la distancia total de una ruta"""
-        total = 0.0
-        for i in range(len(route) - 1):
-            total += self.matrix[route[i]][route[i + 1]]
-        return total
+        if len(route) < 2:
+            return 0.0
+        idx = np.asarray(route)
+        return float(self.matrix[idx[:-1], idx[1:]].sum())
+
+
+
+def _register_matrix(routing, manager, costs: np.ndarray) -> int:
+    """
+    Registra una matriz entera como costo de tránsito en OR-Tools, sin
+    callbacks de Python por arco cuando la versión lo permite
+    """
+    if hasattr(routing, "RegisterTransitMatrix"):
+        return routing.RegisterTransitMatrix(costs.tolist())
+    
+    # Versiones antiguas de OR-Tools: callback sobre la matriz precalculada
+    cost_rows = costs.tolist()
+    
+    def transit_callback(from_index, to_index):
+        return cost_rows[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)]
+    
+    return routing.RegisterTransitCallback(transit_callback)
+
+
+def _search_parameters(time_limit_ms: int):
+    """PATH_CHEAPEST_ARC + Guided Local Search con límite de tiempo"""
+    from ortools.constraint_solver import routing_enums_pb2
+    from ortools.constraint_solver import pywrapcp
+    
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    search_parameters.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    search_parameters.time_limit.FromMilliseconds(time_limit_ms)
+    return search_parameters
 
 
 def solve_tsp_ortools(
     distance_matrix: List[List[float]], 
-    return_to_start: bool = False
+    return_to_start: bool = False,
+    time_limit_ms: int = 1000
 ) -> Tuple[List[int], float]:
     """
     Alternativa usando OR-Tools (más preciso para problemas grandes)
     Requiere: pip install ortools
+    
+    La matriz se convierte una sola vez a enteros (metros) y se registra
+    como matriz de tránsito, sin callbacks de Python por arco. Tras la
+    solución inicial se aplica Guided Local Search hasta time_limit_ms.
+    
+    Args:
+        distance_matrix: Matriz NxN de distancias en km
+        return_to_start: Si debe volver al punto inicial; si no, la ruta
+            termina en un nodo ficticio de costo 0 (final libre)
+        time_limit_ms: Tiempo máximo de búsqueda en milisegundos
+        
+    Returns:
+        (ruta_ordenada, distancia_total)
     """
     try:
-        from ortools.constraint_solver import routing_enums_pb2
         from ortools.constraint_solver import pywrapcp
     except ImportError:
         # Fallback a heurística propia
         solver = TSPSolver(distance_matrix)
         return solver.solve(return_to_start)
     
-    manager = pywrapcp.RoutingIndexManager(
-        len(distance_matrix), 
-        1,  # Un solo vehículo
-        0   # Depot (inicio)
-    )
-    routing = pywrapcp.RoutingModel(manager)
+    matrix = np.asarray(distance_matrix, dtype=float)
+    n = len(matrix)
+    if n <= 2:
+        return TSPSolver(matrix).solve(return_to_start)
+    
+    # Convertir a metros (enteros) una sola vez
+    costs = np.rint(matrix * 1000).astype(np.int64)
     
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return int(distance_matrix[from_node][to_node] * 1000)  # Convertir a metros
+    if return_to_start:
+        manager = pywrapcp.RoutingIndexManager(n, 1, 0)
+    else:
+        # Nodo ficticio n como final: llegar a él cuesta 0 desde cualquier nodo
+        costs = np.pad(costs, ((0, 1), (0, 1)))
+        manager = pywrapcp.RoutingIndexManager(n + 1, 1, [0], [n])
+    routing = pywrapcp.RoutingModel(manager)
     
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    transit_callback_index = _register_matrix(routing, manager, costs)
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
     
-    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-    search_parameters.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    )
+    search_parameters = _search_parameters(time_limit_ms)
     
     solution = routing.SolveWithParameters(search_parameters)
     
     if solution:
         route = []
         index = routing.Start(0)
-        total_distance = 0
         
         while not routing.IsEnd(index):
-            node = manager.IndexToNode(index)
-            route.append(node)
-            previous_index = index
+            route.append(manager.IndexToNode(index))
             index = solution.Value(routing.NextVar(index))
-            total_distance += routing.GetArcCostForVehicle(previous_index, index, 0)
         
         if return_to_start:
             route.append(0)
         
-        return route, total_distance / 1000.0  # Convertir de vuelta a km
+        # Distancia con la matriz original (sin redondeo a metros)
+        idx = np.asarray(route)
+        return route, float(matrix[idx[:-1], idx[1:]].sum())
     
     # Si no hay solución, usar heurística
     solver = TSPSolver(distance_matrix)
-    return solver.solve(return_to_start)
\ No newline at end of file
+    return solver.solve(return_to_start)
+
+
+def solve_vrp_ortools(
+    distance_matrix: List[List[float]],
+    num_vehicles: int,
+    duration_matrix: Optional[List[List[int]]] = None,
+    vehicle_capacities: Optional[List[int]] = None,
+    demands: Optional[List[int]] = None,
+    max_route_duration_min: Optional[int] = None,
+    return_to_start: bool = True,
+    balance_coefficient: int = 100,
+    time_limit_ms: int = 1000
+) -> Tuple[List[List[int]], List[int]]:
+    """
+    Planifica una flota completa (VRP) sobre una única matriz compartida
+    
+    Todos los vehículos salen del nodo 0. El costo es la distancia total
+    más balance_coefficient veces la ruta más larga, para repartir la carga.
+    Las paradas que no caben por capacidad o duración quedan sin asignar.
+    
+    Args:
+        distance_matrix: Matriz NxN de distancias en km
+        num_vehicles: Cantidad de vehículos
+        duration_matrix: Matriz NxN de duraciones en minutos
+        vehicle_capacities: Capacidad de cada vehículo (opcional)
+        demands: Demanda de cada nodo; por defecto 1 por parada
+        max_route_duration_min: Duración máxima de cada ruta (opcional)
+        return_to_start: Si los vehículos vuelven al origen
+        balance_coefficient: Peso de la ruta más larga en el costo
+        time_limit_ms: Tiempo máximo de búsqueda en milisegundos
+        
+    Returns:
+        (rutas por vehículo, nodos sin asignar)
+        
+    Raises:
+        ValueError: Si OR-Tools no está disponible o no hay solución
+    """
+    try:
+        from ortools.constraint_solver import pywrapcp
+    except ImportError:
+        raise ValueError("OR-Tools es necesario para planificar flotas")
+    
+    n = len(distance_matrix)
+    costs = np.rint(np.asarray(distance_matrix, dtype=float) * 1000).astype(np.int64)
+    durations = (
+        np.asarray(duration_matrix, dtype=np.int64)
+        if duration_matrix else None
+    )
+    
+    if return_to_start:
+        manager = pywrapcp.RoutingIndexManager(n, num_vehicles, 0)
+    else:
+        # Nodo ficticio n como final compartido de costo 0
+        costs = np.pad(costs, ((0, 1), (0, 1)))
+        if durations is not None:
+            durations = np.pad(durations, ((0, 1), (0, 1)))
+        manager = pywrapcp.RoutingIndexManager(
+            n + 1, num_vehicles, [0] * num_vehicles, [n] * num_vehicles
+        )
+    routing = pywrapcp.RoutingModel(manager)
+    
+    transit_callback_index = _register_matrix(routing, manager, costs)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+    
+    # Balanceo de carga: penalizar la ruta más larga
+    routing.AddDimension(transit_callback_index, 0, int(costs.sum()) + 1, True, "Distance")
+    routing.GetDimensionOrDie("Distance").SetGlobalSpanCostCoefficient(balance_coefficient)
+    
+    if vehicle_capacities:
+        node_demands = list(demands) if demands else [0] + [1] * (n - 1)
+        node_demands += [0] * (manager.GetNumberOfNodes() - len(node_demands))
+        
+        def demand_callback(from_index):
+            return node_demands[manager.IndexToNode(from_index)]
+        
+        demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+        routing.AddDimensionWithVehicleCapacity(
+            demand_callback_index, 0, list(vehicle_capacities), True, "Capacity"
+        )
+    
+    if max_route_duration_min and durations is not None:
+        duration_callback_index = _register_matrix(routing, manager, durations)
+        routing.AddDimension(
+            duration_callback_index, 0, int(max_route_duration_min), True, "Duration"
+        )
+    
+    # Permitir dejar paradas sin asignar con una penalización dominante
+    penalty = int(costs.sum()) * (balance_coefficient + 1) + 1
+    for node in range(1, n):
+        routing.AddDisjunction([manager.NodeToIndex(node)], penalty)
+    
+    solution = routing.SolveWithParameters(_search_parameters(time_limit_ms))
+    if not solution:
+        raise ValueError("No se encontró una solución para la flota")
+    
+    routes: List[List[int]] = []
+    assigned = set()
+    for vehicle in range(num_vehicles):
+        route = []
+        index = routing.Start(vehicle)
+        while not routing.IsEnd(index):
+            node = manager.IndexToNode(index)
+            route.append(node)
+            assigned.add(node)
+            index = solution.Value(routing.NextVar(index))
+        if return_to_start:
+            route.append(0)
+        routes.append(route)
+    
+    unassigned = [node for node in range(1, n) if node not in assigned]
+    return routes, unassigned
@@ -10,7 +10,9 @@ from app.utils.helpers import (
     calculate_bounding_box,
     estimate_fuel_cost,
     chunk_list,
-    sanitize_location_name
+    sanitize_location_name,
+    build_google_maps_url,
+    normalize_query_text
 )
 
 __all__ = [
@@ -21,5 +23,7 @@ __all__ = [
     "calculate_bounding_box",
     "estimate_fuel_cost",
     "chunk_list",
-    "sanitize_location_name"
+    "sanitize_location_name",
+    "build_google_maps_url",
+    "normalize_query_text"
 ]
\ No newline at end of file
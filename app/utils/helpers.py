@@ -3,6 +3,9 @@ Funciones utilitarias para el proyecto
 """
 from typing import List, Tuple
 import math
+import re
+import unicodedata
+import urllib.parse
 
 
 def haversine_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
@@ -168,4 +171,53 @@ def sanitize_location_name(name: str) -> str:
     # Capitalizar correctamente
     name = name.title()
     
-    return name.strip()
\ No newline at end of file
+    return name.strip()
+
+
+def build_google_maps_url(locations: List[str], travel_mode: str = "driving") -> str:
+    """
+    Genera URL de Google Maps con origen, destino y paradas intermedias
+    
+    Args:
+        locations: Nombres de ubicaciones en orden de visita
+        travel_mode: Modo de transporte
+        
+    Returns:
+        URL de Google Maps o "" si hay menos de 2 ubicaciones
+    """
+    if len(locations) < 2:
+        return ""
+    
+    origin = urllib.parse.quote(locations[0])
+    destination = urllib.parse.quote(locations[-1])
+    waypoints = "|".join([urllib.parse.quote(loc) for loc in locations[1:-1]])
+    
+    url = f"https://www.google.com/maps/dir/?api=1&origin={origin}&destination={destination}"
+    if waypoints:
+        url += f"&waypoints={waypoints}"
+    url += f"&travelmode={travel_mode}"
+    return url
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Forma canónica de una consulta para usarla como clave de caché:
+    minúsculas, sin tildes, separadores unificados y espacios colapsados
+    
+    Args:
+        text: Consulta del usuario
+        
+    Returns:
+        Texto normalizado ("Desde  Lima: Surco; Ñaña." -> "desde lima: surco, nana")
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    
+    # ; y saltos de línea separan lugares igual que la coma
+    text = re.sub(r"[;\n]+", ",", text)
+    # Signos que no cambian el significado
+    text = re.sub(r"[.!?¡¿\"'`´]+", " ", text)
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\s*:\s*", ": ", text)
+    
+    return " ".join(text.split()).strip(" ,")
@@ -0,0 +1,4 @@
+# benchmarks/__init__.py
+"""
+Benchmarks de rendimiento (no se incluyen en la imagen Docker)
+"""
@@ -0,0 +1,145 @@
+"""
+Benchmark de los solvers TSP sobre matrices asimétricas aleatorias
+
+Las filas "base" son las implementaciones anteriores (2-opt que recalcula
+la ruta completa en cada movimiento y OR-Tools con parámetros por
+defecto) como referencia de tiempo y costo.
+
+Uso:
+    python -m benchmarks.bench_tsp [n1 n2 ...]
+"""
+import sys
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.tsp_solver import TSPSolver, HeldKarpSolver, solve_tsp_ortools
+
+
+# El 2-opt base es O(n) por movimiento evaluado: más allá se vuelve eterno
+BASELINE_TWO_OPT_MAX_N = 100
+
+
+def random_matrix(n: int, seed: int = 0) -> List[List[float]]:
+    """Matriz de distancias euclídeas con ruido asimétrico (simula tráfico)"""
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 2)) * 20
+    base = np.linalg.norm(points[:, None] - points[None], axis=2)
+    return (base * (1 + 0.2 * rng.random((n, n)))).tolist()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _route_distance(matrix: List[List[float]], route: List[int]) -> float:
+    return sum(matrix[route[i]][route[i + 1]] for i in range(len(route) - 1))
+
+
+def baseline_two_opt(
+    matrix: List[List[float]],
+    return_to_start: bool = False,
+    max_iterations: int = 1000
+) -> Tuple[List[int], float]:
+    """
+    Vecino más cercano + 2-opt original: cada movimiento copia la ruta
+    invertida y recalcula su distancia completa, y tras cada mejora la
+    búsqueda vuelve a empezar
+    """
+    n = len(matrix)
+    unvisited = set(range(1, n))
+    route = [0]
+    while unvisited:
+        nearest = min(unvisited, key=lambda x: matrix[route[-1]][x])
+        route.append(nearest)
+        unvisited.remove(nearest)
+
+    best_distance = _route_distance(matrix, route)
+    improved = True
+    iteration = 0
+    while improved and iteration < max_iterations:
+        improved = False
+        iteration += 1
+        for i in range(1, len(route) - 2):
+            for j in range(i + 2, len(route)):
+                new_route = route[:i] + route[i:j][::-1] + route[j:]
+                new_distance = _route_distance(matrix, new_route)
+                if new_distance < best_distance:
+                    route, best_distance = new_route, new_distance
+                    improved = True
+                    break
+            if improved:
+                break
+
+    if return_to_start:
+        route.append(0)
+    return route, _route_distance(matrix, route)
+
+
+def baseline_ortools(matrix: List[List[float]], return_to_start: bool = False) -> Tuple[List[int], float]:
+    """
+    OR-Tools como estaba: callback de Python por arco y parámetros por
+    defecto (solo PATH_CHEAPEST_ARC, sin metaheurística ni límite)
+    """
+    from ortools.constraint_solver import routing_enums_pb2
+    from ortools.constraint_solver import pywrapcp
+
+    manager = pywrapcp.RoutingIndexManager(len(matrix), 1, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def distance_callback(from_index, to_index):
+        return int(matrix[manager.IndexToNode(from_index)][manager.IndexToNode(to_index)] * 1000)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(routing.RegisterTransitCallback(distance_callback))
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    solution = routing.SolveWithParameters(search_parameters)
+
+    route = []
+    index = routing.Start(0)
+    while not routing.IsEnd(index):
+        route.append(manager.IndexToNode(index))
+        index = solution.Value(routing.NextVar(index))
+    if return_to_start:
+        route.append(0)
+    return route, _route_distance(matrix, route)
+
+
+def main(sizes: List[int]) -> None:
+    settings = get_settings()
+    print(f"{'n':>5} {'solver':<16} {'ms':>10} {'costo':>10}")
+    for n in sizes:
+        matrix = random_matrix(n)
+        (_, cost), ms = timed(TSPSolver(matrix).solve, return_to_start=True)
+        print(f"{n:>5} {'2-opt':<16} {ms:>10.1f} {cost:>10.2f}")
+
+        if n <= BASELINE_TWO_OPT_MAX_N:
+            (_, cost), ms = timed(baseline_two_opt, matrix, return_to_start=True)
+            print(f"{n:>5} {'2-opt (base)':<16} {ms:>10.1f} {cost:>10.2f}")
+
+        if 15 < n <= 200:
+            # Mismo límite que usa optimize_route_node
+            time_limit_ms = min(settings.ortools_time_limit_ms, settings.ortools_ms_per_stop * n)
+            (_, cost), ms = timed(solve_tsp_ortools, matrix, return_to_start=True, time_limit_ms=time_limit_ms)
+            print(f"{n:>5} {'or-tools':<16} {ms:>10.1f} {cost:>10.2f}")
+
+            (_, cost), ms = timed(baseline_ortools, matrix, return_to_start=True)
+            print(f"{n:>5} {'or-tools (base)':<16} {ms:>10.1f} {cost:>10.2f}")
+
+        if n >= 100:
+            (_, cost), ms = timed(TSPSolver(matrix).solve_large, return_to_start=True)
+            print(f"{n:>5} {'candidatos':<16} {ms:>10.1f} {cost:>10.2f}")
+
+        if n <= 15:
+            (_, cost), ms = timed(HeldKarpSolver(matrix).solve, return_to_start=True)
+            print(f"{n:>5} {'held-karp':<16} {ms:>10.1f} {cost:>10.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 13, 15, 20, 50, 100, 200, 300, 1000, 2000])
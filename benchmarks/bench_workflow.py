@@ -0,0 +1,68 @@
+"""
+Micro-benchmark del costo fijo por solicitud del grafo: compilar en cada
+solicitud vs. reutilizar el grafo compilado al arrancar. Usa servicios
+simulados, así que solo mide la sobrecarga de LangGraph y los nodos.
+
+Uso:
+    python -m benchmarks.bench_workflow [repeticiones]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+from app.graph.workflow import build_workflow, get_compiled_workflow
+from app.models.state import GraphState
+from app.services.registry import use_services
+from app.services.stubs import stub_registry
+
+
+QUERY = "Lima, Miraflores, Barranco, Surco y San Isidro"
+
+
+def measure(fn: Callable[[], None], repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(label: str, samples: List[float]) -> None:
+    print(
+        f"{label:<28} {statistics.mean(samples):>8.2f} "
+        f"{statistics.median(samples):>8.2f} {max(samples):>8.2f}"
+    )
+
+
+def main(repeat: int) -> None:
+    print(f"{'ms por solicitud':<28} {'media':>8} {'mediana':>8} {'máx':>8}")
+
+    with use_services(stub_registry()):
+        report("compilar", measure(lambda: build_workflow().compile(), repeat))
+
+        report("compilar + invoke", measure(
+            lambda: build_workflow().compile().invoke(GraphState(user_input=QUERY)), repeat
+        ))
+
+        graph = get_compiled_workflow("route")
+        graph.invoke(GraphState(user_input=QUERY))
+        report("grafo compartido + invoke", measure(
+            lambda: graph.invoke(GraphState(user_input=QUERY)), repeat
+        ))
+
+        async_graph = get_compiled_workflow("route", asynchronous=True)
+        loop = asyncio.new_event_loop()
+        try:
+            report("grafo compartido + ainvoke", measure(
+                lambda: loop.run_until_complete(async_graph.ainvoke(GraphState(user_input=QUERY))),
+                repeat
+            ))
+        finally:
+            loop.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,11 @@
+"""
+Configuración común de los tests: claves de API ficticias y directorios
+temporales, antes de que se importe app.config
+"""
+import os
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("GOOGLE_MAPS_API_KEY", "AIzatest")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="route-agent-cache-"))
+os.environ.setdefault("JOB_QUEUE_PATH", os.path.join(tempfile.mkdtemp(prefix="route-agent-jobs-"), "jobs.sqlite3"))
@@ -0,0 +1,54 @@
+"""
+Lotes de rutas contra los servicios simulados (sin red)
+"""
+import asyncio
+
+from app.graph.batch import RouteBatch
+from app.models.state import Location
+from app.services.metrics import SOLVER_SECONDS, TOUR_COST_KM, reset_metrics
+from app.services.registry import use_services
+from app.services.stubs import stub_registry
+
+
+def _run(batch: RouteBatch):
+    async def collect():
+        return [item async for item in batch.run()]
+
+    with use_services(stub_registry()):
+        return dict(asyncio.run(collect()))
+
+
+def test_batch_with_async_stub():
+    batch = RouteBatch()
+    batch.add_query("Lima, Miraflores y Barranco")
+    batch.add_query("Lima, Barranco, Surco")
+    batch.add_locations([
+        Location(name="Almacén", lat=-12.05, lng=-77.04),
+        Location(name="Cliente", lat=-12.12, lng=-77.03),
+    ])
+
+    states = _run(batch)
+
+    assert sorted(states) == [0, 1, 2]
+    for state in states.values():
+        assert state.error is None
+        assert state.distance_matrix
+        assert state.optimized_order[0] == 0
+    # Lima y Barranco se geocodifican una sola vez para todo el lote
+    assert batch.stats["geocoded_locations"] == 4
+    assert batch.stats["location_mentions"] == 6
+
+
+def test_batch_pool_records_solver_metrics():
+    reset_metrics()
+    batch = RouteBatch()
+    # Forzar el pool de procesos aunque la máquina tenga un solo núcleo
+    batch.settings = batch.settings.model_copy(update={"batch_solver_workers": 2})
+    batch.add_query("Lima, Miraflores y Barranco")
+    batch.add_query("Lima, Barranco, Surco")
+
+    states = _run(batch)
+
+    assert all(state.error is None for state in states.values())
+    assert SOLVER_SECONDS.count(solver="held_karp") == 2
+    assert TOUR_COST_KM.count(solver="held_karp") == 2
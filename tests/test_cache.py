@@ -0,0 +1,51 @@
+"""
+Caché de dos niveles: TTL al subir de disco a memoria y accesos en lote
+"""
+import time
+
+from app.services.cache import LRUCache, SQLiteCache, TieredCache
+
+
+def _disk_row(disk: SQLiteCache, key: str):
+    return disk._connect().execute(
+        "SELECT expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+    ).fetchone()
+
+
+def test_disk_hit_keeps_remaining_ttl_in_memory(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "c.sqlite3"), ttl_seconds=3600)
+    disk.set("k", {"v": 1}, ttl_seconds=0.2)
+    cache = TieredCache("test", LRUCache(ttl_seconds=3600), disk)
+
+    assert cache.get("k") == {"v": 1}
+    assert cache.get_many(["k"]) == {"k": {"v": 1}}
+    time.sleep(0.3)
+    # Ni la memoria ni el disco la sirven después de su expiración en disco
+    assert cache.get("k") is None
+    assert cache.get_many(["k"]) == {}
+
+
+def test_hits_write_access_time_in_batches(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "c.sqlite3"))
+    disk.set_many({f"k{i}": i for i in range(SQLiteCache.TOUCH_BATCH)})
+    written = _disk_row(disk, "k0")[1]
+
+    time.sleep(0.01)
+    assert disk.get("k0") == 0
+    assert _disk_row(disk, "k0")[1] == written
+
+    disk.get_many([f"k{i}" for i in range(1, SQLiteCache.TOUCH_BATCH)])
+    assert _disk_row(disk, "k0")[1] > written
+
+
+def test_evict_sees_pending_access_times(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "c.sqlite3"), max_entries=1)
+    disk.set_many({"old": 1})
+    time.sleep(0.01)
+    disk.set_many({"new": 2})
+    time.sleep(0.01)
+    assert disk.get("old") == 1
+
+    disk.evict()
+    assert disk.get("old") == 1
+    assert disk.get("new") is None
@@ -0,0 +1,41 @@
+"""
+Parser por reglas: consultas que debe resolver sin LLM y consultas que
+debe dejar al LLM (devuelve None)
+"""
+import pytest
+
+from app.services.fast_parser import parse_route_fast
+
+
+@pytest.mark.parametrize("text, origin, destinations, return_to_origin", [
+    ("Lima, Miraflores y Barranco", "Lima", ["Miraflores", "Barranco"], False),
+    ("Lima -> Miraflores -> Barranco -> Lima", "Lima", ["Miraflores", "Barranco"], True),
+    ("Desde Lima: Miraflores, Barranco y volver", "Lima", ["Miraflores", "Barranco"], True),
+    ("Lima, Miraflores, Barranco y regresar al inicio", "Lima", ["Miraflores", "Barranco"], True),
+    ("Cercado de Lima, San Juan de Lurigancho y Surco", "Cercado de Lima", ["San Juan de Lurigancho", "Surco"], False),
+])
+def test_structured_queries(text, origin, destinations, return_to_origin):
+    assert parse_route_fast(text) == {
+        "origin": origin,
+        "destinations": destinations,
+        "return_to_origin": return_to_origin,
+    }
+
+
+@pytest.mark.parametrize("text", [
+    # Preposiciones y conectores dentro de un elemento
+    "De Lima a Miraflores y Barranco",
+    "Lima hacia Miraflores y Barranco",
+    "Lima a Miraflores, Barranco",
+    "Miraflores y Barranco desde Lima",
+    "Lima, Miraflores y Barranco pero evitando Surco",
+    "Hoy Lima, mañana Barranco",
+    # Regreso negado
+    "Lima, Miraflores y Barranco sin volver",
+    "Lima, Miraflores, Barranco, no volver",
+    "Lima, Miraflores y Barranco, no es necesario regresar",
+    # Texto libre
+    "Quiero ir de Lima a Miraflores",
+])
+def test_ambiguous_queries_fall_back_to_llm(text):
+    assert parse_route_fast(text) is None
@@ -0,0 +1,67 @@
+"""
+Cola de trabajos SQLite: latidos, reintentos y dueño del resultado
+"""
+import sqlite3
+import time
+
+from app.services.job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+def _queue(tmp_path) -> JobQueue:
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_attempts=2)
+
+
+def test_slow_job_with_heartbeat_is_not_requeued(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue({"query": "Lima, Miraflores"})
+    assert queue.claim("a:1", stale_after_s=0.2)["id"] == job_id
+
+    time.sleep(0.3)
+    assert queue.heartbeat(job_id, "a:1")
+    assert queue.claim("b:2", stale_after_s=0.2) is None
+    assert queue.get(job_id)["status"] == RUNNING
+
+
+def test_job_without_heartbeat_goes_back_to_queue(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue({"query": "Lima, Miraflores"})
+    queue.claim("a:1", stale_after_s=0.2)
+
+    time.sleep(0.3)
+    job = queue.claim("b:2", stale_after_s=0.2)
+    assert job["id"] == job_id
+    assert job["worker"] == "b:2"
+    assert job["attempts"] == 2
+
+
+def test_only_owner_records_result(tmp_path):
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue({"query": "Lima, Miraflores"})
+    queue.claim("a:1", stale_after_s=0.2)
+    time.sleep(0.3)
+    queue.claim("b:2", stale_after_s=0.2)
+
+    # El primer trabajador llega tarde: ya no es dueño del trabajo
+    assert not queue.heartbeat(job_id, "a:1")
+    assert not queue.complete(job_id, "a:1", {"from": "a"})
+    assert queue.complete(job_id, "b:2", {"from": "b"})
+
+    job = queue.get(job_id)
+    assert job["status"] == DONE
+    assert job["result"] == {"from": "b"}
+
+
+def test_old_file_gets_heartbeat_column(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL,"
+        " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+        " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+    )
+    conn.close()
+
+    queue = JobQueue(path)
+    job_id = queue.enqueue({"query": "Lima, Miraflores"})
+    assert queue.get(job_id)["status"] == QUEUED
+    assert queue.claim("a:1", stale_after_s=60)["heartbeat_at"] is not None
@@ -0,0 +1,122 @@
+"""
+Solvers TSP y VRP sobre matrices asimétricas pequeñas y deterministas
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from app.services.tsp_solver import HeldKarpSolver, TSPSolver, solve_vrp_ortools
+
+
+def _matrix(n: int, seed: int = 0) -> list:
+    """Distancias euclídeas con ruido asimétrico (ida != vuelta)"""
+    rng = np.random.default_rng(seed)
+    points = rng.random((n, 2)) * 20
+    base = np.linalg.norm(points[:, None] - points[None], axis=2)
+    return (base * (1 + 0.2 * rng.random((n, n)))).tolist()
+
+
+def _cost(matrix: list, route: list) -> float:
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def _brute_force(matrix: list, closed: bool) -> float:
+    n = len(matrix)
+    return min(
+        _cost(matrix, [0, *order] + ([0] if closed else []))
+        for order in itertools.permutations(range(1, n))
+    )
+
+
+def _assert_valid(route: list, n: int, closed: bool) -> None:
+    assert route[0] == 0
+    if closed:
+        assert route[-1] == 0
+        route = route[:-1]
+    assert sorted(route) == list(range(n))
+
+
+@pytest.mark.parametrize("n", [4, 6, 8])
+@pytest.mark.parametrize("closed", [False, True])
+def test_held_karp_matches_brute_force(n, closed):
+    matrix = _matrix(n, seed=n)
+
+    route, distance = HeldKarpSolver(matrix).solve(return_to_start=closed)
+
+    _assert_valid(route, n, closed)
+    assert distance == pytest.approx(_cost(matrix, route))
+    assert distance == pytest.approx(_brute_force(matrix, closed))
+
+
+@pytest.mark.parametrize("n", [12, 30])
+@pytest.mark.parametrize("closed", [False, True])
+def test_two_opt_is_locally_optimal(n, closed):
+    matrix = _matrix(n, seed=n)
+
+    route, distance = TSPSolver(matrix).solve(return_to_start=closed)
+
+    _assert_valid(route, n, closed)
+    assert distance == pytest.approx(_cost(matrix, route))
+    # Ninguna inversión r[i:j] mejora la ruta (en rutas abiertas el final puede moverse)
+    end = len(route) - 1 if closed else len(route)
+    for i in range(1, end - 1):
+        for j in range(i + 2, end + 1):
+            candidate = route[:i] + route[i:j][::-1] + route[j:]
+            assert _cost(matrix, candidate) >= distance - 1e-9
+
+
+@pytest.mark.parametrize("closed", [False, True])
+def test_insert_node_is_no_worse_than_cheapest_insertion(closed):
+    matrix = _matrix(10, seed=3)
+    solver = TSPSolver(matrix)
+    route = [0, 1, 2, 3, 4, 5, 6, 7, 8] + ([0] if closed else [])
+
+    new_route = solver.insert_node(route, 9, closed=closed)
+
+    _assert_valid(new_route, 10, closed)
+    end = len(route) if not closed else len(route) - 1
+    cheapest = min(_cost(matrix, route[:p] + [9] + route[p:]) for p in range(1, end + 1))
+    assert _cost(matrix, new_route) <= cheapest + 1e-9
+
+
+def test_solve_large_returns_valid_tour_no_worse_than_nearest_neighbor():
+    matrix = _matrix(120, seed=1)
+    solver = TSPSolver(matrix)
+    start = solver._nearest_neighbor() + [0]
+
+    route, distance = solver.solve_large(return_to_start=True, neighbors=8)
+
+    _assert_valid(route, 120, closed=True)
+    assert distance == pytest.approx(_cost(matrix, route))
+    assert distance <= _cost(matrix, start) + 1e-9
+
+
+@pytest.mark.parametrize("closed", [False, True])
+def test_vrp_respects_capacity_and_demands(closed):
+    pytest.importorskip("ortools")
+    matrix = _matrix(7, seed=5)
+    demands = [0, 3, 1, 1, 2, 2, 1]
+
+    routes, unassigned = solve_vrp_ortools(
+        matrix, 2, vehicle_capacities=[5, 5], demands=demands,
+        return_to_start=closed, time_limit_ms=200
+    )
+
+    assert unassigned == []
+    visited = sorted(node for route in routes for node in route if node != 0)
+    assert visited == list(range(1, 7))
+    for route in routes:
+        assert sum(demands[node] for node in route) <= 5
+
+
+def test_vrp_leaves_stops_that_do_not_fit_unassigned():
+    pytest.importorskip("ortools")
+    matrix = _matrix(4, seed=2)
+
+    routes, unassigned = solve_vrp_ortools(
+        matrix, 1, vehicle_capacities=[4], demands=[0, 2, 2, 2], time_limit_ms=100
+    )
+
+    assert len(unassigned) == 1
+    assert sum(1 for node in routes[0] if node != 0) == 2
@@ -0,0 +1,26 @@
+"""
+Construcción del estado inicial de los grafos
+"""
+from app.graph.workflow import _fleet_state
+
+
+def test_fleet_state_drops_demand_of_blank_stop():
+    state = _fleet_state(
+        "Lima", ["Miraflores", "  ", "Barranco"], 2,
+        vehicle_capacities=[3, 3], demands=[1, 5, 2],
+        max_route_duration_min=None, return_to_origin=True
+    )
+
+    assert state.destinations == ["Miraflores", "Barranco"]
+    assert state.demands == [1, 2]
+
+
+def test_fleet_state_without_demands():
+    state = _fleet_state(
+        "Lima", ["Miraflores", "", "Barranco"], 1,
+        vehicle_capacities=None, demands=None,
+        max_route_duration_min=None, return_to_origin=False
+    )
+
+    assert state.destinations == ["Miraflores", "Barranco"]
+    assert state.demands == []